@@ -0,0 +1,180 @@
+# Persistent on-disk cache for the MotoGP API responses
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+######################### CLASSES ###########################
+
+class ResponseCache:
+    """
+    Stores API responses in a SQLite file keyed by URL, together with their ETag and Last-Modified
+    headers so stale entries can be revalidated with a conditional request.
+
+    Entries younger than the TTL of their endpoint are served without any request. Older entries, and
+    the ones fetched before their resource stopped changing, are revalidated with If-None-Match/If-Modified-Since,
+    so an unchanged resource only costs a 304.
+    When the stored bodies exceed max_size bytes, the least recently used entries are evicted.
+
+    Args:
+        path (str): Path of the SQLite file.
+        max_size (int): Maximum total size in bytes of the stored response bodies.
+        ttls (dict): Seconds each endpoint is considered fresh, keyed by endpoint prefix.
+        default_ttl (int): Seconds an endpoint not listed in ttls is considered fresh.
+    """
+
+    def __init__(self, path, max_size, ttls, default_ttl=0):
+        self.path = path
+        self.max_size = max_size
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'evictions': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                last_access REAL,
+                size INTEGER,
+                body BLOB
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    def ttl(self, endpoint):
+        """
+        Returns the seconds a response of the given endpoint is considered fresh.
+        """
+        for prefix, seconds in self.ttls.items():
+            if endpoint.startswith(prefix):
+                return seconds
+
+        return self.default_ttl
+
+    def get(self, url):
+        """
+        Returns the cached entry for the url as a dict, or None if it is not cached.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, fetched_at, body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {'etag': row[0], 'last_modified': row[1], 'fetched_at': row[2], 'body': row[3]}
+
+    def is_fresh(self, entry, endpoint, settled_after=None):
+        """
+        Checks if a cached entry can be served without revalidating it. An entry fetched before settled_after,
+        the Unix time from which its resource no longer changes, can be outdated whatever its age.
+        """
+        if settled_after is not None and entry['fetched_at'] < settled_after:
+            return False
+
+        return time.time() - entry['fetched_at'] < self.ttl(endpoint)
+
+    def conditional_headers(self, entry):
+        """
+        Returns the headers to revalidate a cached entry with the server.
+        """
+        headers = {}
+        if entry is None:
+            return headers
+
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        return headers
+
+    def load(self, url, entry, revalidated=False):
+        """
+        Marks a cached entry as used and returns its decoded JSON data.
+
+        Args:
+            url (str): Url of the entry.
+            entry (dict): Entry returned by get.
+            revalidated (bool): True if the server answered 304 to a conditional request.
+
+        Returns:
+            data (list or dict): JSON data of the cached response.
+        """
+        now = time.time()
+
+        with self._lock:
+            if revalidated:
+                self.stats['revalidated'] += 1
+                self._conn.execute("UPDATE responses SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+            else:
+                self.stats['hits'] += 1
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+            self._conn.commit()
+
+        return json.loads(entry['body'])
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """
+        Stores a response body and evicts the least recently used entries if the cache is over its size limit.
+
+        Args:
+            url (str): Url of the response.
+            body (bytes): Raw JSON body of the response.
+            etag (str, optional): ETag header of the response.
+            last_modified (str, optional): Last-Modified header of the response.
+        """
+        now = time.time()
+
+        with self._lock:
+            self.stats['misses'] += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, now, now, len(body), body)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        if total_size <= self.max_size:
+            return
+
+        for url, size in self._conn.execute("SELECT url, size FROM responses ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.stats['evictions'] += 1
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+
+    def log_stats(self):
+        """
+        Logs the hit/miss counters of the cache.
+        """
+        logger.info(
+            f"API cache: {self.stats['hits']} hits, {self.stats['revalidated']} revalidated (304), "
+            f"{self.stats['misses']} misses, {self.stats['evictions']} evictions"
+        )
+
+    def close(self):
+        """
+        Closes the SQLite file.
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,284 @@
+# Shared HTTP client used by every script that requests data from the MotoGP API
+import asyncio
+import atexit
+import logging
+import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from api_cache import ResponseCache
+from metrics import endpoint_name, metrics
+from rate_limiter import RateLimiter, backoff_delay, parse_retry_after
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+######################### VARIABLES ###########################
+
+base_url = 'https://api.motogp.pulselive.com/motogp/v1/results/'
+
+# Seconds to wait for the connection to be established and for the response to be read
+connect_timeout = 5
+read_timeout = 30
+
+# Retries for connection errors, throttling and transient server errors
+max_retries = 3
+backoff_factor = 0.5
+max_backoff = 60
+retry_status_codes = [429, 500, 502, 503, 504]
+
+# Requests per second sent to the API. The rate adapts between min_rate and max_rate
+# depending on how often the API answers with 429/5xx.
+rate_limit = 10
+rate_burst = 10
+min_rate = 0.5
+max_rate = 50
+
+# Number of keep-alive connections kept open to the API host
+pool_size = 20
+
+# Default number of requests in flight at the same time in the concurrent crawl modes
+crawl_concurrency = 10
+
+# Persistent response cache (set use_cache to False to always go to the API)
+use_cache = True
+cache_path = './cache/api_cache.sqlite'
+cache_max_size = 512 * 1024 * 1024
+
+# Seconds each endpoint is served from the cache without revalidating it, keyed by endpoint prefix.
+# Older entries are revalidated with a conditional request, and so are the entries of a session or season
+# that had not finished when they were fetched (see settled_after in request_api), whatever their age.
+cache_ttls = {
+    'seasons': 24 * 3600,
+    'categories': 24 * 3600,
+    'events': 24 * 3600,
+    'sessions': 24 * 3600,
+    'standings': 3600,
+    'session/': 7 * 24 * 3600
+}
+
+_session = None
+_executor = None
+_cache = None
+_limiter = None
+
+# The shared objects are created by the first thread that needs them, e.g. when several categories are crawled at the same time
+_lock = threading.Lock()
+
+
+######################### FUNCTIONS ###########################
+
+def get_session():
+    """
+    Returns the shared requests Session, creating it the first time it is needed.
+    The session keeps a pool of keep-alive connections and retries connection errors,
+    so consecutive requests reuse the same TCP+TLS connection. Error status codes are
+    retried by request_api, so the rate limiter sees them.
+
+    Returns:
+        session (requests.Session): Shared session for the MotoGP API.
+    """
+    global _session
+
+    with _lock:
+        if _session is None:
+            retry = Retry(
+                total=max_retries,
+                connect=max_retries,
+                read=max_retries,
+                status=0,
+                backoff_factor=backoff_factor,
+                allowed_methods=['GET'],
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+            _session = requests.Session()
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+            _session.headers.update({'Accept': 'application/json'})
+
+    return _session
+
+def get_executor():
+    """
+    Returns the thread pool used to run blocking requests from asyncio code.
+    It has as many workers as pooled connections, so every worker can keep its connection alive.
+
+    Returns:
+        executor (ThreadPoolExecutor): Shared executor for the API requests.
+    """
+    global _executor
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='api')
+
+    return _executor
+
+def get_cache():
+    """
+    Returns the shared response cache, creating it the first time it is needed.
+
+    Returns:
+        cache (ResponseCache): Shared cache, or None if use_cache is False.
+    """
+    global _cache
+
+    with _lock:
+        if use_cache and _cache is None:
+            _cache = ResponseCache(cache_path, cache_max_size, cache_ttls)
+
+    return _cache
+
+def get_limiter():
+    """
+    Returns the rate limiter shared by every request to the API, creating it the first time it is needed.
+
+    Returns:
+        limiter (RateLimiter): Shared rate limiter.
+    """
+    global _limiter
+
+    with _lock:
+        if _limiter is None:
+            _limiter = RateLimiter(rate_limit, rate_burst, pool_size, min_rate, max_rate)
+
+    return _limiter
+
+def close_session():
+    """
+    Closes the shared session and its pooled connections, and the response cache.
+    """
+    global _session, _executor, _cache, _limiter
+
+    if _limiter is not None:
+        _limiter.log_stats()
+        _limiter = None
+
+    if _cache is not None:
+        _cache.log_stats()
+        _cache.close()
+        _cache = None
+
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+    if _session is not None:
+        _session.close()
+        _session = None
+
+def request_api(base_url, endpoint, timeout=None, settled_after=None):
+    """
+    Makes a GET request to the given API endpoint and returns the JSON response.
+    Responses are served from the persistent cache while they are fresh, and revalidated
+    with a conditional request once they are stale. Requests go through the shared rate limiter,
+    and 429/5xx responses are retried with exponential backoff honoring Retry-After.
+
+    Args:
+        base_url (str): Base url of the API.
+        endpoint (str): Specific API endpoint.
+        timeout (tuple, optional): (connect, read) timeouts in seconds. Defaults to the module values.
+        settled_after (float, optional): Unix time from which the resource no longer changes, e.g. the end
+            of a session (see crawl_ledger.settled_time). A cached response fetched before it is always
+            revalidated, so the data of a session is never served as it was while it was running.
+
+    Returns:
+        data (list or dict): JSON data from the API, or an empty list if the request failed.
+    """
+    if timeout is None:
+        timeout = (connect_timeout, read_timeout)
+
+    url = base_url + endpoint
+    name = endpoint_name(endpoint)
+    cache = get_cache()
+
+    entry = cache.get(url) if cache is not None else None
+    if entry is not None and cache.is_fresh(entry, endpoint, settled_after):
+        metrics.count('api_cache_hits', endpoint=name)
+        return cache.load(url, entry)
+
+    headers = cache.conditional_headers(entry) if cache is not None else {}
+
+    limiter = get_limiter()
+
+    for attempt in range(max_retries + 1):
+        start = time.perf_counter()
+        limiter.acquire()
+        sent = time.perf_counter()
+        metrics.count('api_limiter_wait_seconds', sent - start, endpoint=name)
+
+        try:
+            response = get_session().get(url, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            # Timeouts and connection resets mean the API is struggling, so the rate is lowered as for a 429/5xx
+            limiter.release(throttled=True)
+            metrics.count('api_errors', endpoint=name, error=type(e).__name__)
+            logger.warning(f"Failed to retrieve data from {endpoint}. Error: {e}")
+            return []
+
+        metrics.observe('api_request_seconds', time.perf_counter() - sent, endpoint=name)
+        metrics.count('api_responses', endpoint=name, status=response.status_code)
+        metrics.count('api_bytes', len(response.content), endpoint=name)
+
+        throttled = response.status_code in retry_status_codes
+        limiter.release(throttled)
+
+        if not throttled or attempt == max_retries:
+            break
+
+        metrics.count('api_retries', endpoint=name, status=response.status_code)
+
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is not None:
+            limiter.pause(retry_after)
+
+        delay = backoff_delay(attempt, backoff_factor, max_backoff, retry_after)
+        logger.info(f"Status code {response.status_code} from {endpoint}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+    if response.status_code == 304 and entry is not None:
+        return cache.load(url, entry, revalidated=True)
+
+    if response.status_code != 200:
+        logger.warning(f"Failed to retrieve data from {endpoint}. Status code: {response.status_code}")
+        return []
+
+    try:
+        data = response.json()
+    except ValueError:
+        logger.warning(f"Invalid JSON received from {endpoint}")
+        return []
+
+    if cache is not None:
+        cache.store(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    return data
+
+async def request_api_async(base_url, endpoint, semaphore, settled_after=None):
+    """
+    Asyncio version of request_api. The request runs on the shared session in a worker thread,
+    and the semaphore limits how many requests are in flight at the same time.
+
+    Args:
+        base_url (str): Base url of the API.
+        endpoint (str): Specific API endpoint.
+        semaphore (asyncio.Semaphore): Semaphore shared by all the requests of the crawl.
+        settled_after (float, optional): Unix time from which the resource no longer changes (see request_api).
+
+    Returns:
+        data (list or dict): JSON data from the API, or an empty list if the request failed.
+    """
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(get_executor(), partial(request_api, base_url, endpoint, settled_after=settled_after))
+
+    return data
+
+
+# Release the pooled connections and log the cache counters when the script ends
+atexit.register(close_session)
@@ -0,0 +1,194 @@
+# End-to-end benchmark of the fetch stages against the local mock of the API (mock_api.py), at several history sizes
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+import requests
+import api_client
+
+
+######################### VARIABLES ###########################
+
+# History sizes benchmarked: multipliers of the events of each season of the synthetic payloads
+scales = [1, 10, 100]
+
+# Seasons crawled
+year_from = date.today().year - 1
+year_until = date.today().year - 1
+
+# Requests per second allowed by the client, high enough not to limit the mock API
+client_rate = 1000
+
+stages = ['events', 'sessions', 'results', 'standings']
+
+report_file = './logs/benchmark_crawl.json'
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+######################### FUNCTIONS ###########################
+
+def run_stages(base_url, year_from, year_until, concurrency, rate):
+    """
+    Runs the fetch stages in 'all' mode against the given API, in the current directory.
+
+    Args:
+        base_url (str): Base url of the mock API.
+        year_from (int): year from which the data is fetched
+        year_until (int): year until which the data is fetched
+        concurrency (int): requests in flight at the same time for the results
+        rate (float): requests per second allowed by the client
+
+    Returns:
+        Dictionary with the seconds of each stage and the peak memory of the process in MB
+    """
+    api_client.base_url = base_url
+    api_client.use_cache = False
+    api_client.rate_limit = api_client.rate_burst = api_client.max_rate = rate
+
+    # Imported once the base url is set, as they keep their own reference to it
+    import get_data
+    import get_events
+    import get_results
+    import get_sessions
+
+    seasons_info = api_client.request_api(base_url, get_events.seasons_ep)
+
+    stage_functions = {
+        'events': lambda: get_events.run('all', year_from, year_until, json_seasons_info=seasons_info),
+        'sessions': lambda: get_sessions.run('all', year_from, year_until),
+        'results': lambda: get_results.run('all', year_from, year_until, concurrency=concurrency),
+        'standings': lambda: get_data.run('all', year_from, year_until, json_seasons_info=seasons_info)
+    }
+
+    seconds = {}
+    for stage in stages:
+        start = time.perf_counter()
+        # The parent process reads the json of this process from stdout, so nothing else may be printed there
+        with contextlib.redirect_stdout(io.StringIO()):
+            stage_functions[stage]()
+        seconds[stage] = round(time.perf_counter() - start, 3)
+
+    # ru_maxrss is in KB in Linux and in bytes in macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+    return {'stages': seconds, 'peak_memory_mb': round(peak_mb, 1)}
+
+def benchmark_scale(scale, args):
+    """
+    Starts the mock API with the given history size and runs the fetch stages against it in a new process,
+    in a temporary directory, so every scale starts with empty data and its own memory.
+
+    Args:
+        scale (int): Multiplier of the events of each season.
+        args (Namespace): Parsed command line arguments.
+
+    Returns:
+        Dictionary with the results of the benchmark
+    """
+    server = subprocess.Popen(
+        [
+            sys.executable, os.path.join(repo_dir, 'mock_api.py'), '--port', '0', '--scale', str(scale),
+            '--latency', str(args.latency), '--jitter', str(args.jitter),
+            '--error-rate', str(args.error_rate), '--throttle-rate', str(args.throttle_rate)
+        ],
+        stdout=subprocess.PIPE, text=True, cwd=repo_dir
+    )
+
+    try:
+        base_url = server.stdout.readline().strip()
+        root_url = base_url[:base_url.index('/', len('http://'))]
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            for directory in ['data', 'logs', 'cache']:
+                os.makedirs(os.path.join(work_dir, directory))
+
+            start = time.perf_counter()
+            child = subprocess.run(
+                [
+                    sys.executable, os.path.abspath(__file__), '--child', '--base-url', base_url,
+                    '--from', str(args.year_from), '--until', str(args.year_until),
+                    '--concurrency', str(args.concurrency), '--rate', str(args.rate)
+                ],
+                cwd=work_dir, capture_output=True, text=True,
+                env=dict(os.environ, PYTHONPATH=os.pathsep.join([repo_dir, os.environ.get('PYTHONPATH', '')]))
+            )
+            wall_time = time.perf_counter() - start
+
+        if child.returncode != 0:
+            raise RuntimeError(f'Benchmark at scale {scale} failed:\n{child.stderr}')
+
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        server_stats = requests.get(root_url + '/__stats', timeout=10).json()
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        'scale': scale,
+        'wall_time_s': round(wall_time, 3),
+        'requests': server_stats['requests'],
+        'requests_per_s': round(server_stats['requests'] / sum(result['stages'].values()), 1),
+        'mb_downloaded': round(server_stats['bytes'] / 1024 ** 2, 2),
+        'errors': server_stats['errors'],
+        'throttled': server_stats['throttled'],
+        'peak_memory_mb': result['peak_memory_mb'],
+        'stages_s': result['stages']
+    }
+
+def print_report(results):
+    """
+    Prints a table with the results of every scale.
+    """
+    print(f"{'scale':>6} {'wall s':>9} {'requests':>9} {'req/s':>8} {'MB':>8} {'peak MB':>8}  stages s")
+    for result in results:
+        print(
+            f"{result['scale']:>6} {result['wall_time_s']:>9} {result['requests']:>9} {result['requests_per_s']:>8} "
+            f"{result['mb_downloaded']:>8} {result['peak_memory_mb']:>8}  {result['stages_s']}"
+        )
+
+def read_arguments(argv=None):
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the fetch stages against a local mock of the MotoGP API.')
+    parser.add_argument('--scales', type=int, nargs='+', default=scales, help='history sizes, as multipliers of the events of each season')
+    parser.add_argument('--from', dest='year_from', type=int, default=year_from, help='year from which to get the data')
+    parser.add_argument('--until', dest='year_until', type=int, default=year_until, help='year until which to get the data')
+    parser.add_argument('--concurrency', type=int, default=api_client.crawl_concurrency, help='requests in flight at the same time for the results')
+    parser.add_argument('--rate', type=float, default=client_rate, help='requests per second allowed by the client')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds each response of the mock API is delayed')
+    parser.add_argument('--jitter', type=float, default=0.01, help='maximum random seconds added to the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of the requests answered with a 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of the requests answered with a 429')
+    parser.add_argument('--output', default=report_file, help='json file where the results are saved')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+
+    return parser.parse_args(argv)
+
+
+######################### MAIN ###########################
+
+if __name__ == '__main__':
+    args = read_arguments()
+
+    if args.child:
+        # Run by benchmark_scale: the result is the last line of the output
+        print(json.dumps(run_stages(args.base_url, args.year_from, args.year_until, args.concurrency, args.rate)))
+        sys.exit(0)
+
+    results = [benchmark_scale(scale, args) for scale in args.scales]
+    print_report(results)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as file_obj:
+        json.dump(results, file_obj, indent=2)
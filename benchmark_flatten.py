@@ -0,0 +1,244 @@
+# Micro-benchmarks of the flattening of the API payloads and the cleaning and insertion of the rows, on synthetic payloads
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import closing
+import data_store
+import import_data_to_db
+import payload_generator
+from db_backend import connect_sqlite
+from flatten import ColumnBuffer, RTC_columns, constructors_columns, flatten_results, flatten_rtc, results_dtypes, results_time_columns, riders_columns, teams_columns
+from get_results import results_csv_columns, specific_results
+from get_sessions import specific_session
+from get_standings import specific_season_standings
+
+
+######################### VARIABLES ###########################
+
+# Classifications flattened in each run, and seasons of standings
+sessions_count = 2000
+seasons_count = 75
+
+# Times each benchmark is run. The fastest and the median are reported
+repeats = 5
+
+# A benchmark is a regression if it is this many times slower than in the baseline report
+max_slowdown = 1.2
+
+report_file = './logs/benchmark_flatten.json'
+
+
+######################### FUNCTIONS ###########################
+
+def generate_payloads(sessions_count=sessions_count, seasons_count=seasons_count):
+    """
+    Generates the payloads used by the benchmarks with payload_generator, so every run flattens the same data.
+
+    Returns:
+        Dictionary with the lists of 'sessions' (of each event), 'classifications' and 'standings' payloads
+    """
+    sessions_per_event = payload_generator.sessions_per_event
+    events = [
+        payload_generator.event_id(2000 + number % 20, number)
+        for number in range(-(-sessions_count // sessions_per_event))
+    ]
+    sessions = [payload_generator.sessions_payload(event) for event in events]
+    classifications = [
+        payload_generator.classification_payload(session['id'])
+        for event_sessions in sessions for session in event_sessions
+    ][:sessions_count]
+    standings = [
+        payload_generator.standings_payload(payload_generator.season_id(year))
+        for year in range(payload_generator.first_season, payload_generator.first_season + seasons_count)
+    ]
+
+    return {'sessions': sessions, 'classifications': classifications, 'standings': standings}
+
+def results_buffer(classifications):
+    """
+    Returns a buffer with the results of every classification, as the crawl of get_results builds it.
+    """
+    buffer = ColumnBuffer(results_csv_columns, results_dtypes, time_columns=results_time_columns)
+    for number, json_session_results in enumerate(classifications):
+        flatten_results(json_session_results, buffer, f'session-{number}', 'MotoGP')
+
+    return buffer
+
+def rtc_frames(standings):
+    """
+    Flattens the riders, teams, constructors and their connection of every season, as get_data.rtc_standings does.
+    """
+    riders = ColumnBuffer(riders_columns, unique=True)
+    teams = ColumnBuffer(teams_columns, unique=True)
+    constructors = ColumnBuffer(constructors_columns, unique=True)
+    RTC = ColumnBuffer(RTC_columns + ['season', 'category'], unique=True)
+
+    for year, json_season_standings in enumerate(standings, start=payload_generator.first_season):
+        flatten_rtc(json_season_standings, riders, teams, constructors, RTC, year, 'MotoGP')
+
+    return [riders.to_frame(), teams.to_frame(), constructors.to_frame(), RTC.to_frame()]
+
+def insert_results(path, bulk=False):
+    """
+    Inserts a results file in a new in-memory SQLite database, without checking the foreign keys.
+    """
+    with closing(connect_sqlite(':memory:')) as connection:
+        connection.execute('PRAGMA foreign_keys = OFF')
+        cursor = connection.cursor()
+
+        if bulk:
+            import_data_to_db.bulk_insert_data(path, 'results', cursor)
+        else:
+            import_data_to_db.insert_data(path, 'results', cursor)
+
+def prepare_benchmarks(payloads, work_dir):
+    """
+    Builds the benchmarks on the given payloads.
+
+    Args:
+        payloads (dict): Payloads returned by generate_payloads.
+        work_dir (str): Directory where the files inserted by the import benchmarks are written.
+
+    Returns:
+        Dictionary with the function of each benchmark and the number of rows it processes
+    """
+    classifications = payloads['classifications']
+    df_results = results_buffer(classifications).to_frame()
+
+    results_path = os.path.join(work_dir, 'results' + data_store.format_extensions[data_store.data_format])
+    data_store.write_file_atomic(df_results, results_path, import_data_to_db.results_csv)
+    df_results_strings = data_store.read_strings(results_path)
+
+    rows = {
+        'results': len(df_results),
+        'sessions': sum(len(event_sessions) for event_sessions in payloads['sessions']),
+        'standings': sum(len(json_season_standings['classification']) for json_season_standings in payloads['standings'])
+    }
+
+    return {
+        'specific_results': [lambda: [specific_results(json_session_results) for json_session_results in classifications], rows['results']],
+        'results_buffer': [lambda: results_buffer(classifications).to_frame(), rows['results']],
+        'specific_session': [lambda: [specific_session(json_sessions) for json_sessions in payloads['sessions']], rows['sessions']],
+        'specific_season_standings': [lambda: [specific_season_standings(json_season_standings) for json_season_standings in payloads['standings']], rows['standings']],
+        'flatten_rtc': [lambda: rtc_frames(payloads['standings']), rows['standings']],
+        'clean_frame_results': [lambda: import_data_to_db.clean_frame(df_results_strings, 'results'), rows['results']],
+        'insert_data_results': [lambda: insert_results(results_path), rows['results']],
+        'bulk_insert_data_results': [lambda: insert_results(results_path, bulk=True), rows['results']]
+    }
+
+def run_benchmark(function, rows, repeats=repeats):
+    """
+    Times a benchmark and measures its allocations with tracemalloc, in a separate run so they do not slow down the timing.
+
+    Args:
+        function (function): Runs the benchmark once.
+        rows (int): Rows processed in each run.
+        repeats (int, optional): Times the benchmark is timed.
+
+    Returns:
+        Dictionary with the fastest and median seconds, the rows per second of the fastest run,
+        and the peak and retained MB allocated by a run
+    """
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = function()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        'best_s': round(min(seconds), 4),
+        'median_s': round(statistics.median(seconds), 4),
+        'rows_per_s': round(rows / min(seconds)),
+        'peak_mb': round(peak / 1024 ** 2, 2),
+        'retained_mb': round(retained / 1024 ** 2, 2)
+    }
+
+def compare_reports(report, baseline, max_slowdown=max_slowdown):
+    """
+    Compares the rows per second of the fastest run of each benchmark with a previous report,
+    so reports of runs with a different number of sessions can be compared.
+
+    Returns:
+        List with the names of the benchmarks more than max_slowdown times slower than in the baseline
+    """
+    regressions = []
+
+    for name, result in report.items():
+        if name not in baseline:
+            continue
+
+        ratio = baseline[name]['rows_per_s'] / result['rows_per_s']
+        result['vs_baseline'] = round(ratio, 2)
+        if ratio > max_slowdown:
+            regressions.append(name)
+
+    return regressions
+
+def print_report(report):
+    """
+    Prints a table with the results of every benchmark.
+    """
+    print(f"{'benchmark':<26} {'best s':>8} {'median s':>9} {'rows/s':>10} {'peak MB':>8} {'kept MB':>8} {'vs base':>8}")
+    for name, result in report.items():
+        print(
+            f"{name:<26} {result['best_s']:>8} {result['median_s']:>9} {result['rows_per_s']:>10} "
+            f"{result['peak_mb']:>8} {result['retained_mb']:>8} {result.get('vs_baseline', ''):>8}"
+        )
+
+def read_arguments(argv=None):
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the flattening of the API payloads and the import of the rows.')
+    parser.add_argument('--sessions', type=int, default=sessions_count, help='classifications flattened in each run')
+    parser.add_argument('--seasons', type=int, default=seasons_count, help='seasons of standings flattened in each run')
+    parser.add_argument('--repeats', type=int, default=repeats, help='times each benchmark is run')
+    parser.add_argument('--only', nargs='+', help='names of the benchmarks to run')
+    parser.add_argument('--format', dest='data_format', choices=list(data_store.format_extensions), default=data_store.data_format, help='format of the files inserted')
+    parser.add_argument('--baseline', help='previous json report to compare with; exits with 1 if a benchmark is slower')
+    parser.add_argument('--max-slowdown', type=float, default=max_slowdown, help='times slower than the baseline considered a regression')
+    parser.add_argument('--output', default=report_file, help='json file where the results are saved')
+
+    return parser.parse_args(argv)
+
+
+######################### MAIN ###########################
+
+if __name__ == '__main__':
+    args = read_arguments()
+    data_store.data_format = args.data_format
+
+    payloads = generate_payloads(args.sessions, args.seasons)
+
+    report = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, (function, rows) in prepare_benchmarks(payloads, work_dir).items():
+            if args.only and name not in args.only:
+                continue
+            report[name] = run_benchmark(function, rows, args.repeats)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file_obj:
+            regressions = compare_reports(report, json.load(file_obj), args.max_slowdown)
+
+    print_report(report)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as file_obj:
+        json.dump(report, file_obj, indent=2)
+
+    if regressions:
+        print(f'Slower than the baseline: {regressions}')
+        sys.exit(1)
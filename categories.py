@@ -0,0 +1,147 @@
+# Racing categories (MotoGP, Moto2, Moto3, MotoE...) discovered from the API, and helpers to crawl several of them at the same time
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import pandas as pd
+from api_client import base_url, request_api
+from crawl_ledger import season_settled_time
+from data_store import partition_files, read_file
+
+logger = logging.getLogger(__name__)
+
+
+######################### VARIABLES ###########################
+
+seasons_ep = 'seasons'
+categories_ep = 'categories?seasonUuid='
+
+# Categories crawled when none are given, by their name in the API without the trademark sign.
+# ['all'] crawls every category of each season (125cc, 250cc, 500cc... in the older ones)
+crawl_categories = ['MotoGP']
+
+# Id of the MotoGP category, used if the categories of the seasons cannot be requested
+category_id_motogp = 'e8c110ad-64aa-4e8e-8a86-f2f152f6a942'
+
+
+######################### FUNCTIONS ###########################
+
+def category_name(name):
+    """
+    Returns the name of a category as it is stored in the tables, e.g. 'Moto2™' -> 'Moto2'.
+    """
+    return name.replace('™', '').strip()
+
+def category_names(categories=None):
+    """
+    Returns the names of the categories to crawl, crawl_categories if none are given.
+    An empty list is kept as it is, so it is not mistaken for the default categories.
+    """
+    return list(categories) if categories is not None else list(crawl_categories)
+
+def discover_categories(start_year=1949, end_year=date.today().year, categories=None, seasons_info=None):
+    """
+    Requests the categories of the seasons in the given period and returns the id of the ones to crawl.
+
+    Args:
+        start_year (int, optional): year from which the categories are requested
+        end_year (int, optional): year until which the categories are requested
+        categories (list, optional): names of the categories to crawl, or ['all']. Defaults to crawl_categories.
+        seasons_info (list, optional): seasons json data, requested from the API if not given
+
+    Returns:
+        Dictionary with the id of each category to crawl, by name
+
+    Raises:
+        ValueError: if no category is given or some of them are not found in the period, so 'all' mode
+            does not rewrite the seasons without them
+    """
+    names = category_names(categories)
+    if not names:
+        raise ValueError('No categories to crawl')
+
+    if seasons_info is None:
+        seasons_info = request_api(base_url, seasons_ep)
+
+    category_ids = {}
+    for season in seasons_info:
+        if start_year <= season['year'] <= end_year:
+            for category in request_api(base_url, categories_ep + season['id'], settled_after=season_settled_time(season['year'])):
+                category_ids.setdefault(category_name(category['name']), category['id'])
+
+    if 'MotoGP' not in category_ids:
+        category_ids['MotoGP'] = category_id_motogp
+
+    if 'all' in names:
+        return category_ids
+
+    missing = [name for name in names if name not in category_ids]
+    if missing:
+        raise ValueError(f'Categories {missing} not found from {start_year} to {end_year}, available: {list(category_ids)}')
+
+    return {name: category_ids[name] for name in names}
+
+def select_categories(df, categories=None):
+    """
+    Returns the rows of a table with a 'category' column that belong to the given categories.
+    """
+    names = category_names(categories)
+    if 'all' in names:
+        return df
+
+    return df[df['category'].isin(names)]
+
+def map_categories(function, category_ids):
+    """
+    Calls function(category, category_id) for every category at the same time, one thread per category.
+    The requests of every thread share the connection pool and the rate limiter of api_client.
+
+    Returns:
+        List with the result of each category, in the order of category_ids
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(category_ids)), thread_name_prefix='category') as executor:
+        futures = [executor.submit(function, category, category_id) for category, category_id in category_ids.items()]
+
+        return [future.result() for future in futures]
+
+def concat_frames(frames):
+    """
+    Concatenates the non empty DataFrames, or returns an empty DataFrame if there are none.
+    """
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    return pd.concat(frames, ignore_index=True)
+
+def iter_other_categories(table, categories, start_year=1949, end_year=date.today().year):
+    """
+    Yields the stored rows of the categories that are not crawled, one season at a time, so 'all' mode can
+    rewrite the seasons of a table without losing them. Files stored without a 'category' column are replaced.
+
+    Args:
+        table (str): csv path of the table, e.g. './data/sessions.csv'.
+        categories (list): names of the categories crawled.
+        start_year (int, optional): year from which the seasons are rewritten
+        end_year (int, optional): year until which the seasons are rewritten
+
+    Yields:
+        DataFrame with the rows of the other categories in a season
+    """
+    names = category_names(categories)
+    if 'all' in names:
+        return
+
+    for path in partition_files(table, start_year, end_year):
+        df = read_file(path, table=table)
+        if 'category' in df.columns:
+            df = df[~df['category'].isin(names)]
+            if not df.empty:
+                yield df
+
+def category_path(path, category):
+    """
+    Returns the file of a category, e.g. ('./data/sessions.ledger', 'Moto2') -> './data/sessions.Moto2.ledger'.
+    """
+    root, extension = os.path.splitext(path)
+    return f'{root}.{category}{extension}'
@@ -0,0 +1,214 @@
+# Persistent ledger of the API requests already crawled, so fetches and restarts only request what is missing
+import logging
+import os
+import pandas as pd
+import time
+from datetime import date, timedelta
+from data_store import csv_encoding, read_file, table_dtypes, table_name, typed_frame
+
+logger = logging.getLogger(__name__)
+
+
+######################### CLASSES ###########################
+
+class CrawlLedger:
+    """
+    Keeps track of the keys (event or session ids) whose data has already been crawled.
+
+    Each completed key is appended to the ledger file as soon as its rows are safely appended to
+    the spool csv, so a crashed run can be resumed without losing or requesting again what it already
+    crawled. The spool is removed once its rows have been saved in the output csv; the ledger is kept
+    so later fetches skip the keys that are already stored.
+
+    Args:
+        ledger_path (str): Text file with one completed key per line.
+        spool_path (str): csv where the rows of the completed keys are appended while crawling.
+        key_column (str, optional): Column of the spooled rows with their key, e.g. 'event_id'. If given, the keys
+            of the spooled rows left out of a run (see kept) are forgotten, so they are requested again
+        table (str, optional): csv path of the table of the spooled rows, e.g. './data/results.csv'. If given, the
+            spool is written and read back with the types of the table, so a resumed crawl stores the same rows
+    """
+
+    def __init__(self, ledger_path, spool_path, key_column=None, table=None):
+        self.ledger_path = ledger_path
+        self.spool_path = spool_path
+        self.key_column = key_column
+        self.table = table
+        self.keys = set()
+
+        if os.path.exists(ledger_path):
+            with open(ledger_path) as file_obj:
+                self.keys = set(line.strip() for line in file_obj if line.strip())
+            logger.info(f"{len(self.keys)} crawled keys loaded from {ledger_path}")
+
+    def done(self, key):
+        """
+        Checks if the key has already been crawled.
+        """
+        return key in self.keys
+
+    def record(self, key, df):
+        """
+        Appends the rows of a crawled key to the spool and then marks the key as done.
+
+        Args:
+            key (str): Id of the crawled event or session.
+            df (DataFrame): Rows obtained for the key.
+        """
+        if self.table is not None:
+            df = typed_frame(df, self.table)
+
+        df.to_csv(self.spool_path, mode='a', index=False, sep=';', encoding=csv_encoding, header=not os.path.exists(self.spool_path))
+
+        with open(self.ledger_path, 'a') as file_obj:
+            file_obj.write(key + '\n')
+            file_obj.flush()
+
+        self.keys.add(key)
+
+    def in_progress(self):
+        """
+        Checks if a previous run left rows in the spool that were not saved in the output csv.
+        """
+        return os.path.exists(self.spool_path)
+
+    def spooled(self):
+        """
+        Returns the rows in the spool as a DataFrame (empty if there is no spool).
+        """
+        if not self.in_progress():
+            return pd.DataFrame()
+
+        return read_file(self.spool_path, table=self.table)
+
+    def iter_spooled(self, key_column, keys, chunk_rows, keep=None):
+        """
+        Yields the rows in the spool that belong to the given keys, reading the spool in chunks.
+
+        Args:
+            key_column (str): Column of the rows with the key they were recorded with.
+            keys (set): Keys whose rows are wanted.
+            chunk_rows (int): Rows read from the spool at a time.
+            keep (function, optional): Returns which spooled rows belong to this run, e.g. the ones of its
+                seasons, as a boolean Series. A previous run may have been started with other arguments
+
+        Yields:
+            DataFrame with the spooled rows of a chunk that belong to the keys
+        """
+        if not self.in_progress() or not keys:
+            return
+
+        dtypes = table_dtypes.get(table_name(self.table)) if self.table is not None else None
+        for df_chunk in pd.read_csv(self.spool_path, sep=';', encoding=csv_encoding, dtype=dtypes, chunksize=chunk_rows):
+            df_chunk = df_chunk[df_chunk[key_column].isin(keys)]
+            yield self.kept(df_chunk, keep)
+
+    def with_spooled(self, df, keep=None):
+        """
+        Adds to a DataFrame the rows left in the spool by a previous run that are not already in it.
+
+        Args:
+            df (DataFrame): Rows crawled in this run.
+            keep (function, optional): Returns which spooled rows belong to this run, see iter_spooled.
+
+        Returns:
+            DataFrame with the rows of this run followed by the missing spooled rows
+        """
+        df_spooled = self.kept(self.spooled(), keep)
+        if not df_spooled.empty and not df.empty:
+            df_spooled = df_spooled[~df_spooled['id'].isin(df['id'])]
+
+        if df_spooled.empty:
+            return df
+
+        return pd.concat([df, df_spooled], ignore_index=True)
+
+    def kept(self, df_spooled, keep):
+        """
+        Returns the spooled rows that belong to this run, logging how many are left out.
+        """
+        if keep is None or df_spooled.empty:
+            return df_spooled
+
+        mask = keep(df_spooled)
+        df_kept = df_spooled[mask]
+        if len(df_kept) < len(df_spooled):
+            logger.info(f"{len(df_spooled) - len(df_kept)} spooled rows of {self.spool_path} left out of this run")
+
+            # Their rows are removed with the spool, so their keys have to be crawled again
+            if self.key_column is not None:
+                self.forget(set(df_spooled.loc[~mask, self.key_column]) - set(df_kept[self.key_column]))
+
+        return df_kept
+
+    def forget(self, keys):
+        """
+        Removes keys from the ledger, so they are crawled again.
+        """
+        keys = set(keys) & self.keys
+        if not keys:
+            return
+
+        self.keys -= keys
+        tmp_path = self.ledger_path + '.part'
+        with open(tmp_path, 'w') as file_obj:
+            file_obj.writelines(key + '\n' for key in sorted(self.keys))
+        os.replace(tmp_path, self.ledger_path)
+
+    def finish(self):
+        """
+        Removes the spool once its rows have been saved in the output csv.
+        """
+        if self.in_progress():
+            os.remove(self.spool_path)
+
+    def reset(self):
+        """
+        Forgets every crawled key and removes the spool.
+        """
+        self.finish()
+        if os.path.exists(self.ledger_path):
+            os.remove(self.ledger_path)
+        self.keys = set()
+
+
+######################### FUNCTIONS ###########################
+
+def settled_time(date_value):
+    """
+    Returns the Unix time from which the data of a date from the API ('YYYY-MM-DD...') is not expected
+    to change: the start of the next day, in local time as date.today().
+
+    Args:
+        date_value (str): Date or datetime string.
+
+    Returns:
+        Unix time of the start of the next day, or infinity if the date is missing, as its data can always change
+    """
+    if not isinstance(date_value, str):
+        return float('inf')
+
+    try:
+        next_day = date.fromisoformat(date_value[:10]) + timedelta(days=1)
+    except ValueError:
+        return float('inf')
+
+    return time.mktime(next_day.timetuple())
+
+def season_settled_time(year):
+    """
+    Returns the Unix time from which the data of a season is not expected to change, once its last day is over.
+    """
+    return settled_time(f'{int(year)}-12-31')
+
+def is_past(date_value):
+    """
+    Checks if a date from the API ('YYYY-MM-DD...') is before today, so its data is not expected to change.
+
+    Args:
+        date_value (str): Date or datetime string.
+
+    Returns:
+        True if the date is before today, False otherwise or if the date is missing
+    """
+    return time.time() >= settled_time(date_value)
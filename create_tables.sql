@@ -23,6 +23,7 @@ circuit VARCHAR(255),
 session_type VARCHAR(3),
 event_id VARCHAR(255),
 season INT,
+category VARCHAR(20),
 PRIMARY KEY (session_id),
 FOREIGN KEY (event_id) REFERENCES events(event_id)
 );
@@ -51,7 +52,8 @@ position INT,
 points DECIMAL(5, 2),
 rider_id VARCHAR(255),
 season INT,
-PRIMARY KEY (season, rider_id),
+category VARCHAR(20) NOT NULL,
+PRIMARY KEY (season, category, rider_id),
 FOREIGN KEY (rider_id) REFERENCES riders(rider_id)
 );
 
@@ -61,7 +63,8 @@ rider_number INT,
 team_id VARCHAR(255),
 constructor_id VARCHAR(255) NOT NULL,
 season INT NOT NULL,
-PRIMARY KEY (rider_id, constructor_id, season),
+category VARCHAR(20) NOT NULL,
+PRIMARY KEY (rider_id, constructor_id, season, category),
 FOREIGN KEY (rider_id) REFERENCES riders(rider_id),
 FOREIGN KEY (team_id) REFERENCES teams(team_id),
 FOREIGN KEY (constructor_id) REFERENCES constructors(constructor_id)
@@ -80,7 +83,18 @@ total_time VARCHAR(50),
 points DECIMAL(4, 2),
 rider_id VARCHAR(255),
 session_id VARCHAR(255),
+best_lap_time_ms INT,
+total_time_ms INT,
+gap_to_first_ms INT,
+category VARCHAR(20),
 PRIMARY KEY (results_id),
 FOREIGN KEY (rider_id) REFERENCES riders(rider_id),
 FOREIGN KEY (session_id) REFERENCES sessions(session_id)
+);
+
+CREATE TABLE row_hashes (
+table_name VARCHAR(50) NOT NULL,
+row_key VARCHAR(255) NOT NULL,
+row_hash CHAR(32) NOT NULL,
+PRIMARY KEY (table_name, row_key)
 );
\ No newline at end of file
@@ -0,0 +1,276 @@
+# Store the tables of ./data as one file per season, so updating a season only rewrites its own file
+import glob
+import logging
+import os
+import pandas as pd
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+
+######################### VARIABLES ###########################
+
+# Format of the files of the tables: 'csv' (';' separated) or 'parquet' (needs pyarrow)
+data_format = 'csv'
+
+# Extension of the files of each format
+format_extensions = {'csv': '.csv', 'parquet': '.parquet'}
+
+# Name of the file of each season inside the folder of a table, without the extension
+partition_pattern = 'season={}'
+
+# Encoding of the csv files, used to write and to read them back
+csv_encoding = 'utf-8'
+
+# Types of the columns of each table, applied when its files are written and read back, so a file
+# rewritten without new rows keeps the same content (e.g. '0.000' gaps or integers without decimals)
+table_dtypes = {
+    'events': {
+        'id': 'string', 'test': 'boolean', 'sponsored_name': 'string', 'date_end': 'string', 'date_start': 'string',
+        'name': 'string', 'short_name': 'string', 'season': 'Int64'
+    },
+    'sessions': {
+        'id': 'string', 'date': 'string', 'number': 'Int64', 'track_condition': 'string', 'air_temperature': 'string',
+        'humidity': 'string', 'ground_temperature': 'string', 'weather': 'string', 'circuit': 'string',
+        'session_type': 'string', 'event_id': 'string', 'season': 'Int64', 'category': 'string'
+    },
+    'results': {
+        'id': 'string', 'position': 'Int64', 'best_lap_number': 'Int64', 'best_lap_time': 'string', 'average_speed': 'float64',
+        'top_speed': 'float64', 'gap_to_first': 'string', 'total_laps': 'Int64', 'total_time': 'string', 'points': 'float64',
+        'rider_id': 'string', 'session_id': 'string', 'best_lap_time_ms': 'Int64', 'total_time_ms': 'Int64', 'gap_to_first_ms': 'Int64',
+        'category': 'string'
+    },
+    'standings': {'position': 'Int64', 'points': 'float64', 'rider_id': 'string', 'season': 'Int64', 'category': 'string'},
+    'riders_teams_constructors': {
+        'rider_id': 'string', 'rider_number': 'Int64', 'team_id': 'string', 'constructor_id': 'string', 'season': 'Int64', 'category': 'string'
+    },
+    'riders': {'rider_id': 'string', 'rider_name': 'string', 'rider_country': 'string'},
+    'teams': {'team_id': 'string', 'team_name': 'string'},
+    'constructors': {'constructor_id': 'string', 'constructor_name': 'string'}
+}
+
+
+######################### FUNCTIONS ###########################
+
+def season_column(df):
+    """
+    Returns the season of each row of a table that has a 'season' column.
+    """
+    return df['season']
+
+def table_name(table):
+    """
+    Returns the name of a table from its path, e.g. './data/results.csv' -> 'results'.
+    """
+    return os.path.splitext(os.path.basename(table))[0]
+
+def table_path(table):
+    """
+    Returns the file of a table stored as a single file, in the current format, e.g. './data/riders.csv' -> './data/riders.parquet'.
+    Paths that are not csv tables are returned as they are.
+    """
+    root, extension = os.path.splitext(table)
+    if extension != '.csv':
+        return table
+
+    return root + format_extensions[data_format]
+
+def typed_frame(df, table):
+    """
+    Returns the DataFrame with the types of the columns of its table.
+    """
+    dtypes = table_dtypes.get(table_name(table), {})
+
+    return df.astype({column: dtype for column, dtype in dtypes.items() if column in df.columns})
+
+def read_file(path, columns=None, table=None):
+    """
+    Reads a file of a table in the format given by its extension.
+
+    Args:
+        path (str): csv or parquet file.
+        columns (list, optional): columns to read, all of them if not given
+        table (str, optional): csv path of the table, e.g. './data/results.csv'. If given, the columns
+            of a csv are read with the types of the table instead of the ones guessed by pandas
+
+    Returns:
+        DataFrame with the rows of the file
+    """
+    if path.endswith(format_extensions['parquet']):
+        return pd.read_parquet(path, columns=columns)
+
+    dtypes = table_dtypes.get(table_name(table)) if table is not None else None
+    return pd.read_csv(path, sep=';', encoding=csv_encoding, usecols=columns, dtype=dtypes)
+
+def read_strings(path):
+    """
+    Reads a file of a table with every value as a string and '' for the missing values,
+    as csv.reader does with the csv files.
+    """
+    if path.endswith(format_extensions['parquet']):
+        return pd.read_parquet(path).astype('string').fillna('')
+
+    return pd.read_csv(path, sep=';', encoding=csv_encoding, dtype='string', keep_default_na=False)
+
+def read_string_chunks(path, chunk_rows):
+    """
+    Reads a file of a table as read_strings, in DataFrames of chunk_rows rows.
+    """
+    if path.endswith(format_extensions['parquet']):
+        df = read_strings(path)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    yield from pd.read_csv(path, sep=';', encoding=csv_encoding, dtype='string', keep_default_na=False, chunksize=chunk_rows)
+
+def write_file_atomic(df, path, table):
+    """
+    Writes a DataFrame to a temporary file and renames it to the file of the table, so readers never see a half written file.
+
+    Args:
+        df (DataFrame): Rows to write.
+        path (str): csv or parquet file.
+        table (str): csv path of the table, e.g. './data/results.csv', to get the types of its columns.
+    """
+    tmp_path = path + '.part'
+
+    if path.endswith(format_extensions['parquet']):
+        typed_frame(df, table).to_parquet(tmp_path, index=False)
+    else:
+        typed_frame(df, table).to_csv(tmp_path, index=False, sep=';', encoding=csv_encoding)
+
+    os.replace(tmp_path, path)
+
+def write_table(df, table):
+    """
+    Overwrites a table stored as a single file, in the current format.
+    """
+    write_file_atomic(df, table_path(table), table)
+
+def read_single_table(table, columns=None):
+    """
+    Reads a table stored as a single file, in the current format.
+    """
+    return read_file(table_path(table), columns=columns, table=table)
+
+def partition_dir(table):
+    """
+    Returns the folder where the seasons of a table are stored, e.g. './data/results.csv' -> './data/results'.
+    """
+    return os.path.splitext(table)[0]
+
+def partition_path(table, season):
+    """
+    Returns the file where a season of a table is stored, in the current format.
+    """
+    return os.path.join(partition_dir(table), partition_pattern.format(int(season)) + format_extensions[data_format])
+
+def partition_seasons(table):
+    """
+    Returns the seasons stored for a table, in order.
+    """
+    paths = glob.glob(os.path.join(partition_dir(table), partition_pattern.format('*') + format_extensions[data_format]))
+    prefix, suffix = partition_pattern.split('{}')
+    suffix += format_extensions[data_format]
+
+    return sorted(int(os.path.basename(path)[len(prefix):-len(suffix)]) for path in paths)
+
+def partition_files(table, start_year=1949, end_year=date.today().year):
+    """
+    Returns the files of the seasons of a table in the given period, in order.
+    """
+    return [partition_path(table, season) for season in partition_seasons(table) if start_year <= season <= end_year]
+
+def read_table(table, start_year=1949, end_year=date.today().year, columns=None):
+    """
+    Reads only the seasons of a table in the given period.
+
+    Args:
+        table (str): csv path of the table, e.g. './data/results.csv'.
+        start_year (int, optional): year from which you want to read the data
+        end_year (int, optional): year until which you want to read the data
+        columns (list, optional): columns to read, all of them if not given
+
+    Returns:
+        df_table: DataFrame with the rows of the seasons, empty if none is stored
+    """
+    list_partitions = [read_file(path, columns=columns, table=table) for path in partition_files(table, start_year, end_year)]
+
+    if not list_partitions:
+        return pd.DataFrame(columns=columns)
+
+    df_table = pd.concat(list_partitions, ignore_index=True)
+    return df_table
+
+def remove_partitions(table, start_year, end_year, keep):
+    """
+    Removes the seasons of a table in the given period that are not in keep.
+    """
+    for season in partition_seasons(table):
+        if start_year <= season <= end_year and season not in keep:
+            os.remove(partition_path(table, season))
+            logger.info(f"Season {season} removed from {partition_dir(table)}")
+
+def write_partitions(df, table, season_of=season_column, start_year=None, end_year=None):
+    """
+    Overwrites the seasons of a table with the rows of a DataFrame, one file per season.
+
+    Args:
+        df (DataFrame): Rows of the table.
+        table (str): csv path of the table, e.g. './data/results.csv'.
+        season_of (function, optional): Returns the season of each row of a DataFrame.
+        start_year (int, optional): If given with end_year, the seasons of this period without rows are removed,
+            so the stored period has exactly the rows of df
+        end_year (int, optional): year until which the seasons without rows are removed
+
+    Returns:
+        List with the seasons written
+    """
+    os.makedirs(partition_dir(table), exist_ok=True)
+    written = []
+
+    if not df.empty:
+        for season, df_season in df.groupby(season_of(df).to_numpy(), sort=True):
+            write_file_atomic(df_season, partition_path(table, season), table)
+            written.append(int(season))
+
+    if start_year is not None and end_year is not None:
+        remove_partitions(table, start_year, end_year, written)
+
+    logger.info(f"{len(written)} seasons saved in {partition_dir(table)}")
+    return written
+
+def merge_partitions(new_df, table, season_of=season_column, subset=None):
+    """
+    Adds new rows to the seasons of a table, rewriting only the seasons that have new rows.
+
+    Args:
+        new_df (DataFrame): New rows of the table.
+        table (str): csv path of the table, e.g. './data/results.csv'.
+        season_of (function, optional): Returns the season of each row of a DataFrame.
+        subset (str, optional): Column that identifies a row. The stored rows are kept over
+            the new ones with the same value, or over the identical ones if not given
+
+    Returns:
+        List with the seasons rewritten
+    """
+    os.makedirs(partition_dir(table), exist_ok=True)
+    written = []
+
+    if new_df.empty:
+        return written
+
+    for season, df_new_season in new_df.groupby(season_of(new_df).to_numpy(), sort=True):
+        path = partition_path(table, season)
+
+        if os.path.exists(path):
+            # The stored rows are read with the types they were written with, so they are written back unchanged
+            existing_df = read_file(path, table=table)
+            df_new_season = pd.concat([existing_df, typed_frame(df_new_season, table)]).drop_duplicates(subset=subset)
+
+        write_file_atomic(df_new_season, path, table)
+        written.append(int(season))
+
+    logger.info(f"Seasons {written} updated in {partition_dir(table)}")
+    return written
@@ -0,0 +1,471 @@
+# Database backends for the import: MySQL (the production database) and SQLite (a local file with the same schema)
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+from decimal import Decimal
+
+
+######################### VARIABLES ###########################
+
+schema_file = './create_tables.sql'
+
+sqlite_path = './data/motogp.sqlite'
+
+# Seconds a SQLite connection waits for the connections writing at the same time
+sqlite_timeout = 60
+
+# SQL that differs between the backends. Both upserts update every column of the row when its primary key already exists.
+# 'stage' creates an empty staging table without keys, 'merge' upserts all of its rows into the table at once
+# and 'drop_stage' removes it.
+backends = {
+    'mysql': {
+        'placeholder': '%s',
+        'upsert': 'INSERT INTO {table} VALUES ({values}) ON DUPLICATE KEY UPDATE {updates}',
+        'update': '{column} = VALUES({column})',
+        'stage': ['CREATE TEMPORARY TABLE {stage} LIKE {table}', 'ALTER TABLE {stage} DROP PRIMARY KEY'],
+        'drop_stage': 'DROP TEMPORARY TABLE IF EXISTS {stage}',
+        'merge': 'INSERT INTO {table} SELECT {columns} FROM {stage} ON DUPLICATE KEY UPDATE {updates}',
+        'merge_update': '{table}.{column} = {stage}.{column}'
+    },
+    'sqlite': {
+        'placeholder': '?',
+        'upsert': 'INSERT INTO {table} VALUES ({values}) ON CONFLICT ({keys}) DO UPDATE SET {updates}',
+        'update': '{column} = excluded.{column}',
+        'stage': ['CREATE TEMP TABLE {stage} AS SELECT * FROM {table} WHERE 0'],
+        'drop_stage': 'DROP TABLE IF EXISTS temp.{stage}',
+        # WHERE true is needed by SQLite to parse ON CONFLICT after a SELECT
+        'merge': 'INSERT INTO {table} SELECT {columns} FROM {stage} WHERE true ON CONFLICT ({keys}) DO UPDATE SET {updates}',
+        'merge_update': '{column} = excluded.{column}'
+    }
+}
+
+# Prefix of the staging tables of the bulk import
+stage_prefix = 'stage_'
+
+# Format of the files loaded with LOAD DATA LOCAL INFILE, written by load_stage
+load_data_query = (
+    "LOAD DATA LOCAL INFILE '{path}' INTO TABLE {stage} CHARACTER SET utf8mb4 "
+    "FIELDS TERMINATED BY '\\t' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+    "LINES TERMINATED BY '\\n' IGNORE 1 LINES ({columns})"
+)
+
+# Table of create_tables.sql with the content hash of each row already imported, by table and primary key
+hash_table = 'row_hashes'
+
+# Numbers are hashed by value, so the same number written as '6', '6.0' or '6.00' keeps the hash of its row
+number_pattern = re.compile(r'-?\d+(\.\d+)?')
+
+_schema = None
+
+
+######################### CLASSES ###########################
+
+class RowHashes:
+    """
+    Content hashes of the rows of a table already imported, by primary key, so only new or changed rows are sent.
+
+    The hashes are read from the table row_hashes of the database when created. The hashes of the rows
+    sent are kept until save is called, which upserts them in the same transaction as the rows.
+
+    Args:
+        cursor: Cursor of the database.
+        table (str): Name of the table in create_tables.sql.
+        skip_unchanged (bool, optional): If False every row is sent, but the hashes and counts are still updated.
+        orphans (set, optional): Primary keys (see row_key) of the rows that are never sent, e.g. the rows
+            whose foreign keys are missing.
+    """
+
+    def __init__(self, cursor, table, skip_unchanged=True, orphans=None):
+        self.cursor = cursor
+        self.table = table
+        self.skip_unchanged = skip_unchanged
+        self.orphans = orphans or set()
+        self.backend = backend_of(cursor)
+        self.counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'orphans': 0}
+        self.pending = []
+
+        create_table(cursor, hash_table)
+        cursor.execute(
+            f'SELECT row_key, row_hash FROM {hash_table} WHERE table_name = {backends[self.backend]["placeholder"]}', (table,)
+        )
+        self.hashes = dict(cursor.fetchall())
+
+    def changed(self, row):
+        """
+        Checks if a row is new or different from the one imported with the same primary key, and counts it.
+
+        Args:
+            row (tuple): Values of the row in the order of the columns of the table, None for NULL.
+
+        Returns:
+            True if the row has to be sent
+        """
+        key = row_key(self.table, row)
+        if key in self.orphans:
+            self.counts['orphans'] += 1
+            return False
+
+        row_hash = hash_row(row)
+
+        stored = self.hashes.get(key)
+        if stored == row_hash:
+            self.counts['unchanged'] += 1
+            if self.skip_unchanged:
+                return False
+        else:
+            self.counts['inserted' if stored is None else 'updated'] += 1
+
+        self.hashes[key] = row_hash
+        self.pending.append((self.table, key, row_hash))
+        return True
+
+    def save(self):
+        """
+        Upserts the hashes of the rows sent since the last save. They are committed with the rows.
+        """
+        if self.pending:
+            self.cursor.executemany(upsert_query(hash_table, self.backend), self.pending)
+            self.pending = []
+
+
+class UpsertBatch:
+    """
+    Collects the rows of a table and upserts them with executemany in batches, so the database is
+    sent one statement per batch instead of one per row (pymysql turns it into a multi-row INSERT).
+
+    Args:
+        cursor: Cursor of the database.
+        query (str): Upsert query of the table, see upsert_query.
+        batch_size (int): Rows sent to the database at a time.
+        commit_interval (int): Rows upserted between commits. The last rows are committed by finish.
+        hashes (RowHashes, optional): If given, rows equal to the ones already imported are not sent.
+    """
+
+    def __init__(self, cursor, query, batch_size, commit_interval, hashes=None):
+        self.cursor = cursor
+        self.query = query
+        self.batch_size = max(1, batch_size)
+        self.commit_interval = commit_interval
+        self.hashes = hashes
+        self.rows = []
+        self.upserted = 0
+        self.uncommitted = 0
+
+    def add(self, row):
+        """
+        Adds the values of a row, sending the batch when it is full.
+        """
+        if self.hashes is not None and not self.hashes.changed(row):
+            return
+
+        self.rows.append(row)
+
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends the rows of the batch, committing if commit_interval rows have been sent since the last commit.
+        """
+        if self.rows:
+            self.cursor.executemany(self.query, self.rows)
+            if self.hashes is not None:
+                self.hashes.save()
+            self.upserted += len(self.rows)
+            self.uncommitted += len(self.rows)
+            self.rows = []
+
+        if self.commit_interval and self.uncommitted >= self.commit_interval:
+            self.cursor.connection.commit()
+            self.uncommitted = 0
+
+    def finish(self):
+        """
+        Sends the remaining rows and commits them.
+
+        Returns:
+            Number of rows upserted
+        """
+        self.flush()
+        self.cursor.connection.commit()
+        self.uncommitted = 0
+
+        return self.upserted
+
+
+######################### FUNCTIONS ###########################
+
+def read_schema(schema_file=schema_file):
+    """
+    Reads the tables of create_tables.sql.
+
+    Args:
+        schema_file (str, optional): sql file with one CREATE TABLE statement per table and one definition per line.
+
+    Returns:
+        schema (dict): For each table, its 'columns' in order, its primary 'keys', the tables it 'references',
+            its 'foreign_keys' as (column, referenced table, referenced column) and its CREATE TABLE statement ('sql')
+    """
+    with open(schema_file) as file_obj:
+        sql = file_obj.read()
+
+    schema = {}
+    for match in re.finditer(r'CREATE TABLE\s+(\w+)\s*\((.*?)\n\);', sql, re.S):
+        table, body = match.groups()
+        columns = []
+        keys = []
+        references = []
+        foreign_keys = []
+
+        for line in body.strip().splitlines():
+            line = line.strip().rstrip(',')
+            if not line:
+                continue
+
+            if line.startswith('PRIMARY KEY'):
+                keys = [key.strip() for key in re.search(r'\((.*?)\)', line).group(1).split(',')]
+            elif line.startswith('FOREIGN KEY'):
+                column, parent, parent_column = re.search(r'\((\w+)\)\s+REFERENCES\s+(\w+)\s*\((\w+)\)', line).groups()
+                references.append(parent)
+                foreign_keys.append((column, parent, parent_column))
+            else:
+                columns.append(line.split()[0])
+
+        schema[table] = {
+            'columns': columns, 'keys': keys, 'references': references, 'foreign_keys': foreign_keys, 'sql': match.group(0)
+        }
+
+    return schema
+
+def get_schema():
+    """
+    Returns the tables of create_tables.sql, reading the file the first time.
+    """
+    global _schema
+
+    if _schema is None:
+        _schema = read_schema()
+
+    return _schema
+
+def connect_mysql(credentials, local_infile=False):
+    """
+    Opens a connection to the MySQL database.
+
+    Args:
+        credentials (dict): DB_ADDRESS, DB_USER, DB_PASS, DB_PORT and DB_NAME of the database.
+        local_infile (bool, optional): allow LOAD DATA LOCAL INFILE, used by the bulk import.
+            The server must also have local_infile enabled
+
+    Returns:
+        Connection to the database
+    """
+    # Imported here so the SQLite backend does not need pymysql
+    import pymysql
+
+    return pymysql.connect(
+        host=credentials['DB_ADDRESS'],
+        user=credentials['DB_USER'],
+        password=credentials['DB_PASS'],
+        port=int(credentials['DB_PORT']),
+        db=credentials['DB_NAME'],
+        local_infile=local_infile
+    )
+
+def connect_sqlite(path=sqlite_path):
+    """
+    Opens a connection to the SQLite database, creating the tables of create_tables.sql if they do not exist.
+    Foreign keys are enforced as in MySQL.
+
+    Args:
+        path (str, optional): SQLite database file.
+
+    Returns:
+        Connection to the database
+    """
+    # Tables loaded in parallel write to the same file, so wait for the lock of the other connections
+    connection = sqlite3.connect(path, timeout=sqlite_timeout)
+    connection.execute('PRAGMA foreign_keys = ON')
+
+    with open(schema_file) as file_obj:
+        connection.executescript(file_obj.read().replace('CREATE TABLE ', 'CREATE TABLE IF NOT EXISTS '))
+
+    return connection
+
+def row_key(table, row):
+    """
+    Returns the primary key of a row of a table as a single string.
+
+    Args:
+        table (str): Name of the table in create_tables.sql.
+        row (tuple): Values of the row in the order of the columns of the table.
+    """
+    columns = get_schema()[table]['columns']
+
+    return '\x1f'.join(str(row[columns.index(key)]) for key in get_schema()[table]['keys'])
+
+def hash_value(value):
+    """
+    Returns the text of a value hashed in its row: '\x00' for NULL, and numbers without trailing zeros, e.g. '6.0' -> '6'.
+    """
+    if value is None:
+        return '\x00'
+
+    value = str(value)
+    if number_pattern.fullmatch(value):
+        return format(Decimal(value).normalize(), 'f')
+
+    return value
+
+def hash_row(row):
+    """
+    Returns the content hash of a row, which only changes if one of its values changes.
+    """
+    return hashlib.md5('\x1f'.join(hash_value(value) for value in row).encode()).hexdigest()
+
+def create_table(cursor, table):
+    """
+    Creates a table of create_tables.sql if it does not exist, e.g. the tables added after the database was created.
+    """
+    cursor.execute(get_schema()[table]['sql'].replace('CREATE TABLE ', 'CREATE TABLE IF NOT EXISTS ', 1))
+
+def backend_of(cursor):
+    """
+    Returns the name of the backend of a cursor: 'sqlite' or 'mysql'.
+    """
+    return 'sqlite' if isinstance(cursor, sqlite3.Cursor) else 'mysql'
+
+def upsert_query(table, backend):
+    """
+    Builds the query that inserts a row in a table, or updates it if its primary key already exists.
+
+    Args:
+        table (str): Name of the table in create_tables.sql.
+        backend (str): 'mysql' or 'sqlite'.
+
+    Returns:
+        query (str): Query with one placeholder per column of the table.
+    """
+    sql = backends[backend]
+    columns = get_schema()[table]['columns']
+
+    query = sql['upsert'].format(
+        table=table,
+        values=', '.join([sql['placeholder']] * len(columns)),
+        keys=', '.join(get_schema()[table]['keys']),
+        updates=', '.join(sql['update'].format(column=column) for column in columns)
+    )
+
+    return query
+
+def merge_query(table, stage, backend):
+    """
+    Builds the query that upserts every row of a staging table into a table, in the order they were loaded,
+    so a row repeated in the staging table ends with its last values as with upsert_query.
+
+    Args:
+        table (str): Name of the table in create_tables.sql.
+        stage (str): Name of the staging table, with the same columns.
+        backend (str): 'mysql' or 'sqlite'.
+
+    Returns:
+        query (str)
+    """
+    sql = backends[backend]
+    columns = get_schema()[table]['columns']
+
+    query = sql['merge'].format(
+        table=table,
+        stage=stage,
+        columns=', '.join(columns),
+        keys=', '.join(get_schema()[table]['keys']),
+        updates=', '.join(sql['merge_update'].format(table=table, stage=stage, column=column) for column in columns)
+    )
+
+    return query
+
+def create_stage(cursor, table):
+    """
+    Creates an empty staging table with the columns of a table, dropping the one left by a previous load.
+    Staging tables are temporary, so they only exist in the connection of the cursor.
+
+    Returns:
+        stage (str): Name of the staging table
+    """
+    backend = backend_of(cursor)
+    stage = stage_prefix + table
+
+    cursor.execute(backends[backend]['drop_stage'].format(stage=stage))
+    for query in backends[backend]['stage']:
+        cursor.execute(query.format(table=table, stage=stage))
+
+    return stage
+
+def load_stage(cursor, table, stage, df):
+    """
+    Loads the rows of a DataFrame into a staging table. In MySQL they are written to a temporary file
+    read by the server with LOAD DATA LOCAL INFILE; SQLite has no bulk loader, so they are inserted with executemany.
+
+    Args:
+        cursor: Cursor of the database.
+        table (str): Name of the table in create_tables.sql.
+        stage (str): Name of its staging table.
+        df (DataFrame): Rows with the columns of the table in order, with missing values for NULL.
+    """
+    if backend_of(cursor) == 'sqlite':
+        values = df.astype(object).where(df.notna(), None)
+        cursor.executemany(
+            f'INSERT INTO {stage} VALUES ({", ".join(["?"] * len(df.columns))})',
+            values.itertuples(index=False, name=None)
+        )
+        return
+
+    # Backslashes are the escape character of LOAD DATA, and NULL is written as \N
+    df = df.apply(lambda column: column.str.replace('\\', '\\\\', regex=False))
+
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8', newline='') as file_obj:
+        df.to_csv(file_obj, sep='\t', index=False, na_rep='\\N', lineterminator='\n')
+
+    try:
+        cursor.execute(load_data_query.format(
+            path=file_obj.name.replace('\\', '/'),
+            stage=stage,
+            columns=', '.join(get_schema()[table]['columns'])
+        ))
+    finally:
+        os.remove(file_obj.name)
+
+def bulk_upsert(cursor, table, df, hashes=None):
+    """
+    Upserts the rows of a DataFrame into a table with a single set-based statement: the rows are loaded
+    into a staging table, merged into the table and committed.
+
+    Args:
+        cursor: Cursor of the database.
+        table (str): Name of the table in create_tables.sql.
+        df (DataFrame): Rows with the columns of the table in order, with missing values for NULL.
+        hashes (RowHashes, optional): If given, rows equal to the ones already imported are not loaded.
+
+    Returns:
+        Number of rows loaded
+    """
+    backend = backend_of(cursor)
+
+    if hashes is not None:
+        values = df.astype(object).where(df.notna(), None)
+        df = df.loc[[hashes.changed(row) for row in values.itertuples(index=False, name=None)]]
+        if df.empty:
+            return 0
+
+    stage = create_stage(cursor, table)
+    load_stage(cursor, table, stage, df)
+    cursor.execute(merge_query(table, stage, backend))
+    cursor.execute(backends[backend]['drop_stage'].format(stage=stage))
+    if hashes is not None:
+        hashes.save()
+    cursor.connection.commit()
+
+    return len(df)
+
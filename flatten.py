@@ -0,0 +1,219 @@
+# Flatten the JSON payloads of the MotoGP API straight into column buffers, building one DataFrame per table
+import pandas as pd
+
+
+######################### VARIABLES ###########################
+
+# Columns of each table and the types of the numeric ones. The types are fixed so the csv
+# does not depend on which requests are written together (e.g. 1 vs 1.0 when a value is missing).
+results_columns = ['id', 'position', 'best_lap_number', 'best_lap_time', 'average_speed', 'top_speed', 'gap_to_first', 'total_laps', 'total_time', 'points', 'rider_id']
+results_dtypes = {
+    'position': 'Int64',
+    'best_lap_number': 'Int64',
+    'average_speed': 'float64',
+    'top_speed': 'float64',
+    'total_laps': 'Int64',
+    'points': 'float64'
+}
+
+# Columns with the lap time, race time and gap to the first of the results in milliseconds, parsed from the text columns
+results_time_columns = {'best_lap_time_ms': 'best_lap_time', 'total_time_ms': 'total_time', 'gap_to_first_ms': 'gap_to_first'}
+
+sessions_columns = ['id', 'date', 'number', 'track_condition', 'air_temperature', 'humidity', 'ground_temperature', 'weather', 'circuit', 'session_type', 'event_id']
+sessions_dtypes = {'number': 'Int64'}
+
+standings_columns = ['position', 'points', 'rider_id']
+riders_columns = ['rider_id', 'rider_name', 'rider_country']
+teams_columns = ['team_id', 'team_name']
+constructors_columns = ['constructor_id', 'constructor_name']
+RTC_columns = ['rider_id', 'rider_number', 'team_id', 'constructor_id']
+
+
+######################### CLASSES ###########################
+
+class ColumnBuffer:
+    """
+    Collects the rows of a table directly in one list per column, so no dict or DataFrame
+    is created per entry or per request. Optionally drops duplicated rows as they arrive
+    with a hash set, keeping the first occurrence like DataFrame.drop_duplicates.
+
+    Args:
+        columns (list): Names of the columns, in the order of the values of each row.
+        dtypes (dict, optional): Types of the columns of the DataFrame.
+        unique (bool, optional): Drop the rows that have already been added.
+        time_columns (dict, optional): Columns added at the end of the DataFrame with the times of
+            another column in milliseconds (see time_to_ms), e.g. results_time_columns.
+    """
+
+    def __init__(self, columns, dtypes=None, unique=False, time_columns=None):
+        self.columns = columns
+        self.dtypes = dtypes or {}
+        self.time_columns = time_columns or {}
+        self.data = [[] for _ in columns]
+        self._seen = set() if unique else None
+
+    def __len__(self):
+        return len(self.data[0])
+
+    def append(self, row):
+        """
+        Adds a row, given as a tuple with a value per column.
+        """
+        if self._seen is not None:
+            if row in self._seen:
+                return
+            self._seen.add(row)
+
+        for column_data, value in zip(self.data, row):
+            column_data.append(value)
+
+    def extend(self, other):
+        """
+        Adds the rows of another buffer with the same columns, e.g. the buffer of a single request.
+        """
+        if self._seen is not None:
+            for row in zip(*other.data):
+                self.append(row)
+            return
+
+        for column_data, other_data in zip(self.data, other.data):
+            column_data.extend(other_data)
+
+    def to_frame(self, start=0):
+        """
+        Builds a DataFrame with the rows of the buffer.
+
+        Args:
+            start (int, optional): First row to include, e.g. the length of the buffer before a request was added.
+
+        Returns:
+            DataFrame with the buffered rows and the types of the buffer
+        """
+        df = pd.DataFrame({column: column_data[start:] for column, column_data in zip(self.columns, self.data)}, columns=self.columns)
+        df = df.astype(self.dtypes)
+
+        if self.time_columns:
+            # All the time columns are parsed in a single pass, as the cost of parsing is mostly per call
+            times = time_to_ms(pd.concat([df[source] for source in self.time_columns.values()], ignore_index=True))
+            for i, column in enumerate(self.time_columns):
+                df[column] = times.array[i * len(df):(i + 1) * len(df)]
+
+        return df
+
+
+######################### FUNCTIONS ###########################
+
+def time_to_ms(column):
+    """
+    Parses a column of times to integer milliseconds, all at once with a regular expression.
+    Lap and race times come as '1:40.123' or '1:02:03.456' and gaps as '0.321' or '+0.321'.
+
+    Args:
+        column (Series): Times as text.
+
+    Returns:
+        Series of Int64 with the milliseconds, missing when the value is not a time (e.g. '1 Lap')
+    """
+    parts = column.astype('string').str.strip().str.extract(r'^\+?(?:(?:(\d+):)?(\d+):)?(\d+)(?:\.(\d{1,3})\d*)?$')
+
+    # Hours, minutes and fraction are optional. Fraction of second to milliseconds: '1' -> 100, '12' -> 120
+    parts = parts.fillna({0: '0', 1: '0', 3: '0'})
+    parts[3] = parts[3].str.ljust(3, '0')
+    hours, minutes, seconds, milliseconds = parts.astype('float64').to_numpy().T
+
+    # Floats are exact for these integers; the values that are not times are NaN and end up missing
+    return pd.Series(((hours * 60 + minutes) * 60 + seconds) * 1000 + milliseconds, index=column.index).astype('Int64')
+
+def flatten_results(json_session_results, buffer, *extra):
+    """
+    Adds the classification of a session to a buffer with results_columns (plus the extra values).
+
+    Args:
+        json_session_results (json): json containing the classification of a session.
+        buffer (ColumnBuffer): Buffer where the rows are added.
+        extra: Values added at the end of every row, e.g. the session id.
+    """
+    append = buffer.append
+
+    for entry in json_session_results['classification']:
+        best_lap = entry.get('best_lap')
+        gap = entry.get('gap')
+
+        append((
+            entry['id'],
+            entry['position'],
+            best_lap['number'] if best_lap else None,
+            best_lap['time'] if best_lap else None,
+            entry.get('average_speed') or None,
+            entry.get('top_speed') or None,
+            gap['first'] if gap else None,
+            entry.get('total_laps') or None,
+            entry.get('time') or None,
+            entry.get('points') or None,
+            entry['rider']['id']
+        ) + extra)
+
+def flatten_sessions(json_event_sessions, buffer, *extra):
+    """
+    Adds the sessions of an event to a buffer with sessions_columns (plus the extra values).
+
+    Args:
+        json_event_sessions (json): json containing the sessions of an event.
+        buffer (ColumnBuffer): Buffer where the rows are added.
+        extra: Values added at the end of every row, e.g. the season.
+    """
+    append = buffer.append
+
+    for entry in json_event_sessions:
+        condition = entry['condition']
+
+        append((
+            entry['id'],
+            entry['date'],
+            entry['number'],
+            condition['track'],
+            condition['air'],
+            condition['humidity'],
+            condition['ground'],
+            condition['weather'],
+            entry['circuit'],
+            entry['type'],
+            entry['event']['id']
+        ) + extra)
+
+def flatten_standings(json_season_standings, buffer, *extra):
+    """
+    Adds the rider standings of a season to a buffer with standings_columns (plus the extra values).
+
+    Args:
+        json_season_standings (json): json containing the championship standings of a season.
+        buffer (ColumnBuffer): Buffer where the rows are added.
+        extra: Values added at the end of every row, e.g. the season.
+    """
+    append = buffer.append
+
+    for entry in json_season_standings['classification']:
+        append((entry['position'], entry['points'], entry['rider']['id']) + extra)
+
+def flatten_rtc(json_season_standings, riders, teams, constructors, RTC, *extra):
+    """
+    Adds the riders, teams, constructors and their connection in a season to their buffers.
+
+    Args:
+        json_season_standings (json): json containing the championship standings of a season.
+        riders (ColumnBuffer): Buffer with riders_columns.
+        teams (ColumnBuffer): Buffer with teams_columns.
+        constructors (ColumnBuffer): Buffer with constructors_columns.
+        RTC (ColumnBuffer): Buffer with RTC_columns (plus the extra values).
+        extra: Values added at the end of every RTC row, e.g. the season.
+    """
+    for entry in json_season_standings['classification']:
+        rider = entry['rider']
+        team = entry.get('team')
+        constructor = entry['constructor']
+        team_id = team['id'] if team else None
+
+        riders.append((rider['id'], rider['full_name'], rider['country']['name']))
+        teams.append((team_id, team['name'] if team else None))
+        constructors.append((constructor['id'], constructor['name']))
+        RTC.append((rider['id'], rider['number'], team_id, constructor['id']) + extra)
@@ -0,0 +1,253 @@
+# Get events, sessions and results data from MotoGP API in one pipelined crawl and store it in tables as csv
+import asyncio
+import logging
+from datetime import date
+from functools import partial
+from api_client import base_url, crawl_concurrency, request_api, request_api_async
+from crawl_ledger import season_settled_time, settled_time
+from categories import concat_frames, discover_categories, iter_other_categories
+from data_store import merge_partitions, partition_dir, season_column, table_name, write_partitions
+from get_events import specific_events, read_standings_inputs
+from get_sessions import specific_session
+from get_results import results_csv_columns, results_seasons
+from flatten import ColumnBuffer, flatten_results, results_dtypes, results_time_columns
+from metrics import metrics, write_reports
+
+logging.basicConfig(
+    filename='./logs/get_all.log', level=logging.INFO,
+    format= '[%(asctime)s] {%(pathname)s:%(lineno)d} %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d   %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+######################### VARIABLES ###########################
+
+seasons_ep = 'seasons'
+
+# Stored as one csv per season in ./data/events, ./data/sessions and ./data/results (see data_store.py)
+out_events = './data/events.csv'
+out_sessions = './data/sessions.csv'
+out_results = './data/results.csv'
+
+# Requests in flight at the same time across all the levels of the crawl
+concurrency = crawl_concurrency
+
+
+######################### FUNCTIONS ###########################
+
+async def crawl_session(session_id, session_date, category, semaphore):
+    """
+    Requests the results of a session.
+
+    Args:
+        session_id (str): Id of the session.
+        session_date (str): Date of the session, a classification cached while it was running is revalidated.
+        category (str): Category of the session.
+        semaphore (asyncio.Semaphore): Semaphore shared by all the requests of the crawl.
+
+    Returns:
+        df_session_results: DataFrame with the results of the session, or None if there are no results
+    """
+    results_sessions_ep = 'session/' + session_id + '/classification'
+
+    json_session_results = await request_api_async(base_url, results_sessions_ep, semaphore, settled_after=settled_time(session_date))
+    if json_session_results == []:
+        return None
+
+    buffer = ColumnBuffer(results_csv_columns, results_dtypes, time_columns=results_time_columns)
+    flatten_results(json_session_results, buffer, session_id, category)
+    metrics.add_rows('results', len(buffer), 'results')
+
+    return buffer.to_frame()
+
+async def crawl_event(event_id, event_end, year, category, category_id, semaphore):
+    """
+    Requests the sessions of an event in a category and, as soon as they are known, the results of each session.
+
+    Args:
+        event_id (str): Id of the event.
+        event_end (str): Last day of the event, sessions cached while it was running are revalidated.
+        year (int): Season of the event.
+        category (str): Name of the racing category.
+        category_id (str): Id for the racing category.
+        semaphore (asyncio.Semaphore): Semaphore shared by all the requests of the crawl.
+
+    Returns:
+        List with the sessions DataFrame of the event (or None) and the list of results DataFrames
+    """
+    sessions_ep = 'sessions?eventUuid=' + event_id + '&categoryUuid=' + category_id
+
+    json_event_sessions = await request_api_async(base_url, sessions_ep, semaphore, settled_after=settled_time(event_end))
+    if json_event_sessions == []:
+        return [None, []]
+
+    df_event_sessions = specific_session(json_event_sessions)
+    df_event_sessions['season'] = year
+    df_event_sessions['category'] = category
+    metrics.add_rows('sessions', len(df_event_sessions), 'sessions')
+
+    list_results = await asyncio.gather(*[
+        crawl_session(session_id, session_date, category, semaphore)
+        for session_id, session_date in zip(df_event_sessions['id'], df_event_sessions['date'])
+    ])
+
+    return [df_event_sessions, [df for df in list_results if df is not None]]
+
+async def crawl_season(season_id, year, category_ids, semaphore):
+    """
+    Requests the events of a season and, as soon as they are known, the sessions of each event in every category.
+    The events are shared by all the categories, so they are requested once.
+
+    Args:
+        season_id (str): Id of the season.
+        year (int): Year of the season.
+        category_ids (dict): Id of each racing category to crawl, by name.
+        semaphore (asyncio.Semaphore): Semaphore shared by all the requests of the crawl.
+
+    Returns:
+        List with the events DataFrame of the season (or None), the list of sessions DataFrames
+        and the list of results DataFrames
+    """
+    events_ep = 'events?seasonUuid=' + season_id
+
+    json_season_events = await request_api_async(base_url, events_ep, semaphore, settled_after=season_settled_time(year))
+    if json_season_events == []:
+        return [None, [], []]
+
+    df_season_events = specific_events(json_season_events)
+    df_season_events['season'] = year
+    metrics.add_rows('events', len(df_season_events), 'events')
+
+    # Gathered category by category, so the rows of a season have the order of the staged crawl
+    list_events = await asyncio.gather(*[
+        crawl_event(event_id, event_end, year, category, category_id, semaphore)
+        for category, category_id in category_ids.items()
+        for event_id, event_end in zip(df_season_events['id'], df_season_events['date_end'])
+    ])
+
+    list_sessions = [df_sessions for df_sessions, _ in list_events if df_sessions is not None]
+    list_results = [df_results for _, list_event_results in list_events for df_results in list_event_results]
+
+    return [df_season_events, list_sessions, list_results]
+
+async def crawl_all(seasons_info, category_ids, start_year=1949, end_year=date.today().year, concurrency=crawl_concurrency):
+    """
+    Crawls events, sessions and results of every season in the given period.
+    Each level is requested as soon as its parent is known, so the crawl takes roughly
+    the depth of the tree instead of the sum of the levels. Outputs keep the order
+    of the staged crawl whatever order the requests complete in.
+
+    Args:
+        seasons_info (list): List of seasons json data.
+        category_ids (dict): Id of each racing category to crawl, by name.
+        start_year (int): year from which you want to get the data
+        end_year (int): year until which you want to get the data
+        concurrency (int): maximum number of requests in flight at the same time
+
+    Returns:
+        List with the DataFrames of events, sessions and results
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    seasons = [season for season in seasons_info if start_year <= season['year'] <= end_year]
+    list_seasons = await asyncio.gather(*[crawl_season(season['id'], season['year'], category_ids, semaphore) for season in seasons])
+
+    list_events = [df_events for df_events, _, _ in list_seasons if df_events is not None]
+    list_sessions = [df for _, list_season_sessions, _ in list_seasons for df in list_season_sessions]
+    list_results = [df for _, _, list_season_results in list_seasons for df in list_season_results]
+
+    # Empty if the API returned nothing for the period
+    df_all_events = concat_frames(list_events)
+    df_all_sessions = concat_frames(list_sessions)
+    df_all_results = concat_frames(list_results)
+    logger.info(f'Crawled {len(df_all_events)} events, {len(df_all_sessions)} sessions and {len(df_all_results)} results')
+
+    return [df_all_events, df_all_sessions, df_all_results]
+
+def sessions_seasons(df_sessions):
+    """
+    Returns the season of each session, by id, or an empty dictionary if there are no sessions.
+    """
+    if df_sessions.empty:
+        return {}
+
+    return dict(zip(df_sessions['id'], df_sessions['season']))
+
+def fetch_new_data(out_filename, new_df, season_of=season_column):
+    """
+    Adds new data to the data already stored on the csv
+
+    Args:
+        out_filename (str): csv where the data is stored
+        new_df (DataFrame): new data to add to the csv
+        season_of (function, optional): returns the season of each row, its 'season' column by default
+
+    Returns:
+        Saves updated data to the csv of the seasons with new data
+    """
+    # Add the new rows to the csv of their seasons, keeping the ones already stored
+    with metrics.stage(table_name(out_filename) + '/merge'):
+        merge_partitions(new_df, out_filename, season_of=season_of, subset='id')
+    logger.info(f"Updated data saved to {partition_dir(out_filename)}")
+
+def run(all_or_fetch, year_from, year_until, json_seasons_info=None, concurrency=concurrency, categories=None):
+    """
+    Gets the events, sessions and results from year_from to year_until and saves them in their csv files.
+
+    Args:
+        all_or_fetch (str): 'all' to overwrite the existant data or 'fetch' to add new data to it
+        year_from (int): year from which you want to get the data
+        year_until (int): year until which you want to get the data
+        json_seasons_info (list, optional): seasons json data, requested from the API if not given
+        concurrency (int, optional): requests in flight at the same time, shared by all the categories
+        categories (list, optional): names of the categories to crawl, or ['all'] (see categories.py).
+            Defaults to categories.crawl_categories
+    """
+    # Get seasons general info
+    if json_seasons_info is None:
+        json_seasons_info = request_api(base_url, seasons_ep)
+
+    category_ids = discover_categories(year_from, year_until, categories, seasons_info=json_seasons_info)
+
+    logger.info(f'Crawling events, sessions and results of {list(category_ids)} from {year_from} to {year_until}...')
+    df_events, df_sessions, df_results = asyncio.run(crawl_all(json_seasons_info, category_ids, start_year=year_from, end_year=year_until, concurrency=concurrency))
+
+    # The results are stored with the season of their session
+    season_of_results = partial(results_seasons, seasons=sessions_seasons(df_sessions))
+
+    if all_or_fetch == 'all':
+        # Sessions and results of the other categories stored in the period are kept
+        df_sessions = concat_frames([df_sessions, *iter_other_categories(out_sessions, list(category_ids), start_year=year_from, end_year=year_until)])
+        df_results = concat_frames([df_results, *iter_other_categories(out_results, list(category_ids), start_year=year_from, end_year=year_until)])
+        season_of_results = partial(results_seasons, seasons=sessions_seasons(df_sessions))
+
+        # Save the dfs as one csv per season
+        write_partitions(df_events, out_events, start_year=year_from, end_year=year_until)
+        logger.info(f'Data saved in {partition_dir(out_events)}')
+
+        write_partitions(df_sessions, out_sessions, start_year=year_from, end_year=year_until)
+        logger.info(f'Data saved in {partition_dir(out_sessions)}')
+
+        write_partitions(df_results, out_results, season_of=season_of_results, start_year=year_from, end_year=year_until)
+        logger.info(f'Data saved in {partition_dir(out_results)}')
+
+    elif all_or_fetch == 'fetch':
+        # Add data from specific seasons to the already existant csv
+        fetch_new_data(out_events, df_events)
+        fetch_new_data(out_sessions, df_sessions)
+        fetch_new_data(out_results, df_results, season_of=season_of_results)
+
+
+######################### MAIN ###########################
+
+if __name__ == '__main__':
+    # Read inputs
+    all_or_fetch, year_from, year_until = read_standings_inputs()
+
+    # The report is also saved if the run fails, to see where it stopped
+    try:
+        with metrics.stage('all'):
+            run(all_or_fetch, year_from, year_until)
+    finally:
+        write_reports()
@@ -1,8 +1,14 @@
 # Get data from MotoGP API and store it in tables as csv
-import requests
 import logging
+import os
 import pandas as pd
 from datetime import date
+from api_client import base_url, request_api
+from crawl_ledger import season_settled_time
+from categories import concat_frames, discover_categories, iter_other_categories, map_categories
+from data_store import merge_partitions, partition_dir, read_single_table, table_path, write_partitions, write_table
+from metrics import metrics, write_reports
+from flatten import ColumnBuffer, flatten_rtc, flatten_standings, riders_columns, teams_columns, constructors_columns, RTC_columns, standings_columns
 
 logging.basicConfig(
     filename='./logs/get_data.log', level=logging.INFO,
@@ -14,50 +20,50 @@ logger = logging.getLogger(__name__)
 
 ######################### VARIABLES ###########################
 
-base_url = 'https://api.motogp.pulselive.com/motogp/v1/results/'
-category_id_motogp = 'e8c110ad-64aa-4e8e-8a86-f2f152f6a942'
 seasons_ep = 'seasons'
 
 out_riders = './data/riders.csv'
 out_teams = './data/teams.csv'
 out_constructors = './data/constructors.csv'
+# Stored as one csv per season in ./data/riders_teams_constructors and ./data/standings (see data_store.py)
 out_RTC = './data/riders_teams_constructors.csv'
+out_standings = './data/standings.csv'
 
 
 ######################### FUNCTIONS ###########################
 
-def request_api(base_url, endpoint):
+def rtc(seasons_info, category_id, start_year=1949, end_year=date.today().year, category='MotoGP'):
     """
-    Makes a GET request to the given API endpoint and returns the JSON response.
+    Processes data from riders, teams, and constructors for a given category and time range, 
+    aggregates it across seasons, and saves the results into CSV files.
 
     Args:
-        base_url (str): Base url of the API.
-        endpoint (str): Specific API endpoint.
+        seasons_info (list): List of seasons json data.
+        category_id (str): Id for the racing category.
+        start_year (int, optional): Filter seasons from this year onward. Defaults to 1949.
+        end_year (int, optional): Filter seasons up to this year. Defaults to the current year.
+        category (str, optional): Name of the category, stored in the column 'category' of the connection table.
 
     Returns:
-        data (list): JSON data from the API.
+        Dataframes with data from the specified seasons for:
+            - Riders
+            - Teams
+            - Constructors
+            - Riders, teams, and constructors connection table
     """
-    response = requests.get(base_url + endpoint)
+    return rtc_standings(seasons_info, category_id, start_year=start_year, end_year=end_year, category=category)[:4]
 
-    if response.status_code == 200:
-        #print("Successfully retrieved data")
-        data = response.json()
-    else:
-        logger.warning(f"Failed to retrieve data. Status code: {response.status_code}")
-        data = []
-
-    return data
-
-def rtc(seasons_info, category_id, start_year=1949, end_year=date.today().year):
+def rtc_standings(seasons_info, category_id, start_year=1949, end_year=date.today().year, category='MotoGP'):
     """
-    Processes data from riders, teams, and constructors for a given category and time range, 
-    aggregates it across seasons, and saves the results into CSV files.
+    Same as rtc, but the rider standings are also flattened from the same standings request,
+    so each season is requested only once for the five tables.
 
     Args:
         seasons_info (list): List of seasons json data.
         category_id (str): Id for the racing category.
         start_year (int, optional): Filter seasons from this year onward. Defaults to 1949.
         end_year (int, optional): Filter seasons up to this year. Defaults to the current year.
+        category (str, optional): Name of the category, stored in the column 'category' of the connection table and the standings.
 
     Returns:
         Dataframes with data from the specified seasons for:
@@ -65,11 +71,15 @@ def rtc(seasons_info, category_id, start_year=1949, end_year=date.today().year):
             - Teams
             - Constructors
             - Riders, teams, and constructors connection table
+            - Rider standings
     """
-    list_riders = []
-    list_teams = []
-    list_constructors = []
-    list_RTC = []
+    # Every season is flattened into the same buffers, which drop the repeated riders, teams,
+    # constructors and connections as they arrive, so a single DataFrame is built per table at the end
+    riders = ColumnBuffer(riders_columns, unique=True)
+    teams = ColumnBuffer(teams_columns, unique=True)
+    constructors = ColumnBuffer(constructors_columns, unique=True)
+    RTC = ColumnBuffer(RTC_columns + ['season', 'category'], unique=True)
+    standings = ColumnBuffer(standings_columns + ['season', 'category'])
 
     for season in seasons_info:
         id = season['id']
@@ -81,121 +91,118 @@ def rtc(seasons_info, category_id, start_year=1949, end_year=date.today().year):
 
         standings_ep = 'standings?seasonUuid=' + id + '&categoryUuid=' + category_id
 
-        json_season_standings = request_api(base_url, standings_ep)
-        classification_data = json_season_standings['classification']
-        
-        flattened_data_riders = []
-        flattened_data_teams = []
-        flattened_data_constructors = []
-        flattened_data_RTC = []
-
-        for entry in classification_data:
-
-            # Process riders data
-            flattened_entry_riders = {
-                'rider_id': entry['rider']['id'],
-                'rider_name': entry['rider']['full_name'],
-                'rider_country': entry['rider']['country']['name']
-            }
-            flattened_data_riders.append(flattened_entry_riders)
-
-            # Process teams data
-            flattened_entry_teams = {
-                'team_id': entry['team']['id'] if entry.get('team') else None,
-                'team_name': entry['team']['name'] if entry.get('team') else None
-            }
-            flattened_data_teams.append(flattened_entry_teams)
-
-            # Process constructors data
-            flattened_entry_constructors = {
-                'constructor_id': entry['constructor']['id'],
-                'constructor_name': entry['constructor']['name']
-            }
-            flattened_data_constructors.append(flattened_entry_constructors)
-
-            # Process RTC data
-            flattened_entry_RTC = {
-                'rider_id': entry['rider']['id'],
-                'rider_number': entry['rider']['number'],
-                'team_id': entry['team']['id'] if entry.get('team') else None,
-                'constructor_id': entry['constructor']['id']
-            }
-            flattened_data_RTC.append(flattened_entry_RTC)
-        
-        # Store riders data for each season in df and append in a list with the ones from other seasons
-        df_season_riders = pd.DataFrame(flattened_data_riders)
-        list_riders.append(df_season_riders)
-        
-        # Store teams data for each season in df and append in a list with the ones from other seasons
-        df_season_teams = pd.DataFrame(flattened_data_teams)
-        list_teams.append(df_season_teams)
-        
-        # Store constructors data for each season in df and append in a list with the ones from other seasons
-        df_season_constructors = pd.DataFrame(flattened_data_constructors)
-        list_constructors.append(df_season_constructors)
-        
-        # Store RTC data for each season in df and append in a list with the ones from other seasons
-        df_season_RTC = pd.DataFrame(flattened_data_RTC)
-        df_season_RTC['season'] = year
-        list_RTC.append(df_season_RTC)
+        json_season_standings = request_api(base_url, standings_ep, settled_after=season_settled_time(year))
+        if json_season_standings == []:
+            continue
+
+        # Process riders, teams, constructors and RTC data
+        flatten_rtc(json_season_standings, riders, teams, constructors, RTC, year, category)
+
+        # Process standings data
+        flatten_standings(json_season_standings, standings, year, category)
+
+        metrics.add_rows('standings', len(json_season_standings['classification']), 'standings')
+
+    df_all_seasons_riders = riders.to_frame()
+    df_all_seasons_teams = teams.to_frame()
+    df_all_seasons_constructors = constructors.to_frame()
+    df_all_seasons_RTC = RTC.to_frame()
+    df_all_seasons_standings = standings.to_frame()
+
+    return [df_all_seasons_riders, df_all_seasons_teams, df_all_seasons_constructors, df_all_seasons_RTC, df_all_seasons_standings]
+
+def all_categories_rtc_standings(seasons_info, category_ids, start_year=1949, end_year=date.today().year):
+    """
+    Same as rtc_standings for several categories at the same time, one thread per category.
+    Riders, teams and constructors that race in more than one category are kept once.
 
-        print(year)
+    Args:
+        seasons_info (list): List of seasons json data.
+        category_ids (dict): Id of each category to crawl, by name (see categories.discover_categories).
+        start_year (int, optional): Filter seasons from this year onward. Defaults to 1949.
+        end_year (int, optional): Filter seasons up to this year. Defaults to the current year.
+
+    Returns:
+        Dataframes with data from the specified seasons and categories for the same five tables as rtc_standings
+    """
+    def category_rtc_standings(category, category_id):
+        return rtc_standings(seasons_info, category_id, start_year=start_year, end_year=end_year, category=category)
 
-    # Concat riders df from all seasons
-    df_all_seasons_riders = pd.concat(list_riders, ignore_index=True)
-    df_all_seasons_riders = df_all_seasons_riders.drop_duplicates()
+    # Each table is concatenated across the categories, and is empty if there are none
+    list_tables = map_categories(category_rtc_standings, category_ids)
+    df_riders, df_teams, df_constructors, df_RTC, df_standings = [concat_frames(tables[i] for tables in list_tables) for i in range(5)]
 
-    # Concat teams df from all seasons
-    df_all_seasons_teams = pd.concat(list_teams, ignore_index=True)
-    df_all_seasons_teams = df_all_seasons_teams.drop_duplicates()
+    return [df_riders.drop_duplicates(), df_teams.drop_duplicates(), df_constructors.drop_duplicates(), df_RTC, df_standings]
 
-    # Concat constructors df from all seasons
-    df_all_seasons_constructors = pd.concat(list_constructors, ignore_index=True)
-    df_all_seasons_constructors = df_all_seasons_constructors.drop_duplicates()
+def with_stored_rows(df_new, table):
+    """
+    Returns the rows stored in a table saved as a single file followed by the new ones, each row once.
 
-    # Concat RTC df from all seasons
-    df_all_seasons_RTC = pd.concat(list_RTC, ignore_index=True)
-    df_all_seasons_RTC = df_all_seasons_RTC.drop_duplicates()
+    Args:
+        df_new (DataFrame): New rows of the table.
+        table (str): csv path of the table, e.g. './data/riders.csv'.
 
-    return [df_all_seasons_riders, df_all_seasons_teams, df_all_seasons_constructors, df_all_seasons_RTC]
+    Returns:
+        DataFrame with the stored and the new rows, only the new ones if the table is not stored yet
+    """
+    if not os.path.exists(table_path(table)):
+        return df_new
 
-def fetch_new_rtc(out_riders, out_teams, out_constructors, seasons_info, category_id, start_year=1949, end_year=date.today().year):
+    return pd.concat([read_single_table(table), df_new]).drop_duplicates()
+
+def fetch_new_rtc(out_riders, out_teams, out_constructors, seasons_info, category_ids, start_year=1949, end_year=date.today().year, out_standings=None):
     """
+    Requests data from the API and fetches it to the data already stored on the csv files
+
+    Args:
+        out_riders (str): csv with the riders.
+        out_teams (str): csv with the teams.
+        out_constructors (str): csv with the constructors.
+        seasons_info (list): List of seasons json data.
+        category_ids (dict): Id of each category to crawl, by name.
+        start_year (int, optional): Year from which you want to get the data.
+        end_year (int, optional): Year until which you want to get the data.
+        out_standings (str, optional): csv with the rider standings, updated from the same requests if given.
+
+    Returns:
+        Saves updated data to the existant csv files
     """
     # Extract data from start_year until end_year into DataFrames
-    new_df_riders, new_df_teams, new_df_constructors, new_df_RTC = rtc(json_seasons_info, category_id_motogp, start_year=year_from, end_year=year_until)
+    new_df_riders, new_df_teams, new_df_constructors, new_df_RTC, new_df_standings = all_categories_rtc_standings(seasons_info, category_ids, start_year=start_year, end_year=end_year)
 
-    # Load existing data from CSV
-    existing_riders_df = pd.read_csv(out_riders, sep=';', encoding='unicode_escape')
-    logger.info(f"Existing data loaded from {out_riders}")
+    with metrics.stage('standings/merge'):
+        # Load existing data from CSV
+        existing_riders_df = read_single_table(out_riders)
+        logger.info(f"Existing data loaded from {out_riders}")
 
-    existing_teams_df = pd.read_csv(out_teams, sep=';', encoding='unicode_escape')
-    logger.info(f"Existing data loaded from {out_teams}")
+        existing_teams_df = read_single_table(out_teams)
+        logger.info(f"Existing data loaded from {out_teams}")
 
-    existing_constructors_df = pd.read_csv(out_constructors, sep=';', encoding='unicode_escape')
-    logger.info(f"Existing data loaded from {out_constructors}")
+        existing_constructors_df = read_single_table(out_constructors)
+        logger.info(f"Existing data loaded from {out_constructors}")
 
-    existing_RTC_df = pd.read_csv(out_RTC, sep=';', encoding='unicode_escape')
-    logger.info(f"Existing data loaded from {out_RTC}")
+        # Find which of the new data is not already in the CSV
+        updated_riders_df = pd.concat([existing_riders_df, new_df_riders]).drop_duplicates()
+        updated_teams_df = pd.concat([existing_teams_df, new_df_teams]).drop_duplicates()
+        updated_constructors_df = pd.concat([existing_constructors_df, new_df_constructors]).drop_duplicates()
 
-    # Find which of the new data is not already in the CSV
-    updated_riders_df = pd.concat([existing_riders_df, new_df_riders]).drop_duplicates()
-    updated_teams_df = pd.concat([existing_teams_df, new_df_teams]).drop_duplicates()
-    updated_constructors_df = pd.concat([existing_constructors_df, new_df_constructors]).drop_duplicates()
-    updated_RTC_df = pd.concat([existing_RTC_df, new_df_RTC]).drop_duplicates()
+        # Save updated data back to the CSV
+        write_table(updated_riders_df, out_riders)
+        logger.info(f"Updated data saved to {out_riders}")
 
-    # Save updated data back to the CSV
-    updated_riders_df.to_csv(out_riders, index=False, sep=';')
-    logger.info(f"Updated data saved to {out_riders}")
+        write_table(updated_teams_df, out_teams)
+        logger.info(f"Updated data saved to {out_teams}")
 
-    updated_teams_df.to_csv(out_teams, index=False, sep=';')
-    logger.info(f"Updated data saved to {out_teams}")
+        write_table(updated_constructors_df, out_constructors)
+        logger.info(f"Updated data saved to {out_constructors}")
 
-    updated_constructors_df.to_csv(out_constructors, index=False, sep=';')
-    logger.info(f"Updated data saved to {out_constructors}")
+        # RTC and standings are only rewritten for the seasons with new data
+        merge_partitions(new_df_RTC, out_RTC)
+        logger.info(f"Updated data saved to {partition_dir(out_RTC)}")
 
-    updated_RTC_df.to_csv(out_RTC, index=False, sep=';')
-    logger.info(f"Updated data saved to {out_RTC}")
+        if out_standings is not None:
+            merge_partitions(new_df_standings, out_standings)
+            logger.info(f"Updated data saved to {partition_dir(out_standings)}")
 
 def read_standings_inputs():
     """
@@ -234,34 +241,69 @@ def read_standings_inputs():
     
     return [answer, answer2, answer3]
 
+def run(all_or_fetch, year_from, year_until, json_seasons_info=None, categories=None):
+    """
+    Gets the riders, teams, constructors, RTC and standings from year_from to year_until and saves them in their csv files.
 
-######################### MAIN ###########################
+    Args:
+        all_or_fetch (str): 'all' to overwrite the existant data or 'fetch' to add new data to it
+        year_from (int): year from which you want to get the data
+        year_until (int): year until which you want to get the data
+        json_seasons_info (list, optional): seasons json data, requested from the API if not given
+        categories (list, optional): names of the categories to crawl, or ['all'] (see categories.py).
+            Defaults to categories.crawl_categories
+    """
+    # Get seasons general info
+    if json_seasons_info is None:
+        json_seasons_info = request_api(base_url, seasons_ep)
 
-# Read inputs
-all_or_fetch, year_from, year_until = read_standings_inputs()
+    category_ids = discover_categories(year_from, year_until, categories, seasons_info=json_seasons_info)
 
-# Get seasons general info
-json_seasons_info = request_api(base_url, seasons_ep)
+    if all_or_fetch == 'all':
+        logger.info(f'Getting all data from {year_from} to {year_until} and overwriting the existant...')
+        # Get riders, teams, constructors, RTC and standings data
+        df_riders, df_teams, df_constructors, df_RTC, df_standings = all_categories_rtc_standings(json_seasons_info, category_ids, start_year=year_from, end_year=year_until)
 
-if all_or_fetch == 'all':
-    logger.info(f'Getting all data from {year_from} to {year_until} and overwriting the existant...')
-    # Get riders, teams, constructors, and RTC data
-    df_riders, df_teams, df_constructors, df_RTC = rtc(json_seasons_info, category_id_motogp, start_year=year_from, end_year=year_until)
+        # RTC and standings of the other categories stored in the period are kept
+        df_RTC = concat_frames([df_RTC, *iter_other_categories(out_RTC, list(category_ids), start_year=year_from, end_year=year_until)])
+        df_standings = concat_frames([df_standings, *iter_other_categories(out_standings, list(category_ids), start_year=year_from, end_year=year_until)])
 
-    # Save riders, teams, constructors, and RTC data in csv
-    df_riders.to_csv(out_riders, index=False, sep=';')
-    logger.info(f"Riders data saved in {out_riders}")
+        # Riders, teams and constructors are single files referenced by the seasons outside the period too, so they are never truncated
+        df_riders = with_stored_rows(df_riders, out_riders)
+        df_teams = with_stored_rows(df_teams, out_teams)
+        df_constructors = with_stored_rows(df_constructors, out_constructors)
 
-    df_teams.to_csv(out_teams, index=False, sep=';')
-    logger.info(f"Teams data saved in {out_teams}")
+        # Save riders, teams, constructors, and RTC data in csv
+        write_table(df_riders, out_riders)
+        logger.info(f"Riders data saved in {out_riders}")
 
-    df_constructors.to_csv(out_constructors, index=False, sep=';')
-    logger.info(f"Constructors data saved in {out_constructors}")
+        write_table(df_teams, out_teams)
+        logger.info(f"Teams data saved in {out_teams}")
+
+        write_table(df_constructors, out_constructors)
+        logger.info(f"Constructors data saved in {out_constructors}")
     
-    df_RTC.to_csv(out_RTC, index=False, sep=';')
-    logger.info(f"RTC data saved in {out_RTC}")
+        write_partitions(df_RTC, out_RTC, start_year=year_from, end_year=year_until)
+        logger.info(f"RTC data saved in {partition_dir(out_RTC)}")
+
+        write_partitions(df_standings, out_standings, start_year=year_from, end_year=year_until)
+        logger.info(f"Standings data saved in {partition_dir(out_standings)}")
+
+    elif all_or_fetch == 'fetch':
+        logger.info(f'Fetching new data from {year_from} to {year_until}...')
+        # Add riders, teams, constructors, RTC and standings data from specific seasons to already existant csv
+        fetch_new_rtc(out_riders, out_teams, out_constructors, json_seasons_info, category_ids, start_year=year_from, end_year=year_until, out_standings=out_standings)
+
+
+######################### MAIN ###########################
+
+if __name__ == '__main__':
+    # Read inputs
+    all_or_fetch, year_from, year_until = read_standings_inputs()
 
-elif all_or_fetch == 'fetch':
-    logger.info(f'Fetching new data from {year_from} to {year_until}...')
-    # Add riders, teams, constructors, and RTC data from specific seasons to already existant csv
-    fetch_new_rtc(out_riders, out_teams, out_constructors, json_seasons_info, category_id_motogp, start_year=year_from, end_year=year_until)
+    # The report is also saved if the run fails, to see where it stopped
+    try:
+        with metrics.stage('standings'):
+            run(all_or_fetch, year_from, year_until)
+    finally:
+        write_reports()
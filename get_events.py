@@ -1,8 +1,12 @@
 # Get events data from MotoGP API and store it in tables as csv
-import requests
 import logging
 import pandas as pd
 from datetime import date
+from api_client import base_url, request_api
+from crawl_ledger import season_settled_time
+from data_store import merge_partitions, partition_dir, write_partitions
+from metrics import metrics, write_reports
+from stream_writer import stream_to_partitions
 
 logging.basicConfig(
     filename='./logs/get_events.log', level=logging.INFO,
@@ -14,33 +18,30 @@ logger = logging.getLogger(__name__)
 
 ######################### VARIABLES ###########################
 
-base_url = 'https://api.motogp.pulselive.com/motogp/v1/results/'
 
 seasons_ep = 'seasons'
 
+# Stored as one csv per season in ./data/events (see data_store.py)
 out_filename = './data/events.csv'
 
 
 ######################### FUNCTIONS ###########################
 
-def request_api(base_url, endpoint):
+def specific_events(json_season_events):
     """
     Args:
-        base_url (str)
-        endpoint (str)
-
+        json_season_events (json): json containing the events of a specific MotoGP season
+    
     Returns:
-        data (json)
+        df_season_events: DataFrame with the events of a specific MotoGP season
     """
-    response = requests.get(base_url + endpoint)
+    df_season_events = pd.DataFrame(json_season_events)
 
-    if response.status_code == 200:
-        #print("Successfully retrieved data")
-        data = response.json()
-    else:
-        logger.warning(f"Failed to retrieve data. Status code: {response.status_code}")
+    df_season_events = df_season_events.drop(['country', 'event_files', 'circuit', 'toad_api_uuid', 'additional_name', 'legacy_id', 'season', 'status'], axis=1)
+    # Order columns
+    df_season_events = df_season_events[['id', 'test', 'sponsored_name', 'date_end', 'date_start', 'name', 'short_name']]
 
-    return data
+    return df_season_events
 
 def all_seasons_events(seasons_info, start_year=1949, end_year=date.today().year):
     """
@@ -52,9 +53,23 @@ def all_seasons_events(seasons_info, start_year=1949, end_year=date.today().year
     Returns:
         df_all_events: DataFrame with the events of all MotoGP seasons
     """
-    list_all_events = []
-    i = 0
+    list_all_events = list(iter_seasons_events(seasons_info, start_year=start_year, end_year=end_year))
+
+    df_all_events = pd.concat(list_all_events, ignore_index=True)
+    return df_all_events
+
+def iter_seasons_events(seasons_info, start_year=1949, end_year=date.today().year):
+    """
+    Requests the events of the seasons one at a time and yields them as they arrive.
 
+    Args:
+        seasons_info (list): List of seasons json data.
+        start_year (int): year from which you want to get the data
+        end_year (int): year until which you want to get the data
+
+    Yields:
+        df_season_events: DataFrame with the events of a season
+    """
     for season in seasons_info:
         id = season['id']
         year = season['year']
@@ -65,20 +80,16 @@ def all_seasons_events(seasons_info, start_year=1949, end_year=date.today().year
 
         events_ep = 'events?seasonUuid=' + id
 
-        json_season_events = request_api(base_url, events_ep)
-        df_season_events = pd.DataFrame(json_season_events)
+        json_season_events = request_api(base_url, events_ep, settled_after=season_settled_time(year))
+        if json_season_events == []:
+            continue
 
-        df_season_events = df_season_events.drop(['country', 'event_files', 'circuit', 'toad_api_uuid', 'additional_name', 'legacy_id', 'season', 'status'], axis=1)
-        # Order columns
-        df_season_events = df_season_events[['id', 'test', 'sponsored_name', 'date_end', 'date_start', 'name', 'short_name']]
+        df_season_events = specific_events(json_season_events)
         df_season_events['season'] = year
 
-        list_all_events.append(df_season_events)
-        i += 1
-        print(i)
-            
-    df_all_events = pd.concat(list_all_events, ignore_index=True)
-    return df_all_events
+        metrics.add_rows('events', len(df_season_events), 'events')
+
+        yield df_season_events
 
 def fetch_new_events(out_filename, seasons_info, start_year=1949, end_year=date.today().year):
     """
@@ -90,21 +101,15 @@ def fetch_new_events(out_filename, seasons_info, start_year=1949, end_year=date.
         end_year (int): Year until which you want to get the data.
     
     Returns:
-        Saves updated data to the existant csv
+        Saves updated data to the existant csv of the seasons requested
     """
     # Extract data from start_year to end_year into a DataFrame
     new_events_df = all_seasons_events(seasons_info, start_year, end_year)
 
-    # Load existing data from CSV
-    existing_events_df = pd.read_csv(out_filename, sep=';', encoding='unicode_escape')
-    logger.info(f"Existing data loaded from {out_filename}")
-
-    # Find new data that is not already in the CSV
-    updated_events_df = pd.concat([existing_events_df, new_events_df]).drop_duplicates(subset='id')
-
-    # Save updated data back to the CSV
-    updated_events_df.to_csv(out_filename, index=False, sep=';')
-    logger.info(f"Updated data saved to {out_filename}")
+    # Add the new events to the csv of their seasons, keeping the ones already stored
+    with metrics.stage('events/merge'):
+        merge_partitions(new_events_df, out_filename, subset='id')
+    logger.info(f"Updated data saved to {partition_dir(out_filename)}")
 
 def read_standings_inputs():
     """
@@ -143,25 +148,51 @@ def read_standings_inputs():
     
     return [answer, answer2, answer3]
 
+def run(all_or_fetch, year_from, year_until, json_seasons_info=None, stream=False):
+    """
+    Gets the events from year_from to year_until and saves them in ./data/events, one csv per season.
 
-######################### MAIN ###########################
+    Args:
+        all_or_fetch (str): 'all' to overwrite the existant data or 'fetch' to add new data to it
+        year_from (int): year from which you want to get the data
+        year_until (int): year until which you want to get the data
+        json_seasons_info (list, optional): seasons json data, requested from the API if not given
+        stream (bool, optional): in 'all' mode, write the events to the csv in chunks as they arrive
+            instead of keeping all of them in memory
+    """
+    # Get seasons general info
+    if json_seasons_info is None:
+        json_seasons_info = request_api(base_url, seasons_ep)
+
+    if all_or_fetch == 'all' and stream:
+        logger.info(f'Streaming all data from {year_from} to {year_until} and overwriting the existant...')
+        stream_to_partitions(iter_seasons_events(json_seasons_info, start_year=year_from, end_year=year_until), out_filename, start_year=year_from, end_year=year_until)
+        logger.info(f'Data saved in {partition_dir(out_filename)}')
 
-# Read inputs
-all_or_fetch, year_from, year_until = read_standings_inputs()
+    elif all_or_fetch == 'all':
+        logger.info(f'Getting all data from {year_from} to {year_until} and overwriting the existant...')
+        # Create df with all seasons
+        df_all_seasons_events_motogp = all_seasons_events(json_seasons_info, start_year=year_from, end_year=year_until)
 
-# Get seasons general info
-json_seasons_info = request_api(base_url, seasons_ep)
+        # Save the df as one csv per season
+        write_partitions(df_all_seasons_events_motogp, out_filename, start_year=year_from, end_year=year_until)
+        logger.info(f'Data saved in {partition_dir(out_filename)}')
 
-if all_or_fetch == 'all':
-    logger.info(f'Getting all data from {year_from} to {year_until} and overwriting the existant...')
-    # Create df with all seasons
-    df_all_seasons_events_motogp = all_seasons_events(json_seasons_info, start_year=year_from, end_year=year_until)
+    elif all_or_fetch == 'fetch':
+        logger.info(f'Fetching new data from {year_from} to {year_until}...')
+        # Add data from specific seasons to an already existant csv
+        fetch_new_events(out_filename, json_seasons_info, start_year=year_from, end_year=year_until)
+
+
+######################### MAIN ###########################
 
-    # Save the df as csv
-    df_all_seasons_events_motogp.to_csv(out_filename, index=False, sep=';')
-    logger.info(f'Data saved in {out_filename}')
+if __name__ == '__main__':
+    # Read inputs
+    all_or_fetch, year_from, year_until = read_standings_inputs()
 
-elif all_or_fetch == 'fetch':
-    logger.info(f'Fetching new data from {year_from} to {year_until}...')
-    # Add data from specific seasons to an already existant csv
-    fetch_new_events(out_filename, json_seasons_info, start_year=year_from, end_year=year_until)
+    # The report is also saved if the run fails, to see where it stopped
+    try:
+        with metrics.stage('events'):
+            run(all_or_fetch, year_from, year_until)
+    finally:
+        write_reports()
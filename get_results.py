@@ -1,75 +1,136 @@
-import requests
+import asyncio
+import itertools
+import logging
+from functools import partial
 import pandas as pd
 from datetime import date
+from api_client import base_url, crawl_concurrency, request_api, request_api_async
+from categories import concat_frames, iter_other_categories, select_categories
+from crawl_ledger import CrawlLedger, is_past, settled_time
+from flatten import ColumnBuffer, flatten_results, results_columns, results_dtypes, results_time_columns
+from data_store import merge_partitions, read_table, write_partitions
+from metrics import metrics, write_reports
+from stream_writer import chunk_rows, stream_to_partitions
+
+logging.basicConfig(
+    filename='./logs/get_results.log', level=logging.INFO,
+    format= '[%(asctime)s] {%(pathname)s:%(lineno)d} %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d   %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
 
 
 ######################### VARIABLES ###########################
 
-base_url = 'https://api.motogp.pulselive.com/motogp/v1/results/'
-category_id_motogp = 'e8c110ad-64aa-4e8e-8a86-f2f152f6a942'
-
+# Stored as one csv per season in ./data/results and ./data/sessions (see data_store.py)
 out_filename = './data/results.csv'
 
 sessions_csv = './data/sessions.csv'
 
+# Sessions whose results are already crawled, and the rows crawled by a run that has not finished yet
+results_ledger = './data/results.ledger'
+results_spool = './data/results.spool.csv'
+
+# Requests in flight at the same time (1 runs the serial crawl)
+concurrency = crawl_concurrency
+
+# Columns of the results csv: the results of a session plus the id and the category of the session
+results_csv_columns = results_columns + ['session_id', 'category']
+
+# Columns of the sessions csv read to request their results
+session_columns = ['id', 'date', 'season', 'category']
+
 
 ######################### FUNCTIONS ###########################
 
-def request_api(base_url, endpoint):
+def specific_results(json_session_results):
     """
     Args:
-        base_url (str)
-        endpoint (str)
-
+        json_session_results (json): json containing the classification of a specific session
+    
     Returns:
-        data (json)
+        df_session_results: DataFrame with the results of the session, with its times also in milliseconds
     """
-    response = requests.get(base_url + endpoint)
+    buffer = ColumnBuffer(results_columns, results_dtypes, time_columns=results_time_columns)
+    flatten_results(json_session_results, buffer)
 
-    if response.status_code == 200:
-        print("Successfully retrieved data")
-        data = response.json()
-        
-    else:
-        print(f"Failed to retrieve data. Status code: {response.status_code}")
-        data = []
+    df_session_results = buffer.to_frame()
 
-    return data
+    return df_session_results
 
-def specific_results(json_session_results):
+def all_seasons_results(sessions_csv, start_year=1949, end_year=date.today().year, ledger=None, categories=None):
     """
-    
+    Args:
+        sessions_csv (csv): csv containing the sessions for all MotoGP seasons
+        start_year (int): year from which you want to get the data
+        end_year (int): year until which you want to get the data
+        ledger (CrawlLedger, optional): sessions already crawled are skipped, and the finished
+            sessions crawled now are recorded in it
+        categories (list, optional): categories of the sessions requested, or ['all']
+
+    Returns:
+        df_all_results: DataFrame with the results of the sessions requested in the given period
     """
-    flattened_data = []
-    for entry in json_session_results['classification']:
-        flattened_entry ={
-            'id': entry['id'],
-            'position': entry['position'],
-            'best_lap_number': entry['best_lap']['number'] if entry.get('best_lap') else None,
-            'best_lap_time': entry['best_lap']['time'] if entry.get('best_lap') else None,
-            'average_speed': entry['average_speed'] if entry.get('average_speed') else None,
-            'top_speed': entry['top_speed'] if entry.get('top_speed') else None,
-            'gap_to_first': entry['gap']['first'] if entry.get('gap') else None,
-            'total_laps': entry['total_laps'] if entry.get('total_laps') else None,
-            'total_time': entry['time'] if entry.get('time') else None,
-            'points': entry['points'] if entry.get('points') else None,
-            'rider_id': entry['rider']['id']
-        }
-
-        flattened_data.append(flattened_entry)
-    
-    df_session_results = pd.DataFrame(flattened_data)
+    # Every session is flattened into the same buffer, so a single DataFrame is built at the end
+    buffer = ColumnBuffer(results_csv_columns, results_dtypes, time_columns=results_time_columns)
 
-    return df_session_results
+    for session, json_session_results in iter_sessions_classification(sessions_csv, start_year=start_year, end_year=end_year, ledger=ledger, categories=categories):
+        start = len(buffer)
+        flatten_results(json_session_results, buffer, session.id, session.category)
+
+        # Results of past sessions are final, so they are recorded as crawled
+        if ledger is not None and is_past(session.date):
+            ledger.record(session.id, buffer.to_frame(start))
 
-def all_seasons_results(sessions_csv, start_year=1949, end_year=date.today().year):
+    if not len(buffer):
+        return pd.DataFrame()
+
+    df_all_results = buffer.to_frame()
+    return df_all_results
+
+def iter_seasons_results(sessions_csv, start_year=1949, end_year=date.today().year, ledger=None, categories=None):
     """
+    Requests the results of the sessions one at a time and yields them as they arrive.
+
+    Args:
+        sessions_csv (csv): csv containing the sessions for all MotoGP seasons
+        start_year (int): year from which you want to get the data
+        end_year (int): year until which you want to get the data
+        ledger (CrawlLedger, optional): sessions already crawled are skipped, and the finished
+            sessions crawled now are recorded in it
+        categories (list, optional): categories of the sessions requested, or ['all']
+
+    Yields:
+        df_session_results: DataFrame with the results of a session
     """
-    list_all_results = []
-    i = 0
+    for session, json_session_results in iter_sessions_classification(sessions_csv, start_year=start_year, end_year=end_year, ledger=ledger, categories=categories):
+        buffer = ColumnBuffer(results_csv_columns, results_dtypes, time_columns=results_time_columns)
+        flatten_results(json_session_results, buffer, session.id, session.category)
+        df_session_results = buffer.to_frame()
 
-    df_sessions = pd.read_csv(sessions_csv, sep=';', encoding='unicode_escape')
-    df_sessions = df_sessions.drop(['date', 'number', 'track_condition', 'air_temperature', 'humidity', 'ground_temperature', 'weather', 'circuit', 'session_type', 'event_id'], axis=1)
+        # Results of past sessions are final, so they are recorded as crawled
+        if ledger is not None and is_past(session.date):
+            ledger.record(session.id, df_session_results)
+
+        yield df_session_results
+
+def iter_sessions_classification(sessions_csv, start_year=1949, end_year=date.today().year, ledger=None, categories=None):
+    """
+    Requests the classification of the sessions one at a time and yields it as it arrives.
+
+    Args:
+        sessions_csv (csv): csv containing the sessions for all MotoGP seasons
+        start_year (int): year from which you want to get the data
+        end_year (int): year until which you want to get the data
+        ledger (CrawlLedger, optional): sessions already crawled are skipped
+        categories (list, optional): categories of the sessions requested, or ['all']
+
+    Yields:
+        List with the session (id, date, season and category) and its classification json data
+    """
+    # Only the seasons of the given period are read
+    df_sessions = read_table(sessions_csv, start_year=start_year, end_year=end_year, columns=session_columns)
+    df_sessions = select_categories(df_sessions, categories)
 
     for session in df_sessions.itertuples(index=False):
         session_id = session.id
@@ -79,46 +140,209 @@ def all_seasons_results(sessions_csv, start_year=1949, end_year=date.today().yea
         if year < start_year or year > end_year:
             continue
 
+        # Skip if the session has already been crawled
+        if ledger is not None and ledger.done(session_id):
+            continue
+
         results_sessions_ep = 'session/' + session_id + '/classification'
 
-        print(session_id)
-        json_session_results = request_api(base_url, results_sessions_ep)
+        # A classification cached while the session was running is revalidated, so it is never recorded as final
+        json_session_results = request_api(base_url, results_sessions_ep, settled_after=settled_time(session.date))
         if json_session_results == []:
             continue
 
-        df_session_results = specific_results(json_session_results)
-        df_session_results['session_id'] = session_id
+        metrics.add_rows('results', len(json_session_results['classification']), 'results')
+
+        yield [session, json_session_results]
+
+async def crawl_session_results(session_id, session_date, category, semaphore, ledger=None):
+    """
+    Requests the classification of a session.
+
+    Args:
+        session_id (str): Id of the session.
+        session_date (str): Date of the session.
+        category (str): Category of the session.
+        semaphore (asyncio.Semaphore): Semaphore shared by all the requests of the crawl.
+        ledger (CrawlLedger, optional): the session is recorded in it as soon as it is crawled if it is finished
+
+    Returns:
+        buffer: ColumnBuffer with the results of the session, or None if there are no results
+    """
+    json_session_results = await request_api_async(base_url, 'session/' + session_id + '/classification', semaphore, settled_after=settled_time(session_date))
+    if json_session_results == []:
+        return None
+
+    buffer = ColumnBuffer(results_csv_columns, results_dtypes, time_columns=results_time_columns)
+    flatten_results(json_session_results, buffer, session_id, category)
+    metrics.add_rows('results', len(buffer), 'results')
+
+    if ledger is not None and is_past(session_date):
+        ledger.record(session_id, buffer.to_frame())
+
+    return buffer
+
+async def crawl_results(sessions, concurrency=crawl_concurrency, ledger=None):
+    """
+    Requests the classification of every session concurrently.
+
+    Args:
+        sessions (list): (id, date, category) of the sessions to request.
+        concurrency (int): Maximum number of requests in flight at the same time.
+        ledger (CrawlLedger, optional): finished sessions are recorded in it as soon as they are crawled
+
+    Returns:
+        List with the results ColumnBuffer of each session (None if it has no results), in the same order as sessions
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [crawl_session_results(session_id, session_date, category, semaphore, ledger) for session_id, session_date, category in sessions]
+
+    return await asyncio.gather(*tasks)
+
+def all_seasons_results_concurrent(sessions_csv, start_year=1949, end_year=date.today().year, concurrency=crawl_concurrency, ledger=None, categories=None):
+    """
+    Same as all_seasons_results, but the classifications are requested concurrently.
+    The results keep the order of the sessions csv whatever order the requests complete in.
+
+    Args:
+        sessions_csv (csv): csv containing the sessions for all MotoGP seasons
+        start_year (int): year from which you want to get the data
+        end_year (int): year until which you want to get the data
+        concurrency (int): maximum number of requests in flight at the same time
+        ledger (CrawlLedger, optional): sessions already crawled are skipped, and the finished
+            sessions crawled now are recorded in it
+        categories (list, optional): categories of the sessions requested, or ['all']
+
+    Returns:
+        df_all_results: DataFrame with the results of the sessions requested in the given period
+    """
+    sessions = pending_sessions(sessions_csv, start_year, end_year, ledger, categories)
+
+    list_results = asyncio.run(crawl_results(sessions, concurrency, ledger))
+
+    list_results = [session_buffer for session_buffer in list_results if session_buffer is not None]
+    logger.info(f'Results of {len(list_results)} sessions crawled')
 
-        list_all_results.append(df_session_results)
-        i += 1
-        print(i)
-            
-    df_all_results = pd.concat(list_all_results, ignore_index=True)
+    buffer = ColumnBuffer(results_csv_columns, results_dtypes, time_columns=results_time_columns)
+    for session_buffer in list_results:
+        buffer.extend(session_buffer)
+
+    if not len(buffer):
+        return pd.DataFrame()
+
+    df_all_results = buffer.to_frame()
     return df_all_results
 
-def fetch_new_results(out_filename, sessions_csv, start_year=1949, end_year=date.today().year):
+def iter_seasons_results_concurrent(sessions_csv, start_year=1949, end_year=date.today().year, concurrency=crawl_concurrency, ledger=None, window=None, categories=None):
+    """
+    Same as iter_seasons_results, but the sessions are requested concurrently in windows of
+    consecutive sessions, so only one window of results is kept in memory at a time.
+
+    Args:
+        sessions_csv (csv): csv containing the sessions for all MotoGP seasons
+        start_year (int): year from which you want to get the data
+        end_year (int): year until which you want to get the data
+        concurrency (int): maximum number of requests in flight at the same time
+        ledger (CrawlLedger, optional): sessions already crawled are skipped, and the finished
+            sessions crawled now are recorded in it
+        window (int, optional): sessions requested per window. Defaults to 10 times the concurrency.
+        categories (list, optional): categories of the sessions requested, or ['all']
+
+    Yields:
+        df_window_results: DataFrame with the results of a window of sessions, in the order of the sessions csv
+    """
+    if window is None:
+        window = 10 * concurrency
+
+    sessions = pending_sessions(sessions_csv, start_year, end_year, ledger, categories)
+
+    for start in range(0, len(sessions), window):
+        list_results = asyncio.run(crawl_results(sessions[start:start + window], concurrency, ledger))
+
+        buffer = ColumnBuffer(results_csv_columns, results_dtypes, time_columns=results_time_columns)
+        for session_buffer in list_results:
+            if session_buffer is not None:
+                buffer.extend(session_buffer)
+
+        yield buffer.to_frame()
+
+def pending_sessions(sessions_csv, start_year=1949, end_year=date.today().year, ledger=None, categories=None):
+    """
+    Returns the (id, date, category) of the sessions of the given period and categories that are not in the ledger.
+    The sessions of every category are requested together, so they share the concurrency of the crawl.
+    """
+    df_sessions = read_table(sessions_csv, start_year=start_year, end_year=end_year, columns=session_columns)
+    df_sessions = select_categories(df_sessions, categories)
+    if ledger is not None:
+        df_sessions = df_sessions[~df_sessions['id'].isin(ledger.keys)]
+
+    return list(zip(df_sessions['id'], df_sessions['date'], df_sessions['category']))
+
+def spooled_of_sessions(df_spooled, session_ids):
+    """
+    Returns which spooled results belong to the sessions of the run, as a boolean Series.
+    """
+    return df_spooled['session_id'].isin(session_ids)
+
+def run_sessions(sessions_csv, start_year=1949, end_year=date.today().year, categories=None):
+    """
+    Returns the ids of the sessions of the given period and categories, whose spooled results belong to the run.
+    """
+    df_sessions = read_table(sessions_csv, start_year=start_year, end_year=end_year, columns=['id', 'category'])
+
+    return set(select_categories(df_sessions, categories)['id'])
+
+def session_seasons(sessions_csv, start_year=1949, end_year=date.today().year):
+    """
+    Returns a dict with the season of each session in the given period.
+    """
+    df_sessions = read_table(sessions_csv, start_year=start_year, end_year=end_year, columns=['id', 'season'])
+
+    return dict(zip(df_sessions['id'], df_sessions['season']))
+
+def results_seasons(df_results, seasons):
+    """
+    Returns the season of each result, which is the season of its session.
+
+    Args:
+        df_results (DataFrame): Results with their session_id.
+        seasons (dict): Season of each session.
+    """
+    return df_results['session_id'].map(seasons)
+
+def fetch_new_results(out_filename, sessions_csv, start_year=1949, end_year=date.today().year, concurrency=1, ledger=None, categories=None):
     """
     Requests data from the API and fetches it to the data already stored on the csv
 
     Args:
-        events_csv (csv): csv containing the events for all MotoGP seasons
+        sessions_csv (csv): csv containing the sessions for all MotoGP seasons
         start_year (int): year from which you want to get the data
         end_year (int): year until which you want to get the data
-    
+        concurrency (int): requests in flight at the same time, 1 for the serial crawl
+        ledger (CrawlLedger, optional): only the sessions that are not in the ledger are requested
+        categories (list, optional): categories of the sessions requested, or ['all']
+
     Returns:
-        Saves updated data to the same csv
+        Saves updated data to the csv of the seasons with new results
     """
     # Extract data from start_year into a DataFrame
-    new_results_df = all_seasons_results(sessions_csv, start_year=start_year, end_year=end_year)
-    
-    # Load existing data from CSV
-    existing_results_df = pd.read_csv(out_filename, sep=';', encoding='unicode_escape')
+    if concurrency > 1:
+        new_results_df = all_seasons_results_concurrent(sessions_csv, start_year=start_year, end_year=end_year, concurrency=concurrency, ledger=ledger, categories=categories)
+    else:
+        new_results_df = all_seasons_results(sessions_csv, start_year=start_year, end_year=end_year, ledger=ledger, categories=categories)
+
+    # Add the rows crawled by a previous run that did not finish
+    if ledger is not None:
+        keep = partial(spooled_of_sessions, session_ids=run_sessions(sessions_csv, start_year, end_year, categories))
+        new_results_df = ledger.with_spooled(new_results_df, keep=keep)
 
-    # Find new data that is not already in the CSV
-    updated_results_df = pd.concat([existing_results_df, new_results_df]).drop_duplicates(subset='id')
+    # Add the new results to the csv of their seasons, keeping the ones already stored
+    with metrics.stage('results/merge'):
+        season_of = partial(results_seasons, seasons=session_seasons(sessions_csv, start_year, end_year))
+        merge_partitions(new_results_df, out_filename, season_of=season_of, subset='id')
 
-    # Save updated data back to the CSV
-    updated_results_df.to_csv(out_filename, index=False, sep=';')
+    if ledger is not None:
+        ledger.finish()
 
 
 def read_standings_inputs():
@@ -158,17 +382,76 @@ def read_standings_inputs():
     
     return [answer, answer2, answer3]
 
+def run(all_or_fetch, year_from, year_until, concurrency=concurrency, stream=False, categories=None):
+    """
+    Gets the results from year_from to year_until and saves them in ./data/results, one csv per season.
 
-######################### LAUNCH ###########################
+    Args:
+        all_or_fetch (str): 'all' to overwrite the existant data or 'fetch' to add new data to it
+        year_from (int): year from which you want to get the data
+        year_until (int): year until which you want to get the data
+        concurrency (int, optional): requests in flight at the same time, 1 for the serial crawl
+        stream (bool, optional): in 'all' mode, write the results to the csv in chunks as they arrive
+            instead of keeping all of them in memory
+        categories (list, optional): categories of the sessions whose results are requested, or ['all'].
+            Defaults to categories.crawl_categories
+    """
+    # Session ids are unique across categories, so a single ledger covers all of them
+    ledger = CrawlLedger(results_ledger, results_spool, key_column='session_id', table=out_filename)
+
+    if all_or_fetch == 'all':
+        # The results are stored with the season of their session
+        season_of = partial(results_seasons, seasons=session_seasons(sessions_csv, year_from, year_until))
+
+        # Start from scratch unless a previous run did not finish
+        if not ledger.in_progress():
+            ledger.reset()
+
+        # Results left in the spool by a previous run are only kept if their session belongs to this run
+        keep = partial(spooled_of_sessions, session_ids=run_sessions(sessions_csv, year_from, year_until, categories))
+
+        # The seasons are rewritten with the results crawled now and the stored ones of the other categories
+        other_categories = iter_other_categories(out_filename, categories, start_year=year_from, end_year=year_until)
 
-# Read inputs
-all_or_fetch, year_from, year_until = read_standings_inputs()
+        if stream:
+            # Sessions crawled by a previous run that did not finish, whose rows are only in the spool
+            resumed_sessions = set(ledger.keys)
+
+            if concurrency > 1:
+                frames = iter_seasons_results_concurrent(sessions_csv, start_year=year_from, end_year=year_until, concurrency=concurrency, ledger=ledger, categories=categories)
+            else:
+                frames = iter_seasons_results(sessions_csv, start_year=year_from, end_year=year_until, ledger=ledger, categories=categories)
+
+            # The stored rows of the other categories go last, as in the DataFrame written without stream
+            frames = itertools.chain(frames, ledger.iter_spooled('session_id', resumed_sessions, chunk_rows, keep=keep), other_categories)
+            stream_to_partitions(frames, out_filename, season_of=season_of, start_year=year_from, end_year=year_until)
+            ledger.finish()
+            return
+
+        # Get all results from all seasons and save it on a csv
+        if concurrency > 1:
+            df_all_seasons_results = all_seasons_results_concurrent(sessions_csv, start_year=year_from, end_year=year_until, concurrency=concurrency, ledger=ledger, categories=categories)
+        else:
+            df_all_seasons_results = all_seasons_results(sessions_csv, start_year=year_from, end_year=year_until, ledger=ledger, categories=categories)
+        df_all_seasons_results = ledger.with_spooled(df_all_seasons_results, keep=keep)
+        df_all_seasons_results = concat_frames([df_all_seasons_results, *other_categories])
+        write_partitions(df_all_seasons_results, out_filename, season_of=season_of, start_year=year_from, end_year=year_until)
+        ledger.finish()
+
+    elif all_or_fetch == 'fetch':
+        # Add sessions from specific seasons to an already existant csv
+        fetch_new_results(out_filename, sessions_csv, start_year=year_from, end_year=year_until, concurrency=concurrency, ledger=ledger, categories=categories)
+
+
+######################### LAUNCH ###########################
 
-if all_or_fetch == 'all':
-    # Get all results from all seasons and save it on a csv
-    df_all_seasons_results_motogp = all_seasons_results(sessions_csv, start_year=year_from, end_year=year_until)
-    df_all_seasons_results_motogp.to_csv(out_filename, index=False, sep=';')
+if __name__ == '__main__':
+    # Read inputs
+    all_or_fetch, year_from, year_until = read_standings_inputs()
 
-elif all_or_fetch == 'fetch':
-    # Add sessions from specific seasons to an already existant csv
-    fetch_new_results(out_filename, sessions_csv, start_year=year_from, end_year=year_until)
+    # The report is also saved if the run fails, to see where it stopped
+    try:
+        with metrics.stage('results'):
+            run(all_or_fetch, year_from, year_until)
+    finally:
+        write_reports()
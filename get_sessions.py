@@ -1,84 +1,131 @@
-import requests
+import itertools
+import logging
 import pandas as pd
 from datetime import date
+from functools import partial
+from api_client import base_url, request_api
+from categories import category_id_motogp, category_path, concat_frames, discover_categories, iter_other_categories, map_categories
+from crawl_ledger import CrawlLedger, is_past, settled_time
+from flatten import ColumnBuffer, flatten_sessions, sessions_columns, sessions_dtypes
+from data_store import merge_partitions, read_table, write_partitions
+from metrics import metrics, write_reports
+from stream_writer import chunk_rows, stream_to_partitions
+
+logging.basicConfig(
+    filename='./logs/get_sessions.log', level=logging.INFO,
+    format= '[%(asctime)s] {%(pathname)s:%(lineno)d} %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d   %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
 
 
 ######################### VARIABLES ###########################
 
-base_url = 'https://api.motogp.pulselive.com/motogp/v1/results/'
-category_id_motogp = 'e8c110ad-64aa-4e8e-8a86-f2f152f6a942'
-
+# Stored as one csv per season in ./data/sessions and ./data/events (see data_store.py)
 out_filename = './data/sessions.csv'
 
 events_csv = './data/events.csv'
 
+# Events whose sessions are already crawled, and the rows crawled by a run that has not finished yet.
+# Each category has its own files, e.g. ./data/sessions.Moto2.ledger (see category_path)
+sessions_ledger = './data/sessions.ledger'
+sessions_spool = './data/sessions.spool.csv'
+
+# Columns of the sessions csv: the sessions of an event plus the season and the category
+sessions_csv_columns = sessions_columns + ['season', 'category']
+
 
 ######################### FUNCTIONS ###########################
 
-def request_api(base_url, endpoint):
+def specific_session(json_season_sessions):
     """
     Args:
-        base_url (str)
-        endpoint (str)
-
+        json_season_sessions (json): json containing the sessions of a specific event and category
+    
     Returns:
-        data (json)
+        df_season_session: DataFrame with the sessions of the event, with their units ('º', '%') as sent by the API
     """
-    response = requests.get(base_url + endpoint)
+    buffer = ColumnBuffer(sessions_columns, sessions_dtypes)
+    flatten_sessions(json_season_sessions, buffer)
 
-    if response.status_code == 200:
-        print("Successfully retrieved data")
-        data = response.json()
-    else:
-        print(f"Failed to retrieve data. Status code: {response.status_code}")
+    df_season_session = buffer.to_frame()
 
-    return data
+    return df_season_session
 
-def specific_session(json_season_sessions):
+def all_seasons_sessions(events_csv, start_year=1949, end_year=date.today().year, ledger=None, category_id=category_id_motogp, category='MotoGP'):
     """
+    Args:
+        events_csv (csv): csv containing the events for all MotoGP seasons
+        start_year (int): year from which you want to get the sessions data
+        end_year (int): year until which you want to get the sessions data
+        ledger (CrawlLedger, optional): events already crawled are skipped, and the finished
+            events crawled now are recorded in it
+        category_id (str, optional): Id of the category whose sessions are requested.
+        category (str, optional): Name of the category, stored in the 'category' column.
     
+    Returns:
+        df_all_sessions: DataFrame with the sessions of all MotoGP seasons from start_year
     """
-    flattened_data = []
-    for entry in json_season_sessions:
-        flattened_entry ={
-            'id': entry['id'],
-            'date': entry['date'],
-            'number': entry['number'],
-            'track_condition': entry['condition']['track'],
-            'air_temperature': entry['condition']['air'],
-            'humidity': entry['condition']['humidity'],
-            'ground_temperature': entry['condition']['ground'],
-            'weather': entry['condition']['weather'],
-            'circuit': entry['circuit'],
-            'session_type': entry['type'],
-            'event_id': entry['event']['id']
-        }
-
-        flattened_data.append(flattened_entry)
-    
-    df_season_session = pd.DataFrame(flattened_data)
+    # Every event is flattened into the same buffer, so a single DataFrame is built at the end
+    buffer = ColumnBuffer(sessions_csv_columns, sessions_dtypes)
 
-    #df_season_session['air_temperature'] = df_season_session['air_temperature'].replace('º', '', regex=True)
-    #df_season_session['humidity'] = df_season_session['humidity'].replace('%', '', regex=True)
-    #df_season_session['ground_temperature'] = df_season_session['ground_temperature'].replace('º', '', regex=True)
+    for event, json_season_sessions in iter_events_sessions(events_csv, start_year=start_year, end_year=end_year, ledger=ledger, category_id=category_id):
+        start = len(buffer)
+        flatten_sessions(json_season_sessions, buffer, event.season, category)
 
-    return df_season_session
+        # Sessions of past events are final, so they are recorded as crawled
+        if ledger is not None and is_past(event.date_end):
+            ledger.record(event.id, buffer.to_frame(start))
+
+    if not len(buffer):
+        return pd.DataFrame()
 
-def all_seasons_sessions(events_csv, start_year=1949, end_year=date.today().year):
+    df_all_sessions = buffer.to_frame()
+    return df_all_sessions
+
+def iter_seasons_sessions(events_csv, start_year=1949, end_year=date.today().year, ledger=None, category_id=category_id_motogp, category='MotoGP'):
     """
+    Requests the sessions of the events one at a time and yields them as they arrive.
+
     Args:
         events_csv (csv): csv containing the events for all MotoGP seasons
         start_year (int): year from which you want to get the sessions data
         end_year (int): year until which you want to get the sessions data
-    
-    Returns:
-        df_all_sessions: DataFrame with the sessions of all MotoGP seasons from start_year
+        ledger (CrawlLedger, optional): events already crawled are skipped, and the finished
+            events crawled now are recorded in it
+        category_id (str, optional): Id of the category whose sessions are requested.
+        category (str, optional): Name of the category, stored in the 'category' column.
+
+    Yields:
+        df_season_sessions: DataFrame with the sessions of an event
+    """
+    for event, json_season_sessions in iter_events_sessions(events_csv, start_year=start_year, end_year=end_year, ledger=ledger, category_id=category_id):
+        buffer = ColumnBuffer(sessions_csv_columns, sessions_dtypes)
+        flatten_sessions(json_season_sessions, buffer, event.season, category)
+        df_season_sessions = buffer.to_frame()
+
+        # Sessions of past events are final, so they are recorded as crawled
+        if ledger is not None and is_past(event.date_end):
+            ledger.record(event.id, df_season_sessions)
+
+        yield df_season_sessions
+
+def iter_events_sessions(events_csv, start_year=1949, end_year=date.today().year, ledger=None, category_id=category_id_motogp):
     """
-    list_all_sessions = []
-    i = 0
+    Requests the sessions of the events one at a time and yields them as they arrive.
 
-    df_events = pd.read_csv(events_csv, sep=';', encoding='unicode_escape')
-    df_events = df_events.drop(['test', 'sponsored_name', 'date_end', 'date_start', 'name', 'short_name'], axis=1)
+    Args:
+        events_csv (csv): csv containing the events for all MotoGP seasons
+        start_year (int): year from which you want to get the sessions data
+        end_year (int): year until which you want to get the sessions data
+        ledger (CrawlLedger, optional): events already crawled are skipped
+        category_id (str, optional): Id of the category whose sessions are requested.
+
+    Yields:
+        List with the event (id, season and date_end) and its sessions json data
+    """
+    # Only the seasons of the given period are read
+    df_events = read_table(events_csv, start_year=start_year, end_year=end_year, columns=['id', 'date_end', 'season'])
 
     for event in df_events.itertuples(index=False):
         id = event.id
@@ -88,22 +135,54 @@ def all_seasons_sessions(events_csv, start_year=1949, end_year=date.today().year
         if year < start_year or year > end_year:
             continue
 
-        sessions_ep = 'sessions?eventUuid=' + id + '&categoryUuid=' + category_id_motogp
+        # Skip if the event has already been crawled
+        if ledger is not None and ledger.done(id):
+            continue
 
-        print(id)
-        
-        json_season_sessions = request_api(base_url, sessions_ep)
-        df_season_sessions = specific_session(json_season_sessions)
-        df_season_sessions['season'] = year
-
-        list_all_sessions.append(df_season_sessions)
-        i += 1
-        print(i)
-            
-    df_all_sessions = pd.concat(list_all_sessions, ignore_index=True)
-    return df_all_sessions
+        sessions_ep = 'sessions?eventUuid=' + id + '&categoryUuid=' + category_id
+
+        json_season_sessions = request_api(base_url, sessions_ep, settled_after=settled_time(event.date_end))
+        if json_season_sessions == []:
+            continue
+
+        metrics.add_rows('sessions', len(json_season_sessions), 'sessions')
+
+        yield [event, json_season_sessions]
+
+def spooled_in_period(df_spooled, start_year, end_year):
+    """
+    Returns which spooled sessions belong to the seasons of the run, as a boolean Series.
+    """
+    return df_spooled['season'].between(start_year, end_year)
+
+def all_categories_sessions(events_csv, category_ids, start_year=1949, end_year=date.today().year, ledgers=None):
+    """
+    Requests the sessions of several categories at the same time, one thread per category.
+
+    Args:
+        events_csv (csv): csv containing the events for all MotoGP seasons
+        category_ids (dict): Id of each category to crawl, by name (see categories.discover_categories).
+        start_year (int): year from which you want to get the sessions data
+        end_year (int): year until which you want to get the sessions data
+        ledgers (dict, optional): CrawlLedger of each category. The rows crawled by a previous run
+            that did not finish are added from its spool
+
+    Returns:
+        df_all_sessions: DataFrame with the sessions of every category
+    """
+    def category_sessions(category, category_id):
+        ledger = ledgers[category] if ledgers else None
+        df_sessions = all_seasons_sessions(events_csv, start_year=start_year, end_year=end_year, ledger=ledger, category_id=category_id, category=category)
+
+        # Add the rows crawled by a previous run that did not finish
+        if ledger is None:
+            return df_sessions
+
+        return ledger.with_spooled(df_sessions, keep=partial(spooled_in_period, start_year=start_year, end_year=end_year))
+
+    return concat_frames(map_categories(category_sessions, category_ids))
 
-def fetch_new_sessions(out_filename, events_csv, start_year=1949, end_year=date.today().year):
+def fetch_new_sessions(out_filename, events_csv, start_year=1949, end_year=date.today().year, ledgers=None, category_ids=None):
     """
     Requests data from the API and fetches it to the data already stored on the csv
 
@@ -111,21 +190,24 @@ def fetch_new_sessions(out_filename, events_csv, start_year=1949, end_year=date.
         events_csv (csv): csv containing the events for all MotoGP seasons
         start_year (int): year from which you want to get the sessions data
         end_year (int): year until which you want to get the sessions data
+        ledgers (dict, optional): CrawlLedger of each category, only the events that are not in it are requested
+        category_ids (dict, optional): Id of each category to crawl, by name. Only MotoGP if not given
     
     Returns:
         Saves updated data to the same csv
     """
+    if category_ids is None:
+        category_ids = {'MotoGP': category_id_motogp}
+
     # Extract sessions data from start_year into a DataFrame
-    new_sessions_df = all_seasons_sessions(events_csv, start_year=start_year, end_year=end_year)
-    
-    # Load existing sessions from CSV
-    existing_sessions_df = pd.read_csv(out_filename, sep=';', encoding='unicode_escape')
+    new_sessions_df = all_categories_sessions(events_csv, category_ids, start_year=start_year, end_year=end_year, ledgers=ledgers)
 
-    # Find new sessions that are not already in the CSV
-    updated_sessions_df = pd.concat([existing_sessions_df, new_sessions_df]).drop_duplicates(subset='id')
+    # Add the new sessions to the csv of their seasons, keeping the ones already stored
+    with metrics.stage('sessions/merge'):
+        merge_partitions(new_sessions_df, out_filename, subset='id')
 
-    # Save updated data back to the CSV
-    updated_sessions_df.to_csv(out_filename, index=False, sep=';')
+    for ledger in (ledgers or {}).values():
+        ledger.finish()
 
 
 def read_standings_inputs():
@@ -165,17 +247,71 @@ def read_standings_inputs():
     
     return [answer, answer2, answer3]
 
+def run(all_or_fetch, year_from, year_until, stream=False, categories=None):
+    """
+    Gets the sessions from year_from to year_until and saves them in ./data/sessions, one csv per season.
 
-######################### LAUNCH ###########################
+    Args:
+        all_or_fetch (str): 'all' to overwrite the existant data or 'fetch' to add new data to it
+        year_from (int): year from which you want to get the data
+        year_until (int): year until which you want to get the data
+        stream (bool, optional): in 'all' mode, write the sessions to the csv in chunks as they arrive
+            instead of keeping all of them in memory. The categories are then crawled one after the other
+        categories (list, optional): names of the categories to crawl, or ['all'] (see categories.py).
+            Defaults to categories.crawl_categories
+    """
+    category_ids = discover_categories(year_from, year_until, categories)
+    ledgers = {
+        category: CrawlLedger(category_path(sessions_ledger, category), category_path(sessions_spool, category), key_column='event_id', table=out_filename)
+        for category in category_ids
+    }
+
+    if all_or_fetch == 'all':
+        # Start from scratch unless a previous run did not finish
+        for ledger in ledgers.values():
+            if not ledger.in_progress():
+                ledger.reset()
+
+        # The seasons are rewritten with the sessions crawled now and the stored ones of the other categories
+        other_categories = iter_other_categories(out_filename, list(category_ids), start_year=year_from, end_year=year_until)
+
+        if stream:
+            frames = []
+            for category, category_id in category_ids.items():
+                # Events crawled by a previous run that did not finish, whose rows are only in the spool
+                resumed_events = set(ledgers[category].keys)
+
+                frames.append(iter_seasons_sessions(events_csv, start_year=year_from, end_year=year_until, ledger=ledgers[category], category_id=category_id, category=category))
+                frames.append(ledgers[category].iter_spooled('event_id', resumed_events, chunk_rows, keep=partial(spooled_in_period, start_year=year_from, end_year=year_until)))
+
+            # The stored rows of the other categories go last, as in the DataFrame written without stream
+            frames.append(other_categories)
+            stream_to_partitions(itertools.chain(*frames), out_filename, start_year=year_from, end_year=year_until)
+            for ledger in ledgers.values():
+                ledger.finish()
+            return
+
+        # Get all sessions from all seasons and save it on a csv
+        df_all_seasons_sessions = all_categories_sessions(events_csv, category_ids, start_year=year_from, end_year=year_until, ledgers=ledgers)
+        df_all_seasons_sessions = concat_frames([df_all_seasons_sessions, *other_categories])
+        write_partitions(df_all_seasons_sessions, out_filename, start_year=year_from, end_year=year_until)
+        for ledger in ledgers.values():
+            ledger.finish()
+
+    elif all_or_fetch == 'fetch':
+        # Add sessions from specific seasons to an already existant csv
+        fetch_new_sessions(out_filename, events_csv, start_year=year_from, end_year=year_until, ledgers=ledgers, category_ids=category_ids)
 
-# Read inputs
-all_or_fetch, year_from, year_until = read_standings_inputs()
 
-if all_or_fetch == 'all':
-    # Get all sessions from all seasons and save it on a csv
-    df_all_seasons_sessions_motogp = all_seasons_sessions(events_csv, start_year=year_from, end_year=year_until)
-    df_all_seasons_sessions_motogp.to_csv(out_filename, index=False, sep=';')
+######################### LAUNCH ###########################
+
+if __name__ == '__main__':
+    # Read inputs
+    all_or_fetch, year_from, year_until = read_standings_inputs()
 
-elif all_or_fetch == 'fetch':
-    # Add sessions from specific seasons to an already existant csv
-    fetch_new_sessions(out_filename, events_csv, start_year=year_from, end_year=year_until)
+    # The report is also saved if the run fails, to see where it stopped
+    try:
+        with metrics.stage('sessions'):
+            run(all_or_fetch, year_from, year_until)
+    finally:
+        write_reports()
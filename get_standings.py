@@ -1,8 +1,12 @@
 # Get standings data from MotoGP API and store it in tables as csv
-import requests
-import pandas as pd
 import logging
 from datetime import date
+from api_client import base_url, request_api
+from crawl_ledger import season_settled_time
+from categories import concat_frames, discover_categories, iter_other_categories, map_categories
+from data_store import merge_partitions, partition_dir, write_partitions
+from flatten import ColumnBuffer, flatten_standings, standings_columns
+from metrics import metrics, write_reports
 
 logging.basicConfig(
     filename='./logs/get_standings.log', level=logging.INFO,
@@ -14,35 +18,14 @@ logger = logging.getLogger(__name__)
 
 ######################### VARIABLES ###########################
 
-base_url = 'https://api.motogp.pulselive.com/motogp/v1/results/'
-category_id_motogp = 'e8c110ad-64aa-4e8e-8a86-f2f152f6a942'
-
 seasons_ep = 'seasons'
 
+# Stored as one csv per season in ./data/standings (see data_store.py)
 out_filename = './data/standings.csv'
 
 
 ######################### FUNCTIONS ###########################
 
-def request_api(base_url, endpoint):
-    """
-    Args:
-        base_url (str)
-        endpoint (str)
-
-    Returns:
-        data (json)
-    """
-    response = requests.get(base_url + endpoint)
-
-    if response.status_code == 200:
-        #logger.info("Successfully retrieved data")
-        data = response.json()
-    else:
-        logger.warning(f"Failed to retrieve data. Status code: {response.status_code}")
-
-    return data
-
 def specific_season_standings(json_season_standings):
     """
     Args:
@@ -51,19 +34,10 @@ def specific_season_standings(json_season_standings):
     Returns:
         df: DataFrame with the rider standings of a specific MotoGP season
     """
-    classification_data = json_season_standings['classification']
+    buffer = ColumnBuffer(standings_columns)
+    flatten_standings(json_season_standings, buffer)
 
-    flattened_data = []
-    for entry in classification_data:
-        flattened_entry = {
-            'position': entry['position'],
-            'points': entry['points'],
-            'rider_id': entry['rider']['id']
-        }
-
-        flattened_data.append(flattened_entry)
-
-    df_rider_standings = pd.DataFrame(flattened_data)
+    df_rider_standings = buffer.to_frame()
 
     #df_rider_standings['diff_to_first'] = df_rider_standings['points'] - df_rider_standings['points'].max()
     #df_rider_standings['diff_to_next'] = df_rider_standings['points'] - df_rider_standings['points'].shift(1)
@@ -71,19 +45,20 @@ def specific_season_standings(json_season_standings):
 
     return df_rider_standings
 
-def all_seasons_standings(json_season_info, category_id, start_year=1949, end_year=date.today().year):
+def all_seasons_standings(json_season_info, category_id, start_year=1949, end_year=date.today().year, category='MotoGP'):
     """
     Args:
         json_season_info (list): json containing the season basic information for a specific MotoGP season
-        category_id (str): 
+        category_id (str): Id for the racing category.
         start_year (int): year from which you want to get the data
         end_year (int): year until which you want to get the data
+        category (str, optional): Name of the category, stored in the column 'category'.
     
     Returns:
         df_all_seasons: DataFrame with the rider standings of all MotoGP seasons
     """
-    list_all_seasons = []
-    i = 0
+    # Every season is flattened into the same buffer, so a single DataFrame is built at the end
+    buffer = ColumnBuffer(standings_columns + ['season', 'category'])
 
     for season in json_season_info:
         id = season['id']
@@ -95,25 +70,42 @@ def all_seasons_standings(json_season_info, category_id, start_year=1949, end_ye
 
         standings_ep = 'standings?seasonUuid=' + id + '&categoryUuid=' + category_id
 
-        json_season_standings = request_api(base_url, standings_ep)
-        df_season_data = specific_season_standings(json_season_standings)
-        df_season_data['season'] = year
+        json_season_standings = request_api(base_url, standings_ep, settled_after=season_settled_time(year))
+        if json_season_standings == []:
+            continue
 
-        list_all_seasons.append(df_season_data)
-        i += 1
-        print(i)
+        flatten_standings(json_season_standings, buffer, year, category)
+        metrics.add_rows('standings', len(json_season_standings['classification']), 'standings')
             
-    df_all_seasons = pd.concat(list_all_seasons, ignore_index=True)
+    df_all_seasons = buffer.to_frame()
     logger.info(f'DataFrame with all seasons created')
     return df_all_seasons
 
-def fetch_new_standings(out_filename, json_season_info, category_id, start_year=1949, end_year=date.today().year):
+def all_categories_standings(json_season_info, category_ids, start_year=1949, end_year=date.today().year):
+    """
+    Requests the standings of several categories at the same time, one thread per category.
+
+    Args:
+        json_season_info (list): json containing the season basic information for a specific MotoGP season
+        category_ids (dict): Id of each category to crawl, by name (see categories.discover_categories).
+        start_year (int): year from which you want to get the data
+        end_year (int): year until which you want to get the data
+
+    Returns:
+        df_all_seasons: DataFrame with the rider standings of every category
+    """
+    def category_standings(category, category_id):
+        return all_seasons_standings(json_season_info, category_id, start_year=start_year, end_year=end_year, category=category)
+
+    return concat_frames(map_categories(category_standings, category_ids))
+
+def fetch_new_standings(out_filename, json_season_info, category_ids, start_year=1949, end_year=date.today().year):
     """
     Requests data from the API and fetches it to the data already stored on the csv
 
     Args:
         json_season_info (list): json containing the season basic information for a specific MotoGP season
-        category_id (str): 
+        category_ids (dict): Id of each category to crawl, by name.
         start_year (int): year from which you want to get the data
         end_year (int): year until which you want to get the data
     
@@ -121,18 +113,12 @@ def fetch_new_standings(out_filename, json_season_info, category_id, start_year=
         Saves updated data to the same csv
     """
     # Extract data from start_year until end_year into a DataFrame
-    new_standings_df = all_seasons_standings(json_season_info=json_season_info, category_id=category_id, start_year=start_year, end_year=end_year)
+    new_standings_df = all_categories_standings(json_season_info, category_ids, start_year=start_year, end_year=end_year)
     
-    # Load existing data from CSV
-    existing_standings_df = pd.read_csv(out_filename, sep=';', encoding='unicode_escape')
-    logger.info(f"Existing data loaded from {out_filename}")
-
-    # Find which of the new data is not already in the CSV
-    updated_standings_df = pd.concat([existing_standings_df, new_standings_df]).drop_duplicates()
-
-    # Save updated data back to the CSV
-    updated_standings_df.to_csv(out_filename, index=False, sep=';')
-    logger.info(f"Updated data saved to {out_filename}")
+    # Add the new standings to the csv of their seasons, keeping the ones already stored
+    with metrics.stage('standings/merge'):
+        merge_partitions(new_standings_df, out_filename)
+    logger.info(f"Updated data saved to {partition_dir(out_filename)}")
 
 def read_standings_inputs():
     """
@@ -171,24 +157,49 @@ def read_standings_inputs():
     
     return [answer, answer2, answer3]
 
+def run(all_or_fetch, year_from, year_until, json_season_info=None, categories=None):
+    """
+    Gets the rider standings from year_from to year_until and saves them in ./data/standings, one csv per season.
 
-######################### MAIN ###########################
+    Args:
+        all_or_fetch (str): 'all' to overwrite the existant data or 'fetch' to add new data to it
+        year_from (int): year from which you want to get the data
+        year_until (int): year until which you want to get the data
+        json_season_info (list, optional): seasons json data, requested from the API if not given
+        categories (list, optional): names of the categories to crawl, or ['all'] (see categories.py).
+            Defaults to categories.crawl_categories
+    """
+    # Get seasons general info
+    if json_season_info is None:
+        json_season_info = request_api(base_url, seasons_ep)
 
-# Read inputs
-all_or_fetch, year_from, year_until = read_standings_inputs()
+    category_ids = discover_categories(year_from, year_until, categories, seasons_info=json_season_info)
 
-json_season_info = request_api(base_url, seasons_ep)
+    if all_or_fetch == 'all':
+        logger.info(f'Getting all data from {year_from} to {year_until} and overwriting the existant...')
+        # Create df with all seasons standings, keeping the stored ones of the other categories
+        df_all_seasons_standings = all_categories_standings(json_season_info, category_ids, start_year=year_from, end_year=year_until)
+        df_all_seasons_standings = concat_frames([df_all_seasons_standings, *iter_other_categories(out_filename, list(category_ids), start_year=year_from, end_year=year_until)])
 
-if all_or_fetch == 'all':
-    logger.info(f'Getting all data from {year_from} to {year_until} and overwriting the existant...')
-    # Create df with all seasons standings
-    df_all_seasons_standings_motogp = all_seasons_standings(json_season_info, category_id_motogp, start_year=year_from, end_year=year_until)
+        # Save the df as one csv per season
+        write_partitions(df_all_seasons_standings, out_filename, start_year=year_from, end_year=year_until)
+        logger.info(f'Data saved in {partition_dir(out_filename)}')
+
+    elif all_or_fetch == 'fetch':
+        logger.info(f'Fetching new data from {year_from} to {year_until}...')
+        # Add standings from specific seasons to an already existant csv
+        fetch_new_standings(out_filename, json_season_info, category_ids, start_year=year_from, end_year=year_until)
+
+
+######################### MAIN ###########################
 
-    # Save the df as csv
-    df_all_seasons_standings_motogp.to_csv(out_filename, index=False, sep=';')
-    logger.info(f'Data saved in {out_filename}')
+if __name__ == '__main__':
+    # Read inputs
+    all_or_fetch, year_from, year_until = read_standings_inputs()
 
-elif all_or_fetch == 'fetch':
-    logger.info(f'Fetching new data from {year_from} to {year_until}...')
-    # Add standings from specific seasons to an already existant csv
-    fetch_new_standings(out_filename, json_season_info, category_id_motogp, start_year=year_from, end_year=year_until)
+    # The report is also saved if the run fails, to see where it stopped
+    try:
+        with metrics.stage('standings'):
+            run(all_or_fetch, year_from, year_until)
+    finally:
+        write_reports()
@@ -1,19 +1,41 @@
-import pymysql
-import csv
-from dotenv import dotenv_values
+import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import closing
+from datetime import date
+from functools import lru_cache
+from dotenv import dotenv_values
+from db_backend import RowHashes, UpsertBatch, backend_of, bulk_upsert, connect_mysql, connect_sqlite, get_schema, hash_row, row_key, sqlite_path, upsert_query
+from data_store import partition_files, read_string_chunks, read_strings, table_path
+from metrics import metrics, write_reports
 
 
 ############################ VARIABLES ############################
 
 credentials = dotenv_values()
 
-db_address = credentials['DB_ADDRESS']
-db_user = credentials['DB_USER']
-db_pass = credentials['DB_PASS']
-db_port = int(credentials['DB_PORT'])
-db_name = credentials['DB_NAME']
+# Database where the data is inserted: 'mysql' or 'sqlite' (a local file with the same tables, see db_backend.py)
+db_backend = 'mysql'
+
+# How the rows are inserted: 'upsert' sends them in batches of upserts, 'bulk' loads each file into a staging table
+# (LOAD DATA LOCAL INFILE in MySQL) and merges it into its table with a single INSERT ... SELECT
+import_mode = 'upsert'
+
+# Only send the rows that are new or changed since the last import, comparing their hash with the one stored
+# in the table row_hashes. If False every row is sent again (and the hashes are refreshed)
+delta_import = True
+
+# Folder where the rows whose foreign keys are missing are saved, one csv per table, instead of being inserted
+quarantine_dir = './data/quarantine'
+
+# Tables loaded at the same time, each one on its own connection. A table starts when the tables it references are loaded
+import_workers = 4
 
+# Rows sent to the database in each executemany, and rows upserted between commits
+batch_size = 1000
+commit_interval = 20000
+
+# Events, sessions, standings, RTC and results are stored as one file per season, in csv or parquet (see data_store.py)
 events_csv = './data/events.csv'
 sessions_csv = './data/sessions.csv'
 constructors_csv = './data/constructors.csv'
@@ -23,351 +45,402 @@ standings_csv = './data/standings.csv'
 RTC_csv = './data/riders_teams_constructors.csv'
 results_csv = './data/results.csv'
 
+# How each table is read and cleaned before being inserted (blank values are always inserted as NULL):
+#   'path': csv path of the table, 'partitioned': if it is stored as one file per season
+#   'columns': columns of its files, in the order of the columns of the table in create_tables.sql
+#   'nulls': other values inserted as NULL
+#   'converters': name of the converter applied to a column (see column_converters) and its arguments
+#   'required': columns without which the row is not inserted
+table_specs = {
+    'events': {
+        'path': events_csv, 'partitioned': True,
+        'columns': ['id', 'test', 'sponsored_name', 'date_end', 'date_start', 'name', 'short_name', 'season']
+    },
+    'sessions': {
+        'path': sessions_csv, 'partitioned': True,
+        'columns': [
+            'id', 'date', 'number', 'track_condition', 'air_temperature', 'humidity', 'ground_temperature',
+            'weather', 'circuit', 'session_type', 'event_id', 'season', 'category'
+        ],
+        # Units without value
+        'nulls': ['%', 'º'],
+        'converters': {
+            'date': ('datetime',),
+            'air_temperature': ('strip_unit', 'º'),
+            'humidity': ('strip_unit', '%'),
+            'ground_temperature': ('strip_unit', 'º')
+        }
+    },
+    'constructors': {
+        'path': constructors_csv, 'partitioned': False,
+        'columns': ['constructor_id', 'constructor_name']
+    },
+    'teams': {
+        'path': teams_csv, 'partitioned': False,
+        'columns': ['team_id', 'team_name'],
+        # Skip the row of the riders without team
+        'required': ['team_id']
+    },
+    'riders': {
+        'path': riders_csv, 'partitioned': False,
+        'columns': ['rider_id', 'rider_name', 'rider_country']
+    },
+    'standings': {
+        'path': standings_csv, 'partitioned': True,
+        'columns': ['position', 'points', 'rider_id', 'season', 'category']
+    },
+    'riders_teams_constructors': {
+        'path': RTC_csv, 'partitioned': True,
+        'columns': ['rider_id', 'rider_number', 'team_id', 'constructor_id', 'season', 'category']
+    },
+    'results': {
+        'path': results_csv, 'partitioned': True,
+        'columns': [
+            'id', 'position', 'best_lap_number', 'best_lap_time', 'average_speed', 'top_speed', 'gap_to_first',
+            'total_laps', 'total_time', 'points', 'rider_id', 'session_id', 'best_lap_time_ms', 'total_time_ms', 'gap_to_first_ms',
+            'category'
+        ]
+    }
+}
+
 
 ############################ FUNCTIONS ############################
 
-def insert_data_events(file, cursor):
+def datetime_converter():
     """
-    Args:
-        file (csv)
-        cursor
-    
+    Returns a converter of ISO 8601 timestamps ('2024-03-10T15:00:00+03:00') to DATETIME values ('2024-03-10 15:00:00').
+    """
+    return lambda column: column.str.slice(0, 10) + " " + column.str.slice(11, 19)
+
+def strip_unit_converter(unit):
+    """
+    Returns a converter that removes a unit, e.g. 'º' or '%', from the end of the values.
+    """
+    return lambda column: column.str.rstrip(unit)
+
+# Converters that can be used in table_specs, by name. Each one returns a function applied to a whole column
+column_converters = {
+    'datetime': datetime_converter,
+    'strip_unit': strip_unit_converter
+}
+
+@lru_cache(maxsize=None)
+def table_converters(table):
+    """
+    Builds the converters of the columns of a table from its spec, once per table.
+
     Returns:
+        Dictionary with the function that converts each column
     """
-    with open(file, encoding='unicode_escape') as file_obj:
-        next(file_obj)
-        reader_obj = csv.reader(file_obj, delimiter= ';') 
-
-        i = 0
-
-        for row in reader_obj:
-            # Replace blank values with None
-            row = [None if not s.strip() else s for s in row]
-
-            query = f"""
-                    INSERT INTO events
-                    VALUES 
-                    (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        event_id = VALUES(event_id),
-                        test = VALUES(test),
-                        sponsored_name = VALUES(sponsored_name),
-                        date_end = VALUES(date_end),
-                        date_start = VALUES(date_start),
-                        name = VALUES(name),
-                        short_name = VALUES(short_name),
-                        season = VALUES(season);
-                    """
-            
-            cursor.execute(query, (row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7]))
-            i += 1
-            #print(i)
-        
-        mydb.commit()
+    converters = table_specs[table].get('converters', {})
 
-def insert_data_sessions(file, cursor):
+    return {column: column_converters[name](*args) for column, (name, *args) in converters.items()}
+
+def clean_frame(df, table):
     """
+    Cleans the rows of a file as declared in the spec of its table, on whole columns at once.
+
     Args:
-        file (csv)
-        cursor
-    
+        df (DataFrame): Rows of the file as strings, see read_strings.
+        table (str): Name of the table in create_tables.sql.
+
     Returns:
+        df: DataFrame with the columns of the table in order, missing values for NULL and without the rows that are not inserted
     """
-    with open(file, encoding='unicode_escape') as file_obj:
-        next(file_obj)
-        reader_obj = csv.reader(file_obj, delimiter= ';') 
-
-        i = 0
-
-        for row in reader_obj:
-            # Replace blank values, '%' or 'º' with None
-            row = [None if not s.strip() or s in ['%', 'Âº'] else s for s in row]
-
-            row[1] = row[1][:10] + " " + row[1][11:19]
-            row[4] = row[4][:-2] if row[4] is not None else None
-            row[5] = row[5][:-1] if row[5] is not None else None
-            row[6] = row[6][:-2] if row[6] is not None else None
-
-            query = f"""
-                    INSERT INTO sessions 
-                    VALUES 
-                    (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        session_id = VALUES(session_id),
-                        date = VALUES(date),
-                        number = VALUES(number),
-                        track_condition = VALUES(track_condition),
-                        air_temperature = VALUES(air_temperature),
-                        humidity = VALUES(humidity),
-                        ground_temperature = VALUES(ground_temperature),
-                        weather = VALUES(weather),
-                        circuit = VALUES(circuit),
-                        session_type = VALUES(session_type),
-                        event_id = VALUES(event_id),
-                        season = VALUES(season);
-                    """
-            
-            cursor.execute(query, (row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[11]))
-            i += 1
-            #print(i)
-        
-        mydb.commit()
+    spec = table_specs[table]
+    df = df[spec['columns']]
+
+    # Replace blank values and the other null values of the table with None
+    df = df.mask(df.apply(lambda column: column.str.strip() == '') | df.isin(spec.get('nulls', [])))
+
+    for column, convert in table_converters(table).items():
+        df[column] = convert(df[column])
 
-def insert_data_constructors(file, cursor):
+    return df.dropna(subset=spec.get('required', []))
+
+def insert_data(file, table, cursor, hashes=None):
     """
+    Inserts the rows of a file in a table with batches of upserts, cleaning them in chunks of batch_size rows.
+
     Args:
         file (csv)
+        table (str): Name of the table in create_tables.sql.
         cursor
-    
+        hashes (RowHashes, optional): skip the rows already imported
+
     Returns:
+        Number of rows upserted
     """
-    with open(file, encoding='unicode_escape') as file_obj:
-        next(file_obj)
-        reader_obj = csv.reader(file_obj, delimiter= ';') 
-
-        i = 0
-
-        for row in reader_obj:
-            # Replace blank values with None
-            row = [None if not s.strip() else s for s in row]
-
-            query = f"""
-                    INSERT INTO constructors 
-                    VALUES 
-                    (%s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        constructor_id = VALUES(constructor_id),
-                        name = VALUES(name);
-                    """
-
-            cursor.execute(query, (row[0], row[1]))
-            i += 1
-            #print(i)
-        
-        mydb.commit()
+    batch = UpsertBatch(cursor, upsert_query(table, backend_of(cursor)), batch_size, commit_interval, hashes)
+
+    for df in read_string_chunks(file, batch_size):
+        df = clean_frame(df, table)
 
-def insert_data_teams(file, cursor):
+        for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+            batch.add(row)
+
+        metrics.add_rows('import/' + table, len(df))
+
+    return batch.finish()
+
+def bulk_insert_data(file, table, cursor, hashes=None):
     """
+    Inserts the rows of a file in a table with a single merge from a staging table (see bulk_upsert in db_backend.py).
+
     Args:
         file (csv)
+        table (str): Name of the table in create_tables.sql.
         cursor
-    
-    Returns:
+        hashes (RowHashes, optional): skip the rows already imported
     """
-    with open(file, encoding='unicode_escape') as file_obj:
-        next(file_obj)
-        reader_obj = csv.reader(file_obj, delimiter= ';') 
-
-        i = 0
-
-        for row in reader_obj:
-            # Replace blank values with None
-            row = [None if not s.strip() else s for s in row]
-
-            query = f"""
-                    INSERT INTO teams 
-                    VALUES 
-                    (%s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        team_id = VALUES(team_id),
-                        name = VALUES(name);
-                    """
-
-            cursor.execute(query, (row[0], row[1]))
-            i += 1
-            #print(i)
-        
-        mydb.commit()
+    df = clean_frame(read_strings(file), table)
+    bulk_upsert(cursor, table, df, hashes)
+    metrics.add_rows('import/' + table, len(df))
 
-def insert_data_riders(file, cursor):
+def connect_db(backend=db_backend, local_infile=False):
     """
+    Opens a connection to the database: the MySQL database with the credentials in the .env file,
+    or the local SQLite database (see db_backend.py).
+
     Args:
-        file (csv)
-        cursor
-    
+        backend (str, optional): 'mysql' or 'sqlite'
+        local_infile (bool, optional): allow LOAD DATA LOCAL INFILE in MySQL
+
     Returns:
+        Connection to the database
     """
-    with open(file, encoding='unicode_escape') as file_obj:
-        next(file_obj)
-        reader_obj = csv.reader(file_obj, delimiter= ';') 
-
-        i = 0
-
-        for row in reader_obj:
-            # Replace blank values with None
-            row = [None if not s.strip() else s for s in row]
-
-            query = f"""
-                    INSERT INTO riders 
-                    VALUES 
-                    (%s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        rider_id = VALUES(rider_id),
-                        full_name = VALUES(full_name),
-                        country = VALUES(country);
-                    """
-
-            cursor.execute(query, (row[0], row[1], row[2]))
-            i += 1
-            #print(i)
-        
-        mydb.commit()
+    if backend == 'sqlite':
+        return connect_sqlite(sqlite_path)
+
+    return connect_mysql(credentials, local_infile=local_infile)
 
-def insert_data_standings(file, cursor):
+def table_dependencies(tables):
     """
+    Returns the tables that each table references with its foreign keys in create_tables.sql,
+    which have to be loaded before it.
+
     Args:
-        file (csv)
-        cursor
-    
+        tables (list): Names of the tables to load.
+
     Returns:
+        Dictionary with the set of parent tables of each table, only among the given tables
     """
-    with open(file, encoding='unicode_escape') as file_obj:
-        next(file_obj)
-        reader_obj = csv.reader(file_obj, delimiter= ';') 
-
-        i = 0
-
-        for row in reader_obj:
-            # Replace blank values with None
-            row = [None if not s.strip() else s for s in row]
-
-            query = f"""
-                    INSERT INTO standings 
-                    VALUES 
-                    (%s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        position = VALUES(position),
-                        points = VALUES(points),
-                        rider_id = VALUES(rider_id),
-                        season = VALUES(season);
-                    """
-
-            cursor.execute(query, (row[0], row[1], row[2], row[3]))
-            i += 1
-            #print(i)
-        
-        mydb.commit()
+    schema = get_schema()
+
+    return {table: {parent for parent in schema[table]['references'] if parent in tables and parent != table} for table in tables}
 
-def insert_data_RTC(file, cursor):
+def load_order(dependencies):
     """
+    Returns the tables in an order where every table comes after the tables it references.
+
     Args:
-        file (csv)
-        cursor
-    
+        dependencies (dict): Set of parent tables of each table, see table_dependencies.
+    """
+    order = []
+
+    while len(order) < len(dependencies):
+        ready = [table for table, parents in dependencies.items() if table not in order and parents <= set(order)]
+        if not ready:
+            raise ValueError(f'Circular foreign keys between {set(dependencies) - set(order)}')
+        order += ready
+
+    return order
+
+def validate_tables(table_files, backend=db_backend, delta=delta_import):
+    """
+    Checks the foreign keys of the rows of every table before loading them. The keys referenced are collected in sets
+    from the database and from the rows about to be loaded, and each column is checked against them with isin.
+    Tables are checked in load order, so rows referencing an orphan row are orphans too. The files are read in
+    chunks of batch_size rows, and with delta only the rows that are new or changed since the last import are
+    checked, as the other ones are already in the database.
+
+    The orphan rows are saved in quarantine_dir with the foreign keys they miss, and are not inserted.
+
+    Args:
+        table_files (dict): Files of each table about to be loaded.
+        backend (str, optional): 'mysql' or 'sqlite'
+        delta (bool, optional): only check the rows that are new or changed, see RowHashes in db_backend.py
+
     Returns:
+        orphans (dict): Primary keys (see row_key in db_backend.py) of the orphan rows of each table
     """
-    with open(file, encoding='unicode_escape') as file_obj:
-        next(file_obj)
-        reader_obj = csv.reader(file_obj, delimiter= ';') 
-
-        i = 0
-
-        for row in reader_obj:
-            # Replace blank values with None
-            row = [None if not s.strip() else s for s in row]
-
-            query = f"""
-                    INSERT INTO riders_teams_constructors 
-                    VALUES 
-                    (%s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        rider_id = VALUES(rider_id),
-                        rider_number = VALUES(rider_number),
-                        team_id = VALUES(team_id),
-                        constructor_id = VALUES(constructor_id),
-                        season = VALUES(season);
-                    """
-
-            cursor.execute(query, (row[0], row[1], row[2], row[3], row[4]))
-            i += 1
-            #print(i)
-        
+    schema = get_schema()
+    order = load_order(table_dependencies(list(table_files)))
+    orphans = {}
+
+    # Values of every referenced column, starting with the ones already in the database
+    parent_keys = {}
+    imported_hashes = {}
+    with closing(connect_db(backend)) as mydb:
+        cursor = mydb.cursor ()
+
+        for table in order:
+            for column, parent, parent_column in schema[table]['foreign_keys']:
+                if (parent, parent_column) not in parent_keys:
+                    cursor.execute(f'SELECT {parent_column} FROM {parent}')
+                    parent_keys[(parent, parent_column)] = {str(value) for (value,) in cursor.fetchall()}
+
+            if delta:
+                imported_hashes[table] = RowHashes(cursor, table).hashes
         mydb.commit()
 
-def insert_data_results(file, cursor):
+    os.makedirs(quarantine_dir, exist_ok=True)
+
+    for table in order:
+        columns = schema[table]['columns']
+        quarantine_path = os.path.join(quarantine_dir, table + '.csv')
+        if os.path.exists(quarantine_path):
+            os.remove(quarantine_path)
+
+        orphans[table] = set()
+        for file in table_files[table]:
+            for df in read_string_chunks(file, batch_size):
+                df = clean_frame(df, table)
+
+                # Rows imported as they are now are already in the database with their foreign keys
+                if delta:
+                    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+                    df = df[[imported_hashes[table].get(row_key(table, row)) != hash_row(row) for row in rows]]
+
+                # Foreign keys missing in each row, e.g. 'sessions.session_id'
+                missing = pd.Series('', index=df.index)
+                for column, parent, parent_column in schema[table]['foreign_keys']:
+                    values = df.iloc[:, columns.index(column)]
+                    orphan = values.notna() & ~values.isin(parent_keys[(parent, parent_column)])
+                    missing[orphan] += f'{parent}.{parent_column} '
+
+                orphan = missing != ''
+                valid = df[~orphan]
+
+                # Add the rows about to be loaded to the values referenced by the next tables
+                for (parent, parent_column), keys in parent_keys.items():
+                    if parent == table:
+                        keys.update(valid.iloc[:, columns.index(parent_column)].dropna())
+
+                df_orphans = df[orphan]
+                if df_orphans.empty:
+                    continue
+
+                orphans[table].update(row_key(table, row) for row in df_orphans.astype(object).itertuples(index=False, name=None))
+                df_orphans.assign(missing=missing[orphan].str.strip()).to_csv(
+                    quarantine_path, mode='a', index=False, sep=';', header=not os.path.exists(quarantine_path)
+                )
+
+        if orphans[table]:
+            print(f'{len(orphans[table])} rows of {table} with missing foreign keys saved in {quarantine_path}')
+
+    return orphans
+
+def load_table(table, files, backend=db_backend, mode=import_mode, delta=delta_import, orphans=None):
     """
+    Inserts the files of a table on a new connection to the database.
+
     Args:
-        file (csv)
-        cursor
-    
+        table (str): Name of the table in create_tables.sql.
+        files (list): csv or parquet files with the rows of the table.
+        backend (str, optional): 'mysql' or 'sqlite'
+        mode (str, optional): 'upsert' or 'bulk'
+        delta (bool, optional): only send the rows that are new or changed
+        orphans (set, optional): primary keys of the rows that are not inserted, see validate_tables
+
     Returns:
+        Dictionary with the number of rows inserted, updated, unchanged and orphans
     """
-    with open(file, encoding='unicode_escape') as file_obj:
-        next(file_obj)
-        reader_obj = csv.reader(file_obj, delimiter= ';') 
-
-        i = 0
-
-        df_riders = pd.read_csv('./data/riders.csv', sep=';', encoding='unicode_escape')
-        list_riders = df_riders['rider_id'].to_list()
-
-        for row in reader_obj:
-            # Replace blank values with None
-            row = [None if not s.strip() else s for s in row]
-
-            # Skip the row if the rider is not in the table riders
-            if row[7] not in list_riders:
-                continue
-
-            query = f"""
-                    INSERT INTO results 
-                    VALUES 
-                    (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        results_id = VALUES(results_id),
-                        position = VALUES(position),
-                        best_lap_number = VALUES(best_lap_number),
-                        best_lap_time = VALUES(best_lap_time),
-                        average_speed = VALUES(average_speed),
-                        top_speed = VALUES(top_speed),
-                        gap_to_first = VALUES(gap_to_first),
-                        total_laps = VALUES(total_laps),
-                        total_time = VALUES(total_time),
-                        points = VALUES(points),
-                        rider_id = VALUES(rider_id),
-                        session_id = VALUES(session_id);
-                    """
-            
-
-            cursor.execute(query, (row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8]))
-            i += 1
-            #print(i)
-        
-        mydb.commit()
+    with metrics.stage('import/' + table), closing(connect_db(backend, local_infile=(mode == 'bulk'))) as mydb:
 
+        cursor = mydb.cursor ()
+        hashes = RowHashes(cursor, table, skip_unchanged=delta, orphans=orphans)
 
-############################ MAIN ############################
+        for file in files:
+            if mode == 'bulk':
+                bulk_insert_data(file, table, cursor, hashes)
+            else:
+                insert_data(file, table, cursor, hashes)
 
-with pymysql.connect(
-    host=db_address,
-    user=db_user,
-    password=db_pass,
-    port=db_port,
-    db=db_name
-) as mydb:
-    
-    cursor = mydb.cursor ()
+    for result, rows in hashes.counts.items():
+        metrics.count('rows_imported', rows, table=table, result=result)
 
-    insert_data_events(events_csv, cursor)
-    print('Data inserted in events')
+    return hashes.counts
 
-    insert_data_sessions(sessions_csv, cursor)
-    print('Data inserted in sessions')
+def run(year_from=1949, year_until=date.today().year, backend=db_backend, mode=import_mode, workers=import_workers, delta=delta_import):
+    """
+    Inserts the data of every csv in its table of the database.
+    Only the seasons from year_from to year_until are read from the tables stored per season.
+    The foreign keys of every row are checked first (see validate_tables) and the orphan rows are not inserted.
+    Tables are loaded in parallel, each one as soon as the tables it references are loaded;
+    if a table fails, the tables that reference it are not loaded.
 
-    insert_data_constructors(constructors_csv, cursor)
-    print('Data inserted in constructors')
+    Args:
+        year_from (int, optional): year from which the data is inserted
+        year_until (int, optional): year until which the data is inserted
+        backend (str, optional): 'mysql' or 'sqlite'
+        mode (str, optional): 'upsert' or 'bulk'
+        workers (int, optional): tables loaded at the same time
+        delta (bool, optional): only send the rows that are new or changed since the last import
 
-    insert_data_teams(teams_csv, cursor)
-    print('Data inserted in teams')
+    Returns:
+        Dictionary with the number of rows inserted, updated, unchanged and orphans in each table loaded
 
-    insert_data_riders(riders_csv, cursor)
-    print('Data inserted in riders')
+    Raises:
+        RuntimeError: if any table could not be loaded
+    """
+    table_files = {
+        table: partition_files(spec['path'], year_from, year_until) if spec['partitioned'] else [table_path(spec['path'])]
+        for table, spec in table_specs.items()
+    }
+    dependencies = table_dependencies(list(table_files))
+    with metrics.stage('import/validate'):
+        orphans = validate_tables(table_files, backend, delta)
+
+    finished = set()
+    failed = []
+    running = {}
+    counts = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        while True:
+            # Start the tables whose parents are loaded
+            for table, parents in dependencies.items():
+                if table in finished or table in failed or table in running.values():
+                    continue
+
+                if parents & set(failed):
+                    print(f'Data not inserted in {table} because a table it references failed')
+                    failed.append(table)
+                    continue
+                if not parents <= finished:
+                    continue
+
+                running[executor.submit(load_table, table, table_files[table], backend, mode, delta, orphans[table])] = table
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                table = running.pop(future)
+                try:
+                    counts[table] = future.result()
+                except Exception as e:
+                    print(f'Data not inserted in {table}: {e!r}')
+                    failed.append(table)
+                    continue
+
+                print(f"Data inserted in {table}: {counts[table]['inserted']} inserted, {counts[table]['updated']} updated, {counts[table]['unchanged']} unchanged, {counts[table]['orphans']} orphans")
+                finished.add(table)
+
+    if failed:
+        raise RuntimeError(f'Tables not inserted: {failed}')
+
+    return counts
 
-    insert_data_standings(standings_csv, cursor)
-    print('Data inserted in standings')
 
-    insert_data_RTC(RTC_csv, cursor)
-    print('Data inserted in riders_teams_constructors')
+############################ MAIN ############################
 
-    insert_data_results(results_csv, cursor)
-    print('Data inserted in results')
+if __name__ == '__main__':
+    # The report is also saved if the import fails, to see where it stopped
+    try:
+        with metrics.stage('import'):
+            run()
+    finally:
+        write_reports()
@@ -0,0 +1,264 @@
+# Metrics of a run: requests to the API, rows flattened and inserted and duration of each stage
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from profiling import profile_stage
+
+logger = logging.getLogger(__name__)
+
+
+######################### VARIABLES ###########################
+
+# Upper bounds (seconds) of the buckets of the latency histograms
+latency_buckets = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+# Seconds between the progress lines a stage writes to the log
+progress_interval = 10
+
+# Run report written by write_reports, and the Prometheus text file (not written if None)
+report_file = './logs/run_report.json'
+prometheus_file = None
+
+# Prefix of the names of the metrics in the Prometheus text file
+metric_prefix = 'motogp_'
+
+
+######################### CLASSES ###########################
+
+class Histogram:
+    """
+    Counts observed values in cumulative buckets, as Prometheus histograms do.
+
+    Args:
+        buckets (list): Upper bounds of the buckets, sorted.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'buckets': dict(zip([str(bound) for bound in self.buckets], self.counts))
+        }
+
+
+class RunMetrics:
+    """
+    Collects the metrics of a run from every thread: counters and histograms with labels
+    (e.g. the responses of each endpoint by status code) and the duration and rows of each stage.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1, **labels):
+        """
+        Adds value to a counter, e.g. count('api_bytes', 1024, endpoint='events').
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=latency_buckets, **labels):
+        """
+        Adds a value to a histogram, e.g. observe('api_request_seconds', 0.2, endpoint='events').
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def _stage(self, name):
+        # Called with the lock held
+        if name not in self.stages:
+            self.stages[name] = {'status': None, 'seconds': None, 'rows': 0, 'started': None, 'logged': time.monotonic()}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the code run inside the with block as a stage of the run, and records if it failed.
+        The stage is also profiled if it is in profiling.profile_stages.
+        """
+        with self._lock:
+            stage = self._stage(name)
+            stage['status'] = 'running'
+            stage['started'] = time.monotonic()
+
+        try:
+            with profile_stage(name):
+                yield
+        except BaseException:
+            self._finish_stage(name, 'failed')
+            raise
+        self._finish_stage(name, 'done')
+
+    def _finish_stage(self, name, status):
+        with self._lock:
+            stage = self.stages[name]
+            stage['status'] = status
+            stage['seconds'] = time.monotonic() - stage['started']
+            rows = stage['rows']
+        logger.info(f"Stage {name} {status} in {stage['seconds']:.1f}s, {rows} rows")
+
+    def add_rows(self, stage, rows, unit='rows'):
+        """
+        Adds rows flattened or inserted by a stage, and logs its progress every progress_interval seconds.
+
+        Args:
+            stage (str): Name of the stage.
+            rows (int): Rows added.
+            unit (str, optional): What the rows are in the progress line, e.g. 'results'.
+        """
+        with self._lock:
+            stage_metrics = self._stage(stage)
+            stage_metrics['rows'] += rows
+            now = time.monotonic()
+            if now - stage_metrics['logged'] < progress_interval:
+                return
+            stage_metrics['logged'] = now
+            total = stage_metrics['rows']
+            elapsed = now - stage_metrics['started'] if stage_metrics['started'] else None
+
+        rate = f', {total / elapsed:.0f}/s' if elapsed else ''
+        logger.info(f'{stage}: {total} {unit}{rate}')
+
+    def report(self):
+        """
+        Returns the metrics as a dictionary that can be saved as json.
+        """
+        with self._lock:
+            now = time.monotonic()
+            stages = {}
+            for name, stage in self.stages.items():
+                seconds = stage['seconds']
+                if seconds is None and stage['started'] is not None:
+                    seconds = now - stage['started']
+                stages[name] = {
+                    'status': stage['status'],
+                    'seconds': round(seconds, 3) if seconds is not None else None,
+                    'rows': stage['rows'],
+                    'rows_per_s': round(stage['rows'] / seconds, 1) if seconds else None
+                }
+
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({'labels': dict(labels), 'value': round(value, 6)})
+
+            histograms = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(name, []).append(dict(labels=dict(labels), **histogram.to_dict()))
+
+        return {
+            'started': datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            'seconds': round(time.time() - self.started, 3),
+            'stages': stages,
+            'counters': counters,
+            'histograms': histograms
+        }
+
+    def prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        report = self.report()
+        lines = []
+
+        for name, values in report['counters'].items():
+            lines.append(f'# TYPE {metric_prefix}{name}_total counter')
+            lines += [f"{metric_prefix}{name}_total{prometheus_labels(value['labels'])} {value['value']}" for value in values]
+
+        for name, values in report['histograms'].items():
+            lines.append(f'# TYPE {metric_prefix}{name} histogram')
+            for value in values:
+                for bound, count in value['buckets'].items():
+                    lines.append(f"{metric_prefix}{name}_bucket{prometheus_labels(dict(value['labels'], le=bound))} {count}")
+                lines.append(f"{metric_prefix}{name}_bucket{prometheus_labels(dict(value['labels'], le='+Inf'))} {value['count']}")
+                lines.append(f"{metric_prefix}{name}_sum{prometheus_labels(value['labels'])} {value['sum']}")
+                lines.append(f"{metric_prefix}{name}_count{prometheus_labels(value['labels'])} {value['count']}")
+
+        for field in ['seconds', 'rows']:
+            lines.append(f'# TYPE {metric_prefix}stage_{field} gauge')
+            lines += [
+                f"{metric_prefix}stage_{field}{prometheus_labels({'stage': name})} {stage[field]}"
+                for name, stage in report['stages'].items() if stage[field] is not None
+            ]
+
+        return '\n'.join(lines) + '\n'
+
+
+######################### FUNCTIONS ###########################
+
+def prometheus_labels(labels):
+    """
+    Formats labels as {name="value",...}, or an empty string if there are none.
+    """
+    if not labels:
+        return ''
+
+    escaped = {name: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for name, value in labels.items()}
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped.items()) + '}'
+
+def endpoint_name(endpoint):
+    """
+    Returns the endpoint without its query and ids, so all the requests to an endpoint share their metrics,
+    e.g. 'session/<id>/classification' -> 'session/{id}/classification', 'events?seasonUuid=<id>' -> 'events'.
+    """
+    return re.sub(r'/[^/]+/', '/{id}/', endpoint.split('?')[0])
+
+def write_file_atomic(path, content):
+    """
+    Writes a file through a temporary file, so readers (e.g. the textfile collector of node_exporter) never see half of it.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = path + '.part'
+    with open(tmp_path, 'w') as file_obj:
+        file_obj.write(content)
+    os.replace(tmp_path, path)
+
+def write_reports(report_path=None, prometheus_path=None):
+    """
+    Saves the metrics of the run in the json report and, if a path is set, in the Prometheus text file.
+
+    Args:
+        report_path (str, optional): Json file. Defaults to report_file.
+        prometheus_path (str, optional): Prometheus text file. Defaults to prometheus_file.
+    """
+    report_path = report_path or report_file
+    prometheus_path = prometheus_path or prometheus_file
+
+    write_file_atomic(report_path, json.dumps(metrics.report(), indent=2))
+    logger.info(f'Run report saved in {report_path}')
+
+    if prometheus_path:
+        write_file_atomic(prometheus_path, metrics.prometheus())
+        logger.info(f'Prometheus metrics saved in {prometheus_path}')
+
+
+# Metrics of the current run, shared by every module
+metrics = RunMetrics()
@@ -0,0 +1,188 @@
+# Local mock of the MotoGP API, serving synthetic or recorded payloads with configurable latency and errors
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from api_cache import ResponseCache
+import payload_generator
+
+
+######################### VARIABLES ###########################
+
+host = '127.0.0.1'
+port = 8765
+
+# Path of the API in the urls, as in api_client.base_url
+base_path = '/motogp/v1/results/'
+
+# Url of the real API the recorded responses were requested from (the urls stored in the response cache)
+recorded_base_url = 'https://api.motogp.pulselive.com/motogp/v1/results/'
+
+# Seconds each response is delayed: latency plus a random part up to latency_jitter
+latency = 0.02
+latency_jitter = 0.01
+
+# Fraction of the requests answered with a 503, and with a 429 asking to wait retry_after seconds
+error_rate = 0.0
+throttle_rate = 0.0
+retry_after = 1
+
+
+######################### CLASSES ###########################
+
+class MockAPIServer(ThreadingHTTPServer):
+    """
+    HTTP server that answers the endpoints of the MotoGP API, each request in its own thread.
+
+    Payloads come from payload_generator, or from a response cache file of a real crawl (see api_cache.py)
+    if recordings is given. The requests answered are counted and served on /__stats.
+
+    Args:
+        address (tuple): (host, port) to listen on. Port 0 picks a free port.
+        scale (int, optional): Multiplies the events of each season of the synthetic payloads.
+        recordings (str, optional): Response cache file whose responses are served instead of the synthetic ones.
+        latency (float, optional): Seconds each response is delayed.
+        latency_jitter (float, optional): Maximum random seconds added to the latency.
+        error_rate (float, optional): Fraction of the requests answered with a 503.
+        throttle_rate (float, optional): Fraction of the requests answered with a 429 and Retry-After.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, scale=1, recordings=None, latency=latency, latency_jitter=latency_jitter,
+                 error_rate=error_rate, throttle_rate=throttle_rate):
+        super().__init__(address, MockAPIHandler)
+        self.scale = scale
+        self.recordings = ResponseCache(recordings, float('inf'), {}) if recordings else None
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.stats = {'requests': 0, 'bytes': 0, 'errors': 0, 'throttled': 0, 'not_found': 0}
+        self._lock = threading.Lock()
+
+    def count(self, key, value=1):
+        """
+        Adds value to a counter of stats.
+        """
+        with self._lock:
+            self.stats[key] += value
+
+    def payload(self, endpoint):
+        """
+        Returns the body of the response to an endpoint, or None if it is not known.
+        """
+        if self.recordings is not None:
+            entry = self.recordings.get(recorded_base_url + endpoint)
+            return entry['body'] if entry is not None else None
+
+        data = payload_generator.payload(endpoint, self.scale)
+        return json.dumps(data).encode() if data is not None else None
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """
+    Answers a GET request to the mock API.
+    """
+
+    # Keep-alive connections, as the real API. Without TCP_NODELAY every response waits for the delayed ACK of its headers
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+
+        if self.path == '/__stats':
+            with server._lock:
+                self.send_json(200, json.dumps(server.stats).encode())
+            return
+
+        if not self.path.startswith(base_path):
+            server.count('not_found')
+            self.send_json(404, b'[]')
+            return
+
+        server.count('requests')
+        time.sleep(server.latency + random.uniform(0, server.latency_jitter))
+
+        draw = random.random()
+        if draw < server.throttle_rate:
+            server.count('throttled')
+            self.send_json(429, b'[]', {'Retry-After': str(retry_after)})
+            return
+        if draw < server.throttle_rate + server.error_rate:
+            server.count('errors')
+            self.send_json(503, b'[]')
+            return
+
+        body = server.payload(self.path[len(base_path):])
+        if body is None:
+            server.count('not_found')
+            self.send_json(404, b'[]')
+            return
+
+        server.count('bytes', len(body))
+        self.send_json(200, body)
+
+    def send_json(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Do not write every request to stderr
+        pass
+
+
+######################### FUNCTIONS ###########################
+
+def start_server(port=0, **options):
+    """
+    Starts the mock API in a background thread.
+
+    Args:
+        port (int, optional): Port to listen on, a free one if 0.
+        options: Arguments of MockAPIServer, e.g. scale or latency.
+
+    Returns:
+        List with the server (stop it with shutdown) and the base url to use as api_client.base_url
+    """
+    server = MockAPIServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return [server, f'http://{host}:{server.server_address[1]}{base_path}']
+
+def read_arguments(argv=None):
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Serve a local mock of the MotoGP API.')
+    parser.add_argument('--port', type=int, default=port, help='port to listen on (0 picks a free one)')
+    parser.add_argument('--scale', type=int, default=1, help='multiplies the events of each season')
+    parser.add_argument('--recordings', help='response cache file (./cache/api_cache.sqlite) to serve instead of synthetic payloads')
+    parser.add_argument('--latency', type=float, default=latency, help='seconds each response is delayed')
+    parser.add_argument('--jitter', type=float, default=latency_jitter, help='maximum random seconds added to the latency')
+    parser.add_argument('--error-rate', type=float, default=error_rate, help='fraction of the requests answered with a 503')
+    parser.add_argument('--throttle-rate', type=float, default=throttle_rate, help='fraction of the requests answered with a 429')
+
+    return parser.parse_args(argv)
+
+
+######################### MAIN ###########################
+
+if __name__ == '__main__':
+    args = read_arguments()
+
+    server = MockAPIServer(
+        (host, args.port), scale=args.scale, recordings=args.recordings, latency=args.latency,
+        latency_jitter=args.jitter, error_rate=args.error_rate, throttle_rate=args.throttle_rate
+    )
+    # Printed so a parent process knows the port is ready
+    print(f'http://{host}:{server.server_address[1]}{base_path}', flush=True)
+    server.serve_forever()
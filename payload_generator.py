@@ -0,0 +1,324 @@
+# Synthetic payloads with the shapes of the MotoGP API responses, for the mock API and the benchmarks
+import random
+import zlib
+from datetime import date, timedelta
+
+
+######################### VARIABLES ###########################
+
+first_season = 1949
+
+# Size of the history of a season at scale 1. The scale multiplies the events of each season
+events_per_season = 20
+sessions_per_event = 8
+riders_per_season = 30
+riders_per_session = 25
+
+# Riders that can take part in a season, so the same riders appear in several seasons
+rider_pool = 300
+
+# Categories of the seasons: id and first season. MotoGP has the id of the real API, so the crawl defaults work
+categories = {
+    'MotoGP': {'id': 'e8c110ad-64aa-4e8e-8a86-f2f152f6a942', 'first_season': first_season},
+    'Moto2': {'id': 'category-moto2', 'first_season': 2010},
+    'Moto3': {'id': 'category-moto3', 'first_season': 2012},
+    'MotoE': {'id': 'category-motoe', 'first_season': 2019}
+}
+
+session_types = ['FP', 'FP', 'PR', 'Q', 'Q', 'WUP', 'SPR', 'RAC']
+race_points = [25, 20, 16, 13, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1]
+track_conditions = ['Dry', 'Dry', 'Dry', 'Wet']
+weathers = ['Clear', 'Cloudy', 'Partly Cloudy', 'Rain']
+
+# Fraction of the entries with a missing value, as in the real payloads: results without best_lap or gap
+# (riders that did not start), standings without team and sessions with only the unit of a condition ('%', 'º')
+missing_rate = 0.05
+
+
+######################### FUNCTIONS ###########################
+
+def resource_random(resource_id):
+    """
+    Returns a random generator seeded with the id of a resource, so the same request always gets the same payload.
+    """
+    return random.Random(zlib.crc32(resource_id.encode()))
+
+def season_id(year):
+    """
+    Returns the id of a season. Ids keep the season and number of the resource, so the mock API does not need any state.
+    """
+    return f'season-{year}'
+
+def event_id(year, number):
+    """
+    Returns the id of an event of a season, e.g. 'event-2024-3'.
+    """
+    return f'event-{year}-{number}'
+
+def session_id(event, number, category='MotoGP'):
+    """
+    Returns the id of a session of an event, e.g. 'session-2024-3-7', or 'session-2024-3-7-moto2' in other categories.
+    """
+    suffix = '' if category == 'MotoGP' else '-' + category.lower()
+
+    return f'session-{event[len("event-"):]}-{number}{suffix}'
+
+def category_of(category_id):
+    """
+    Returns the name of a category from its id, MotoGP if it is not known.
+    """
+    return next((name for name, category in categories.items() if category['id'] == category_id), 'MotoGP')
+
+def session_category(session):
+    """
+    Returns the category of a session id, e.g. 'session-2024-3-7-moto2' -> 'Moto2'.
+    """
+    suffix = session.split('-')[-1]
+
+    return next((name for name in categories if name.lower() == suffix), 'MotoGP')
+
+def in_category(year, category):
+    """
+    Returns True if a category was raced in a season.
+    """
+    return year >= categories[category]['first_season']
+
+def event_day(event):
+    """
+    Returns the race day of an event: one event a week from March.
+    """
+    return date(season_of(event), 3, 1) + timedelta(days=(int(event.split('-')[2]) * 7) % 270)
+
+def season_of(resource_id):
+    """
+    Returns the year of a season, event or session id, e.g. 'session-2024-3-7' -> 2024.
+    """
+    return int(resource_id.split('-')[1])
+
+def season_riders(year, category='MotoGP'):
+    """
+    Returns the ids of the riders of a season in a category.
+    """
+    rng = resource_random(season_id(year) if category == 'MotoGP' else f'{season_id(year)}/{category}')
+
+    return [f'rider-{number}' for number in rng.sample(range(rider_pool), riders_per_season)]
+
+def rider(number):
+    """
+    Returns the rider object of a payload for a rider id.
+    """
+    index = int(number.split('-')[1])
+
+    return {
+        'id': number,
+        'full_name': f'Rider {index}',
+        'country': {'iso': 'XX', 'name': f'Country {index % 25}'},
+        'legacy_id': index,
+        'number': index % 99 + 1,
+        'riders_api_uuid': number
+    }
+
+def team(rng):
+    """
+    Returns a team object, or None for a rider without team.
+    """
+    if rng.random() < missing_rate:
+        return None
+
+    index = rng.randrange(15)
+    return {'id': f'team-{index}', 'name': f'Team {index}', 'legacy_id': index, 'season': None}
+
+def constructor(rng):
+    """
+    Returns a constructor object.
+    """
+    index = rng.randrange(6)
+    return {'id': f'constructor-{index}', 'name': f'Constructor {index}', 'legacy_id': index}
+
+def lap_time(milliseconds):
+    """
+    Formats a time as the API does: '1:40.123', or '1:02:03.456' over an hour.
+    """
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    hours, minutes = divmod(minutes, 60)
+    seconds = f'{milliseconds // 1000:02d}.{milliseconds % 1000:03d}'
+
+    return f'{hours}:{minutes:02d}:{seconds}' if hours else f'{minutes}:{seconds}'
+
+def seasons_payload(last_season=date.today().year):
+    """
+    Returns the payload of the endpoint seasons, newest first.
+    """
+    return [
+        {'id': season_id(year), 'name': None, 'year': year, 'current': year == last_season}
+        for year in range(last_season, first_season - 1, -1)
+    ]
+
+def categories_payload(season):
+    """
+    Returns the payload of the endpoint categories?seasonUuid=<season>: the categories raced in the season.
+    """
+    year = season_of(season)
+
+    return [
+        {'id': category['id'], 'name': f'{name}™', 'legacy_id': number}
+        for number, (name, category) in enumerate(categories.items(), start=1)
+        if in_category(year, name)
+    ]
+
+def events_payload(season, scale=1):
+    """
+    Returns the payload of the endpoint events?seasonUuid=<season>.
+    """
+    year = season_of(season)
+    list_events = []
+
+    for number in range(events_per_season * scale):
+        day = event_day(event_id(year, number))
+        list_events.append({
+            'id': event_id(year, number),
+            'name': f'GRAND PRIX {number}',
+            'sponsored_name': f'Grand Prix {number} of Somewhere',
+            'date_start': (day - timedelta(days=2)).isoformat(),
+            'date_end': day.isoformat(),
+            'test': number % 10 == 9,
+            'toad_api_uuid': event_id(year, number),
+            'short_name': f'G{number % 100:02d}',
+            'legacy_id': [{'categoryId': 3, 'eventId': number}],
+            'season': {'id': season, 'year': year, 'current': False},
+            'country': {'iso': 'XX', 'name': 'Somewhere', 'region_iso': ''},
+            'event_files': {},
+            'circuit': {'id': f'circuit-{number % 22}', 'name': f'Circuit {number % 22}'},
+            'status': 'FINISHED',
+            'additional_name': ''
+        })
+
+    return list_events
+
+def sessions_payload(event, category='MotoGP'):
+    """
+    Returns the payload of the endpoint sessions?eventUuid=<event>&categoryUuid=<category>.
+    """
+    if not in_category(season_of(event), category):
+        return []
+
+    rng = resource_random(event if category == 'MotoGP' else f'{event}/{category}')
+    day = event_day(event)
+    list_sessions = []
+
+    for number in range(sessions_per_event):
+        session_type = session_types[number % len(session_types)]
+        # Sessions from two days before the race to the race day
+        session_day = day - timedelta(days=2 - number * 3 // sessions_per_event)
+        air = rng.randrange(10, 40)
+
+        list_sessions.append({
+            'id': session_id(event, number, category),
+            'type': session_type,
+            'number': number % 2 + 1 if session_type in ['FP', 'Q'] else None,
+            'date': f'{session_day.isoformat()}T{10 + number % 8:02d}:00:00+00:00',
+            'status': 'FINISHED',
+            'circuit': f'Circuit {int(event.split("-")[2]) % 22}',
+            'condition': {
+                'track': rng.choice(track_conditions),
+                'air': 'º' if rng.random() < missing_rate else f'{air}º',
+                'humidity': '%' if rng.random() < missing_rate else f'{rng.randrange(20, 90)}%',
+                'ground': 'º' if rng.random() < missing_rate else f'{air + rng.randrange(15)}º',
+                'weather': rng.choice(weathers)
+            },
+            'event': {'id': event, 'name': f'GRAND PRIX {event.split("-")[2]}'},
+            'session_files': {}
+        })
+
+    return list_sessions
+
+def classification_payload(session):
+    """
+    Returns the payload of the endpoint session/<session>/classification.
+    """
+    rng = resource_random(session)
+    riders = rng.sample(season_riders(season_of(session), session_category(session)), riders_per_session)
+    best_lap = rng.randrange(90000, 130000)
+    laps = rng.randrange(18, 28)
+    winner_time = best_lap * laps + rng.randrange(5000, 30000)
+    entries = []
+
+    for position, number in enumerate(riders, start=1):
+        entry = {
+            'id': f'{session}-result-{position}',
+            'position': position,
+            'rider': rider(number),
+            'team': team(rng),
+            'constructor': constructor(rng),
+            'average_speed': round(rng.uniform(140, 180), 1),
+            'total_laps': laps,
+            'time': lap_time(winner_time + (position - 1) * rng.randrange(300, 3000)),
+            'points': race_points[position - 1] if position <= len(race_points) else 0,
+            'status': 'INSTND',
+            'top_speed': round(rng.uniform(300, 360), 1)
+        }
+
+        # Riders that did not start have no best lap nor gap
+        if rng.random() >= missing_rate:
+            entry['best_lap'] = {'number': rng.randrange(2, laps), 'time': lap_time(best_lap + rng.randrange(0, 3000))}
+            gap = (position - 1) * rng.randrange(300, 3000)
+            entry['gap'] = {'first': f'{gap // 1000}.{gap % 1000:03d}', 'lap': '0'}
+
+        entries.append(entry)
+
+    return {'classification': entries, 'file': '', 'records': []}
+
+def standings_payload(season, category='MotoGP'):
+    """
+    Returns the payload of the endpoint standings?seasonUuid=<season>&categoryUuid=<category>.
+    """
+    if not in_category(season_of(season), category):
+        return []
+
+    rng = resource_random(season + '/standings' + ('' if category == 'MotoGP' else '/' + category))
+    riders = season_riders(season_of(season), category)
+    points = sorted((rng.randrange(0, 400) for _ in riders), reverse=True)
+
+    return {
+        'classification': [
+            {
+                'id': f'{season}-standing-{position}',
+                'position': position,
+                'rider': rider(number),
+                'team': team(rng),
+                'constructor': constructor(rng),
+                'points': points[position - 1]
+            }
+            for position, number in enumerate(riders, start=1)
+        ],
+        'file': ''
+    }
+
+def payload(endpoint, scale=1):
+    """
+    Returns the synthetic payload of an endpoint of the API, as requested by api_client.
+
+    Args:
+        endpoint (str): Endpoint with its query, e.g. 'events?seasonUuid=season-2024'.
+        scale (int, optional): Multiplies the events of each season.
+
+    Returns:
+        JSON data of the endpoint, or None if the endpoint is not known
+    """
+    path, _, query = endpoint.partition('?')
+    params = dict(param.split('=', 1) for param in query.split('&') if '=' in param)
+
+    if path == 'seasons':
+        return seasons_payload()
+    if path == 'categories' and 'seasonUuid' in params:
+        return categories_payload(params['seasonUuid'])
+    if path == 'events' and 'seasonUuid' in params:
+        return events_payload(params['seasonUuid'], scale)
+    if path == 'sessions' and 'eventUuid' in params:
+        return sessions_payload(params['eventUuid'], category_of(params.get('categoryUuid')))
+    if path == 'standings' and 'seasonUuid' in params:
+        return standings_payload(params['seasonUuid'], category_of(params.get('categoryUuid')))
+    if path.startswith('session/') and path.endswith('/classification'):
+        return classification_payload(path.split('/')[1])
+
+    return None
@@ -0,0 +1,339 @@
+# Run every stage of the MotoGP data pipeline without prompts, skipping the stages that are up to date
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date
+from api_client import base_url, crawl_concurrency, request_api
+import categories
+import data_store
+from data_store import format_extensions, partition_dir, table_path
+from db_backend import backends
+import metrics
+import profiling
+import get_data
+import get_events
+import get_results
+import get_sessions
+
+# The imported scripts already configured the root logger with their own file, so the pipeline
+# adds its file next to it instead of replacing it
+pipeline_handler = logging.FileHandler('./logs/pipeline.log')
+pipeline_handler.setFormatter(logging.Formatter(
+    fmt='[%(asctime)s] {%(pathname)s:%(lineno)d} %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d   %H:%M:%S'
+))
+logging.getLogger().addHandler(pipeline_handler)
+logging.getLogger().setLevel(logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+######################### VARIABLES ###########################
+
+seasons_ep = 'seasons'
+
+seasons_json = './data/seasons.json'
+state_file = './data/pipeline_state.json'
+
+csv_tables = [
+    get_events.out_filename,
+    get_sessions.out_filename,
+    get_results.out_filename,
+    get_data.out_riders,
+    get_data.out_teams,
+    get_data.out_constructors,
+    get_data.out_RTC,
+    get_data.out_standings
+]
+
+# Stages of the pipeline: the stages they depend on, the files they read and the files they write.
+# The 'api' stages request data that can still change while a season is running.
+stages = {
+    'seasons': {'deps': [], 'inputs': [], 'outputs': [seasons_json], 'api': False},
+    'events': {'deps': ['seasons'], 'inputs': [seasons_json], 'outputs': [get_events.out_filename], 'api': True},
+    'sessions': {'deps': ['events'], 'inputs': [get_sessions.events_csv], 'outputs': [get_sessions.out_filename], 'api': True},
+    'results': {'deps': ['sessions'], 'inputs': [get_results.sessions_csv], 'outputs': [get_results.out_filename], 'api': True},
+    'standings': {
+        'deps': ['seasons'],
+        'inputs': [seasons_json],
+        'outputs': [get_data.out_riders, get_data.out_teams, get_data.out_constructors, get_data.out_RTC, get_data.out_standings],
+        'api': True
+    },
+    'import': {'deps': ['results', 'standings'], 'inputs': csv_tables, 'outputs': [], 'api': False}
+}
+
+
+######################### FUNCTIONS ###########################
+
+def read_seasons():
+    """
+    Returns the seasons json data saved by the seasons stage.
+    """
+    with open(seasons_json) as file_obj:
+        return json.load(file_obj)
+
+def run_stage(stage, args):
+    """
+    Runs a stage of the pipeline.
+
+    Args:
+        stage (str): Name of the stage.
+        args (Namespace): Parsed command line arguments.
+    """
+    if stage == 'seasons':
+        json_seasons_info = request_api(base_url, seasons_ep)
+        if json_seasons_info == []:
+            raise RuntimeError('Seasons could not be retrieved from the API')
+
+        # Only rewrite the file if the seasons changed, so the next stages see the same fingerprint
+        content = json.dumps(json_seasons_info, sort_keys=True)
+        if file_hash(seasons_json) != hashlib.sha256(content.encode()).hexdigest():
+            with open(seasons_json, 'w') as file_obj:
+                file_obj.write(content)
+
+        # Unknown categories stop the pipeline here, before any stage rewrites a table
+        categories.discover_categories(args.year_from, args.year_until, args.categories, seasons_info=json_seasons_info)
+
+    elif stage == 'events':
+        get_events.run(args.mode, args.year_from, args.year_until, json_seasons_info=read_seasons(), stream=args.stream)
+
+    elif stage == 'sessions':
+        get_sessions.run(args.mode, args.year_from, args.year_until, stream=args.stream, categories=args.categories)
+
+    elif stage == 'results':
+        get_results.run(args.mode, args.year_from, args.year_until, concurrency=args.concurrency, stream=args.stream, categories=args.categories)
+
+    elif stage == 'standings':
+        get_data.run(args.mode, args.year_from, args.year_until, json_seasons_info=read_seasons(), categories=args.categories)
+
+    elif stage == 'import':
+        # Imported here so the fetch stages do not need the database dependencies
+        import import_data_to_db
+        import_data_to_db.run(args.year_from, args.year_until, backend=args.db, mode='bulk' if args.bulk else 'upsert', delta=not args.full_import)
+
+def run_timed_stage(stage, args):
+    """
+    Runs a stage of the pipeline, recording its duration and status in the metrics of the run.
+    """
+    with metrics.metrics.stage(stage):
+        run_stage(stage, args)
+
+def file_hash(path):
+    """
+    Returns the sha256 of a file, or None if it does not exist. Tables stored per season
+    (see data_store.py) are hashed with the names and content of all their season csv files.
+    """
+    if os.path.exists(table_path(path)):
+        files = [table_path(path)]
+    elif os.path.isdir(partition_dir(path)):
+        files = sorted(glob.glob(os.path.join(partition_dir(path), '*' + format_extensions[data_store.data_format])))
+    else:
+        return None
+
+    sha = hashlib.sha256()
+    for file in files:
+        if file != table_path(path):
+            sha.update(os.path.basename(file).encode())
+
+        with open(file, 'rb') as file_obj:
+            for block in iter(lambda: file_obj.read(1024 * 1024), b''):
+                sha.update(block)
+
+    return sha.hexdigest()
+
+def fingerprint(stage, args, files):
+    """
+    Returns a fingerprint of the arguments of the pipeline and the content of the given files.
+
+    Args:
+        stage (str): Name of the stage.
+        args (Namespace): Parsed command line arguments.
+        files (list): Paths of the files.
+
+    Returns:
+        fingerprint (str): sha256 of the arguments and the files.
+    """
+    content = {
+        'stage': stage,
+        'mode': args.mode,
+        'year_from': args.year_from,
+        'year_until': args.year_until,
+        'format': args.data_format,
+        'categories': args.categories,
+        'files': {path: file_hash(path) for path in files}
+    }
+
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def is_up_to_date(stage, args, state):
+    """
+    Checks if a stage can be skipped: its inputs and outputs are the same as after its last run
+    and, if it requests data from the API, the requested seasons are already over.
+
+    Args:
+        stage (str): Name of the stage.
+        args (Namespace): Parsed command line arguments.
+        state (dict): Fingerprints recorded by the previous runs.
+
+    Returns:
+        True if the stage can be skipped
+    """
+    if args.force or stage not in state or stage == 'seasons':
+        return False
+
+    if stages[stage]['api'] and args.year_until >= date.today().year:
+        return False
+
+    if any(file_hash(path) is None for path in stages[stage]['outputs']):
+        return False
+
+    return (state[stage]['inputs'] == fingerprint(stage, args, stages[stage]['inputs'])
+            and state[stage]['outputs'] == fingerprint(stage, args, stages[stage]['outputs']))
+
+def load_state():
+    """
+    Returns the fingerprints recorded by the previous runs.
+    """
+    if not os.path.exists(state_file):
+        return {}
+
+    with open(state_file) as file_obj:
+        return json.load(file_obj)
+
+def save_state(state):
+    """
+    Saves the fingerprints of the stages.
+    """
+    with open(state_file, 'w') as file_obj:
+        json.dump(state, file_obj, indent=4, sort_keys=True)
+
+def run_pipeline(args):
+    """
+    Runs the stages of the pipeline in the order of their dependencies. Stages that do not depend
+    on each other (the standings and the events chain) run at the same time.
+
+    Args:
+        args (Namespace): Parsed command line arguments.
+
+    Returns:
+        List with the names of the stages that failed
+    """
+    # Every stage reads and writes the tables in the selected format
+    data_store.data_format = args.data_format
+    profiling.profile_stages = args.profile
+
+    selected = [stage for stage in stages if stage != 'import' or args.import_db]
+    state = load_state()
+
+    finished = set()
+    failed = []
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=len(selected)) as executor:
+        while True:
+            # Start the stages whose dependencies are finished
+            for stage in selected:
+                if stage in finished or stage in failed or stage in running.values():
+                    continue
+
+                deps = [dep for dep in stages[stage]['deps'] if dep in selected]
+                if any(dep in failed for dep in deps):
+                    logger.warning(f"Stage {stage} not run because a dependency failed")
+                    failed.append(stage)
+                    continue
+                if not all(dep in finished for dep in deps):
+                    continue
+
+                if is_up_to_date(stage, args, state):
+                    logger.info(f"Stage {stage} is up to date, skipped")
+                    print(f"{stage}: up to date")
+                    finished.add(stage)
+                    continue
+
+                logger.info(f"Stage {stage} started")
+                print(f"{stage}: running")
+                running[executor.submit(run_timed_stage, stage, args)] = stage
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception(f"Stage {stage} failed")
+                    print(f"{stage}: failed")
+                    failed.append(stage)
+                    continue
+
+                state[stage] = {
+                    'inputs': fingerprint(stage, args, stages[stage]['inputs']),
+                    'outputs': fingerprint(stage, args, stages[stage]['outputs'])
+                }
+                save_state(state)
+                logger.info(f"Stage {stage} finished")
+                print(f"{stage}: done")
+                finished.add(stage)
+
+    return failed
+
+def read_arguments(argv=None):
+    """
+    Parses and validates the command line arguments.
+
+    Returns:
+        args (Namespace): Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description='Get MotoGP data from the API and optionally import it into the database.')
+    parser.add_argument('--mode', choices=['all', 'fetch'], required=True, help='get all data and overwrite the existant, or fetch new data')
+    parser.add_argument('--from', dest='year_from', type=int, required=True, help='year from which to get the data')
+    parser.add_argument('--until', dest='year_until', type=int, default=date.today().year, help='year until which to get the data')
+    parser.add_argument('--concurrency', type=int, default=crawl_concurrency, help='requests in flight at the same time for the results')
+    parser.add_argument('--import', dest='import_db', action='store_true', help='import the csv files into the database at the end')
+    parser.add_argument('--stream', action='store_true', help='in all mode, write events, sessions and results in chunks as they arrive')
+    parser.add_argument('--db', choices=list(backends), default='mysql', help='database where the data is imported: MySQL or a local SQLite file')
+    parser.add_argument('--bulk', action='store_true', help='import each file through a staging table and a single merge (LOAD DATA LOCAL INFILE in MySQL)')
+    parser.add_argument('--full-import', dest='full_import', action='store_true', help='send every row to the database, not only the new or changed ones')
+    parser.add_argument('--format', dest='data_format', choices=list(format_extensions), default=data_store.data_format, help='format of the data tables (parquet needs pyarrow)')
+    parser.add_argument('--categories', nargs='+', metavar='CATEGORY', default=categories.crawl_categories, help="categories to crawl at the same time, e.g. MotoGP Moto2 Moto3, or 'all' (see categories.py)")
+    parser.add_argument('--force', action='store_true', help='run every stage even if it is up to date')
+    parser.add_argument('--report', default=metrics.report_file, help='json file where the metrics of the run are saved')
+    parser.add_argument('--prometheus', default=metrics.prometheus_file, help='also save the metrics of the run in this Prometheus text file')
+    parser.add_argument('--profile', nargs='+', metavar='STAGE', default=profiling.profile_stages, help="profile the CPU and memory of these stages, e.g. results 'import/*' (see profiling.py)")
+
+    args = parser.parse_args(argv)
+
+    if not 1949 <= args.year_from <= date.today().year:
+        parser.error(f'--from must be between 1949 and {date.today().year}')
+    if not args.year_from <= args.year_until <= date.today().year:
+        parser.error(f'--until must be between {args.year_from} and {date.today().year}')
+
+    # Names as they are stored in the tables, each one once. Unknown names are rejected by categories.discover_categories
+    args.categories = list(dict.fromkeys(categories.category_name(name) for name in args.categories))
+    if '' in args.categories:
+        parser.error('--categories cannot have empty names')
+    if 'all' in args.categories and len(args.categories) > 1:
+        parser.error("--categories cannot mix 'all' with the names of categories")
+
+    return args
+
+
+######################### MAIN ###########################
+
+if __name__ == '__main__':
+    args = read_arguments()
+
+    # The report is also saved if the pipeline stops, to see where the time went
+    try:
+        failed_stages = run_pipeline(args)
+    finally:
+        metrics.write_reports(args.report, args.prometheus)
+
+    if failed_stages:
+        sys.exit(1)
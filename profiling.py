@@ -0,0 +1,143 @@
+# Opt-in CPU (cProfile) and memory (tracemalloc) profiling of the stages of a run
+import cProfile
+import fnmatch
+import io
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+######################### VARIABLES ###########################
+
+# Stages profiled, as names or patterns: e.g. ['results', 'import/*'], or ['*'] for every stage.
+# Also read from the environment variable MOTOGP_PROFILE, e.g. MOTOGP_PROFILE='results,import/*'
+profile_stages = [stage for stage in os.environ.get('MOTOGP_PROFILE', '').split(',') if stage]
+
+profile_cpu = True
+profile_memory = True
+
+# Directory of the profiles: <stage>.prof (open it with pstats or snakeviz), <stage>.cpu.txt and <stage>.memory.txt
+profile_dir = './logs/profiles'
+
+# Functions listed in <stage>.cpu.txt and allocation sites in <stage>.memory.txt
+top_functions = 40
+top_allocations = 25
+
+# Frames kept for each allocation traced
+traceback_frames = 1
+
+_local = threading.local()
+_memory_lock = threading.Lock()
+_memory_stages = 0
+
+
+######################### FUNCTIONS ###########################
+
+def is_profiled(stage):
+    """
+    Returns True if a stage matches one of profile_stages.
+    """
+    return any(fnmatch.fnmatchcase(stage, pattern) for pattern in profile_stages)
+
+def profile_path(stage, suffix):
+    """
+    Returns the path of a profile of a stage, e.g. ('import/results', '.prof') -> './logs/profiles/import.results.prof'.
+    """
+    return os.path.join(profile_dir, stage.replace('/', '.') + suffix)
+
+def start_memory():
+    """
+    Starts tracing the allocations if no other profiled stage is running.
+    """
+    global _memory_stages
+
+    with _memory_lock:
+        if _memory_stages == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(traceback_frames)
+        _memory_stages += 1
+
+def stop_memory(stage):
+    """
+    Saves the peak and the top allocations of a stage, and stops tracing when the last profiled stage ends.
+    Stages running at the same time share the allocations traced, so the peak is the one of the whole process.
+    """
+    global _memory_stages
+
+    with _memory_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+        ])
+        _memory_stages -= 1
+        if _memory_stages == 0:
+            tracemalloc.stop()
+
+    lines = [f'Stage {stage}: peak {peak / 1024 ** 2:.1f} MB traced', f'Top {top_allocations} allocations still alive at the end of the stage:']
+    lines += [str(statistic) for statistic in snapshot.statistics('lineno')[:top_allocations]]
+
+    with open(profile_path(stage, '.memory.txt'), 'w') as file_obj:
+        file_obj.write('\n'.join(lines) + '\n')
+
+def stop_cpu(stage, profiler):
+    """
+    Saves the cProfile stats of a stage, and a summary sorted by cumulative time.
+    """
+    profiler.create_stats()
+    profiler.dump_stats(profile_path(stage, '.prof'))
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(top_functions)
+    with open(profile_path(stage, '.cpu.txt'), 'w') as file_obj:
+        file_obj.write(summary.getvalue())
+
+@contextmanager
+def profile_stage(stage):
+    """
+    Profiles the code run inside the with block if the stage is in profile_stages, and does nothing otherwise.
+
+    cProfile only sees the thread that runs the stage, so requests made by the worker threads of the
+    concurrent crawls are not included. A stage run inside another profiled stage of the same thread
+    is only profiled for memory, as a thread can only have one profiler.
+
+    Args:
+        stage (str): Name of the stage, e.g. 'results' or 'import/results'.
+    """
+    if not profile_stages or not is_profiled(stage):
+        yield
+        return
+
+    os.makedirs(profile_dir, exist_ok=True)
+
+    profiler = None
+    if profile_cpu and not getattr(_local, 'profiling', False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            _local.profiling = True
+        except ValueError:
+            # Another profiler is active (Python 3.12+ allows a single one per process)
+            logger.warning(f'Stage {stage} not profiled for CPU: another profiler is active')
+            profiler = None
+
+    if profile_memory:
+        start_memory()
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _local.profiling = False
+            stop_cpu(stage, profiler)
+
+        if profile_memory:
+            stop_memory(stage)
+
+        logger.info(f'Profile of stage {stage} saved in {profile_dir}')
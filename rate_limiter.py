@@ -0,0 +1,179 @@
+# Adaptive rate limiter shared by every request to the MotoGP API
+import logging
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+######################### CLASSES ###########################
+
+class RateLimiter:
+    """
+    Token bucket that limits the requests per second and the requests in flight, adapting both
+    to the responses of the API (additive increase, multiplicative decrease).
+
+    Every throttled response (429 or 5xx) halves the rate and the number of requests in flight,
+    while each successful response increases the rate a little and, after a streak of successes,
+    allows one more request in flight. A Retry-After from the server pauses every request.
+
+    Args:
+        rate (float): Initial requests per second.
+        burst (int): Maximum tokens the bucket can hold.
+        max_in_flight (int): Maximum requests in flight at the same time.
+        min_rate (float): Lower bound for the rate.
+        max_rate (float): Upper bound for the rate.
+        increase_step (float): Requests per second added after each successful response.
+        success_streak (int): Successful responses needed to allow one more request in flight.
+    """
+
+    def __init__(self, rate, burst, max_in_flight, min_rate, max_rate, increase_step=0.1, success_streak=20):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.in_flight_limit = max_in_flight
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.success_streak = success_streak
+        self.stats = {'requests': 0, 'throttled': 0, 'waited_seconds': 0.0}
+
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """
+        Blocks until a request can be sent: the bucket has a token, the limit of requests
+        in flight is not reached and the limiter is not paused by a Retry-After.
+        """
+        start = time.monotonic()
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= self.in_flight_limit:
+                    wait = None
+                elif self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    self.stats['requests'] += 1
+                    break
+
+                self._condition.wait(wait)
+
+        self.stats['waited_seconds'] += time.monotonic() - start
+
+    def release(self, throttled=False):
+        """
+        Frees the slot of a finished request and adapts the rate and requests in flight to its response.
+
+        Args:
+            throttled (bool): True if the API answered 429 or 5xx, or the request failed (timeout, connection reset).
+        """
+        with self._condition:
+            self._in_flight -= 1
+
+            if throttled:
+                self.stats['throttled'] += 1
+                self._successes = 0
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.in_flight_limit = max(1, self.in_flight_limit // 2)
+                logger.info(f"API throttling: rate lowered to {self.rate:.2f} req/s, {self.in_flight_limit} requests in flight")
+            else:
+                self._successes += 1
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+                if self._successes >= self.success_streak and self.in_flight_limit < self.max_in_flight:
+                    self.in_flight_limit += 1
+                    self._successes = 0
+
+            self._condition.notify_all()
+
+    def pause(self, seconds):
+        """
+        Stops every request for the given seconds, e.g. when the API sends a Retry-After.
+        """
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def log_stats(self):
+        """
+        Logs the counters of the limiter.
+        """
+        logger.info(
+            f"Rate limiter: {self.stats['requests']} requests, {self.stats['throttled']} throttled, "
+            f"{self.stats['waited_seconds']:.1f}s waiting, final rate {self.rate:.2f} req/s"
+        )
+
+
+######################### FUNCTIONS ###########################
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+
+    Args:
+        value (str): Value of the header.
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid, so the default backoff is used
+    """
+    if not value:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        return max(0.0, seconds) if math.isfinite(seconds) else None
+
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+    # Dates with a '-0000' zone are parsed without a timezone, but HTTP dates are always in UTC
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt, backoff_factor, max_backoff, retry_after=None):
+    """
+    Returns the seconds to wait before retrying a request: exponential backoff with full jitter,
+    but never less than the Retry-After sent by the server.
+
+    Args:
+        attempt (int): Number of the failed attempt, starting at 0.
+        backoff_factor (float): Seconds of the first backoff.
+        max_backoff (float): Maximum seconds of the backoff.
+        retry_after (float, optional): Seconds requested by the server.
+
+    Returns:
+        delay (float): Seconds to wait.
+    """
+    delay = random.uniform(0, min(max_backoff, backoff_factor * 2 ** attempt))
+
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+
+    return delay
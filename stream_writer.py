@@ -0,0 +1,146 @@
+# Write the DataFrames produced while crawling to the season files of a table in fixed-size chunks, so memory does not grow with the season range
+import os
+import pandas as pd
+import data_store
+from data_store import partition_dir, partition_path, remove_partitions, season_column, typed_frame
+
+
+######################### VARIABLES ###########################
+
+# Rows kept in memory before they are flushed to the csv
+chunk_rows = 50000
+
+
+######################### FUNCTIONS ###########################
+
+def flush_chunk(buffer, file_obj, columns, table):
+    """
+    Writes the buffered DataFrames to the open csv as a single chunk.
+
+    Args:
+        buffer (list): DataFrames waiting to be written.
+        file_obj (file): Open csv file.
+        columns (list): Columns of the csv, or None if the header has not been written yet.
+        table (str): csv path of the table, to write the columns with its types as data_store does.
+
+    Returns:
+        columns (list): Columns of the csv.
+    """
+    df_chunk = pd.concat(buffer, ignore_index=True)
+
+    header = columns is None
+    if header:
+        columns = list(df_chunk.columns)
+
+    typed_frame(df_chunk.reindex(columns=columns), table).to_csv(file_obj, index=False, sep=';', header=header)
+
+    return columns
+
+def flush_parquet_chunk(buffer, writer, path, columns, table):
+    """
+    Writes the buffered DataFrames to a parquet file as a single row group, opening the writer with the first chunk.
+
+    Args:
+        buffer (list): DataFrames waiting to be written.
+        writer (ParquetWriter): Open parquet writer, or None if the file has not been opened yet.
+        path (str): Temporary parquet file.
+        columns (list): Columns of the file, or None if it has not been opened yet.
+        table (str): csv path of the table, to get the types of its columns.
+
+    Returns:
+        List with the writer and the columns of the file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df_chunk = pd.concat(buffer, ignore_index=True)
+    if columns is None:
+        columns = list(df_chunk.columns)
+
+    arrow_chunk = pa.Table.from_pandas(typed_frame(df_chunk.reindex(columns=columns), table), preserve_index=False)
+    if writer is None:
+        writer = pq.ParquetWriter(path, arrow_chunk.schema)
+    writer.write_table(arrow_chunk)
+
+    return [writer, columns]
+
+def flush_partitions(buffers, files, columns, table):
+    """
+    Writes the buffered DataFrames of each season to the temporary file of the season, opening it the first time.
+
+    Args:
+        buffers (dict): DataFrames waiting to be written for each season. Emptied once they are written.
+        files (dict): Open temporary csv file or parquet writer of each season.
+        columns (dict): Columns of the file of each season.
+        table (str): csv path of the table.
+    """
+    for season, buffer in buffers.items():
+        tmp_path = partition_path(table, season) + '.part'
+
+        if data_store.data_format == 'parquet':
+            files[season], columns[season] = flush_parquet_chunk(buffer, files.get(season), tmp_path, columns.get(season), table)
+            continue
+
+        if season not in files:
+            files[season] = open(tmp_path, 'w', encoding=data_store.csv_encoding, newline='')
+            columns[season] = None
+
+        columns[season] = flush_chunk(buffer, files[season], columns[season], table)
+
+    buffers.clear()
+
+def stream_to_partitions(frames, table, season_of=season_column, start_year=None, end_year=None, chunk_rows=chunk_rows):
+    """
+    Writes the DataFrames yielded by a generator as they arrive, flushing them every chunk_rows rows, to one
+    file per season of the table in the current format (see data_store.py). Every season is written to a
+    temporary file and all of them are renamed at the end, so a crash never leaves a half written output.
+
+    Args:
+        frames (iterable): DataFrames with the same columns, e.g. one per request.
+        table (str): csv path of the table, e.g. './data/results.csv'.
+        season_of (function, optional): Returns the season of each row of a DataFrame.
+        start_year (int, optional): If given with end_year, the seasons of this period without rows are removed
+        end_year (int, optional): year until which the seasons without rows are removed
+        chunk_rows (int, optional): Rows kept in memory before they are written.
+
+    Returns:
+        total_rows (int): Number of rows written.
+    """
+    os.makedirs(partition_dir(table), exist_ok=True)
+
+    files = {}
+    columns = {}
+    buffers = {}
+    buffered_rows = 0
+    total_rows = 0
+
+    try:
+        for df in frames:
+            if df.empty:
+                continue
+
+            for season, df_season in df.groupby(season_of(df).to_numpy(), sort=False):
+                buffers.setdefault(int(season), []).append(df_season)
+            buffered_rows += len(df)
+
+            if buffered_rows >= chunk_rows:
+                flush_partitions(buffers, files, columns, table)
+                total_rows += buffered_rows
+                buffered_rows = 0
+
+        if buffers:
+            flush_partitions(buffers, files, columns, table)
+            total_rows += buffered_rows
+
+    finally:
+        for file_obj in files.values():
+            file_obj.close()
+
+    for season in files:
+        path = partition_path(table, season)
+        os.replace(path + '.part', path)
+
+    if start_year is not None and end_year is not None:
+        remove_partitions(table, start_year, end_year, files)
+
+    return total_rows
@@ -0,0 +1,52 @@
+# The modules of the project are flat files in the root of the repository, the fetch scripts
+# log to ./logs when they are imported and the database is created from ./create_tables.sql, so the
+# tests run from a temporary folder with both
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+work_dir = tempfile.mkdtemp(prefix='motogp_tests_')
+os.makedirs(os.path.join(work_dir, 'logs'))
+shutil.copy(os.path.join(root, 'create_tables.sql'), work_dir)
+os.chdir(work_dir)
+
+
+######################### FIXTURES ###########################
+
+@pytest.fixture(scope='module')
+def mock_url():
+    """
+    Starts the mock API without latency or errors, and points the fetch scripts to it.
+    """
+    # Imported here, once the tests run from the temporary folder
+    import api_client
+    import categories
+    import get_all
+    import get_data
+    import get_events
+    import get_results
+    import get_sessions
+    import get_standings
+    import mock_api
+    import payload_generator
+
+    patch = pytest.MonkeyPatch()
+    patch.setattr(payload_generator, 'events_per_season', 4)
+    server, url = mock_api.start_server(latency=0, latency_jitter=0)
+    patch.setattr(api_client, 'use_cache', False)
+    for setting in ['rate_limit', 'rate_burst', 'max_rate']:
+        patch.setattr(api_client, setting, 1000)
+    api_client.close_session()
+    for module in [api_client, categories, get_all, get_data, get_events, get_results, get_sessions, get_standings]:
+        patch.setattr(module, 'base_url', url)
+
+    yield url
+
+    patch.undo()
+    api_client.close_session()
+    server.shutdown()
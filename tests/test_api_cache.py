@@ -0,0 +1,28 @@
+import time
+from datetime import date, timedelta
+from api_cache import ResponseCache
+from crawl_ledger import is_past, settled_time
+
+classification_ep = 'session/session-id/classification'
+
+
+######################### FUNCTIONS ###########################
+
+def test_session_cached_while_running_is_revalidated(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), 1024 * 1024, {'session/': 7 * 24 * 3600})
+    cache.store('url', b'[]')
+    entry = cache.get('url')
+
+    # Cached during a session that ends after the entry was stored
+    running = settled_time(date.today().isoformat())
+    assert not cache.is_fresh(entry, classification_ep, settled_after=running)
+    assert not is_past(date.today().isoformat())
+
+    # Cached once the session was over
+    finished = settled_time((date.today() - timedelta(days=1)).isoformat())
+    assert cache.is_fresh(entry, classification_ep, settled_after=finished)
+    assert is_past((date.today() - timedelta(days=1)).isoformat())
+
+def test_session_without_date_is_never_settled():
+    assert settled_time(None) > time.time()
+    assert not is_past(None)
@@ -0,0 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
+import api_client
+
+
+######################### FUNCTIONS ###########################
+
+def test_every_thread_shares_one_session(mock_url):
+    api_client.close_session()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        sessions = list(executor.map(lambda _: api_client.get_session(), range(32)))
+
+    assert all(session is sessions[0] for session in sessions)
+
+def test_consecutive_requests_reuse_the_connection(mock_url):
+    api_client.close_session()
+
+    for _ in range(5):
+        assert api_client.request_api(mock_url, 'seasons') != []
+
+    # The pool of the host opened a single keep-alive connection for all of them
+    pools = api_client.get_session().get_adapter(mock_url).poolmanager.pools
+    assert [pools[key].num_connections for key in pools.keys()] == [1]
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+import categories
+from categories import category_names, discover_categories, iter_other_categories, map_categories, select_categories
+from data_store import write_partitions
+
+
+######################### FUNCTIONS ###########################
+
+def categories_api(url, endpoint, settled_after=None):
+    """
+    Answers the categories requests of a single season as the API does.
+    """
+    return [{'id': 'motogp-id', 'name': 'MotoGP™'}, {'id': 'moto2-id', 'name': 'Moto2™'}]
+
+def test_empty_categories_are_not_the_default_ones():
+    assert category_names(None) == categories.crawl_categories
+    assert category_names([]) == []
+
+def test_discover_categories_rejects_unknown_and_empty(monkeypatch):
+    monkeypatch.setattr(categories, 'request_api', categories_api)
+    seasons_info = [{'id': 'season-2024', 'year': 2024}]
+
+    assert discover_categories(2024, 2024, ['Moto2', 'MotoGP'], seasons_info=seasons_info) == {'Moto2': 'moto2-id', 'MotoGP': 'motogp-id'}
+
+    with pytest.raises(ValueError):
+        discover_categories(2024, 2024, ['Moto9'], seasons_info=seasons_info)
+    with pytest.raises(ValueError):
+        discover_categories(2024, 2024, [], seasons_info=seasons_info)
+
+def test_select_categories_keeps_the_given_ones():
+    df = pd.DataFrame({'id': ['session-1', 'session-2', 'session-3'], 'category': ['MotoGP', 'Moto2', 'Moto3']})
+
+    assert list(select_categories(df, ['Moto2', 'Moto3'])['id']) == ['session-2', 'session-3']
+    assert list(select_categories(df, ['all'])['id']) == list(df['id'])
+
+def test_other_categories_are_kept_from_the_period(tmp_path):
+    table = str(tmp_path / 'sessions.csv')
+    write_partitions(pd.DataFrame({
+        'id': ['session-2023', 'session-2024-motogp', 'session-2024-moto2'],
+        'season': [2023, 2024, 2024],
+        'category': ['Moto2', 'MotoGP', 'Moto2']
+    }), table)
+
+    other = pd.concat(iter_other_categories(table, ['MotoGP'], start_year=2024, end_year=2024))
+
+    assert list(other['id']) == ['session-2024-moto2']
+    assert list(iter_other_categories(table, ['all'], start_year=2024, end_year=2024)) == []
+
+def test_map_categories_keeps_the_order_of_the_categories():
+    category_ids = {'MotoGP': 'motogp-id', 'Moto2': 'moto2-id', 'Moto3': 'moto3-id'}
+
+    assert map_categories(lambda category, category_id: category_id, category_ids) == ['motogp-id', 'moto2-id', 'moto3-id']
@@ -0,0 +1,112 @@
+import os
+from functools import partial
+import pandas as pd
+import pytest
+import requests
+import get_events
+import get_results
+import get_sessions
+import mock_api
+from crawl_ledger import CrawlLedger
+from data_store import partition_dir
+from flatten import flatten_results
+from get_sessions import spooled_in_period
+
+
+######################### FUNCTIONS ###########################
+
+def crashed_ledger(tmp_path):
+    """
+    Returns the ledger of a run of 2022 and 2024 that crashed after crawling an event of each season.
+    """
+    ledger = CrawlLedger(str(tmp_path / 'sessions.ledger'), str(tmp_path / 'sessions.spool.csv'), key_column='event_id')
+    ledger.record('event-2022-0', pd.DataFrame({'id': ['session-2022-0-0'], 'event_id': ['event-2022-0'], 'season': [2022]}))
+    ledger.record('event-2024-0', pd.DataFrame({'id': ['session-2024-0-0'], 'event_id': ['event-2024-0'], 'season': [2024]}))
+
+    return CrawlLedger(ledger.ledger_path, ledger.spool_path, key_column='event_id')
+
+def test_with_spooled_keeps_the_rows_of_the_run(tmp_path):
+    ledger = crashed_ledger(tmp_path)
+
+    df = ledger.with_spooled(pd.DataFrame(), keep=partial(spooled_in_period, start_year=2023, end_year=2024))
+
+    assert list(df['season']) == [2024]
+    # The event left out is crawled again by the runs of its season
+    assert not ledger.done('event-2022-0')
+    assert not CrawlLedger(ledger.ledger_path, ledger.spool_path).done('event-2022-0')
+    assert ledger.done('event-2024-0')
+
+def test_iter_spooled_keeps_the_rows_of_the_run(tmp_path):
+    ledger = crashed_ledger(tmp_path)
+
+    frames = ledger.iter_spooled('event_id', set(ledger.keys), 1, keep=partial(spooled_in_period, start_year=2023, end_year=2024))
+
+    assert list(pd.concat(frames)['season']) == [2024]
+    assert not ledger.done('event-2022-0')
+
+def stored_lines(table):
+    """
+    Returns the lines of the season files of a table, in order, so crawls that add the rows in another order compare equal.
+    """
+    folder = partition_dir(table)
+    lines = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), encoding='utf-8') as file_obj:
+            lines[name] = sorted(file_obj)
+
+    return lines
+
+def crawl_results(run_dir, monkeypatch, crash_after=None):
+    """
+    Crawls the results of a season in a folder of its own. If crash_after is given, the first run stops
+    after that many sessions and a second run resumes it from the spool.
+    """
+    os.makedirs(run_dir / 'data')
+    monkeypatch.chdir(run_dir)
+    get_events.run('all', 2024, 2024)
+    get_sessions.run('all', 2024, 2024)
+
+    if crash_after is not None:
+        flattened = []
+
+        def crashing_flatten(*args):
+            if len(flattened) == crash_after:
+                raise RuntimeError('Crawl stopped')
+            flattened.append(flatten_results(*args))
+
+        with monkeypatch.context() as patch:
+            patch.setattr(get_results, 'flatten_results', crashing_flatten)
+            with pytest.raises(RuntimeError):
+                get_results.run('all', 2024, 2024, concurrency=1)
+
+    get_results.run('all', 2024, 2024, concurrency=1)
+    return stored_lines(get_results.out_filename)
+
+def test_resumed_crawl_stores_the_same_rows(mock_url, tmp_path, monkeypatch):
+    clean = crawl_results(tmp_path / 'clean', monkeypatch)
+
+    assert crawl_results(tmp_path / 'resumed', monkeypatch, crash_after=5) == clean
+
+def api_requests(mock_url):
+    """
+    Returns the number of requests answered by the mock API so far.
+    """
+    return requests.get(mock_url.split(mock_api.base_path)[0] + '/__stats').json()['requests']
+
+def test_fetch_only_requests_the_sessions_not_crawled(mock_url, tmp_path, monkeypatch):
+    crawl_results(tmp_path, monkeypatch)
+    ledger = CrawlLedger(get_results.results_ledger, get_results.results_spool)
+    assert ledger.keys and not ledger.in_progress()
+
+    before = api_requests(mock_url)
+    get_results.run('fetch', 2024, 2024, concurrency=1)
+
+    assert api_requests(mock_url) == before
+
+def test_reset_forgets_the_crawled_keys(tmp_path):
+    ledger = crashed_ledger(tmp_path)
+    ledger.finish()
+    assert not ledger.in_progress() and ledger.done('event-2024-0')
+
+    ledger.reset()
+    assert not CrawlLedger(ledger.ledger_path, ledger.spool_path).done('event-2024-0')
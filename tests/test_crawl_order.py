@@ -0,0 +1,64 @@
+import os
+import get_all
+import get_events
+import get_results
+import get_sessions
+from data_store import partition_dir
+
+crawled_categories = ['MotoGP', 'Moto2']
+stored_categories = ['Moto3']
+year = 2024
+
+
+######################### FUNCTIONS ###########################
+
+def stored_files(table):
+    """
+    Returns the content of the season files of a table, by file name.
+    """
+    folder = partition_dir(table)
+    files = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), 'rb') as file_obj:
+            files[name] = file_obj.read()
+
+    return files
+
+def crawl(run_dir, monkeypatch, staged=True, stream=False):
+    """
+    Crawls the events, sessions and results of the season in a folder of its own, staged or with get_all,
+    over the stored rows of another category that have to be kept.
+
+    Returns:
+        List with the season files of events, sessions and results
+    """
+    os.makedirs(run_dir / 'data')
+    monkeypatch.chdir(run_dir)
+
+    get_events.run('all', year, year)
+    get_sessions.run('all', year, year, categories=stored_categories)
+    get_results.run('all', year, year, categories=stored_categories)
+
+    if staged:
+        get_events.run('all', year, year, stream=stream)
+        get_sessions.run('all', year, year, stream=stream, categories=crawled_categories)
+        get_results.run('all', year, year, stream=stream, categories=crawled_categories)
+    else:
+        get_all.run('all', year, year, categories=crawled_categories)
+
+    return [stored_files(table) for table in [get_events.out_filename, get_sessions.out_filename, get_results.out_filename]]
+
+def test_every_crawl_stores_the_categories_in_the_same_order(mock_url, tmp_path, monkeypatch):
+    batch = crawl(tmp_path / 'batch', monkeypatch)
+    assert all(category.encode() in batch[2]['season=2024.csv'] for category in crawled_categories + stored_categories)
+
+    assert crawl(tmp_path / 'stream', monkeypatch, stream=True) == batch
+    assert crawl(tmp_path / 'get_all', monkeypatch, staged=False) == batch
+
+def test_get_all_without_data_stores_nothing(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+
+    get_all.run('all', year, year, json_seasons_info=[], categories=['MotoGP'])
+
+    assert stored_files(get_results.out_filename) == {}
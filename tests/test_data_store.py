@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+import data_store
+from data_store import merge_partitions, partition_path, partition_seasons, read_table, typed_frame, write_partitions
+
+
+######################### FUNCTIONS ###########################
+
+@pytest.fixture
+def sessions_table(tmp_path):
+    return str(tmp_path / 'sessions.csv')
+
+@pytest.fixture
+def results_table(tmp_path):
+    return str(tmp_path / 'results.csv')
+
+def sessions_frame():
+    return pd.DataFrame({
+        'id': ['session-2024-0-0', 'session-2024-0-1'],
+        'date': ['2024-02-28T10:00:00+00:00', '2024-02-28T11:00:00+00:00'],
+        'number': pd.array([1, None], dtype='Int64'),
+        'track_condition': ['Dry', 'Wet'],
+        'air_temperature': ['27º', 'º'],
+        'humidity': ['50%', '%'],
+        'ground_temperature': ['35º', '30º'],
+        'weather': ['Clear', 'Rain'],
+        'circuit': ['Circuit 0', 'Circuit 0'],
+        'session_type': ['FP', 'RAC'],
+        'event_id': ['event-2024-0', 'event-2024-0'],
+        'season': [2024, 2024],
+        'category': ['MotoGP', 'Moto2']
+    })
+
+def results_frame():
+    return pd.DataFrame({
+        'id': ['result-1', 'result-2'],
+        'position': pd.array([1, None], dtype='Int64'),
+        'gap_to_first': ['0.000', None],
+        'points': [25.0, 0.0],
+        'rider_id': ['rider-1', 'rider-2'],
+        'session_id': ['session-2024-0-0', 'session-2024-0-0'],
+        'total_time_ms': pd.array([2400123, None], dtype='Int64'),
+        'season': [2024, 2024]
+    })
+
+def read_bytes(path):
+    with open(path, 'rb') as file_obj:
+        return file_obj.read()
+
+def test_merge_without_new_rows_keeps_the_bytes(sessions_table):
+    write_partitions(sessions_frame(), sessions_table)
+    written = read_bytes(partition_path(sessions_table, 2024))
+
+    merge_partitions(sessions_frame(), sessions_table, subset='id')
+    merge_partitions(sessions_frame(), sessions_table, subset='id')
+
+    assert read_bytes(partition_path(sessions_table, 2024)) == written
+    assert '27º' in written.decode(data_store.csv_encoding)
+
+def test_merge_keeps_the_types_of_the_stored_rows(results_table):
+    write_partitions(results_frame().drop(columns='season'), results_table, season_of=lambda df: pd.Series(2024, index=df.index))
+    written = read_bytes(partition_path(results_table, 2024))
+
+    for _ in range(2):
+        merge_partitions(results_frame().drop(columns='season'), results_table, season_of=lambda df: pd.Series(2024, index=df.index), subset='id')
+
+    assert read_bytes(partition_path(results_table, 2024)) == written
+    assert ';0.000;' in written.decode(data_store.csv_encoding)
+
+def two_seasons_frame():
+    df_2023 = sessions_frame().assign(id=['session-2023-0-0', 'session-2023-0-1'], event_id='event-2023-0', season=2023)
+    return pd.concat([df_2023, sessions_frame()], ignore_index=True)
+
+def test_partitions_read_back_as_written(sessions_table):
+    df = two_seasons_frame()
+    assert write_partitions(df, sessions_table) == [2023, 2024]
+
+    pd.testing.assert_frame_equal(read_table(sessions_table), typed_frame(df, sessions_table))
+    assert list(read_table(sessions_table, 2024, 2024)['id']) == list(sessions_frame()['id'])
+
+def test_rewriting_a_period_only_touches_its_seasons(sessions_table):
+    write_partitions(two_seasons_frame(), sessions_table)
+    stored_2023 = read_bytes(partition_path(sessions_table, 2023))
+
+    # A period rewritten without rows for 2024 removes that season and keeps the others
+    write_partitions(sessions_frame().iloc[0:0], sessions_table, start_year=2024, end_year=2024)
+    assert partition_seasons(sessions_table) == [2023]
+
+    # New rows are added to their season only
+    assert merge_partitions(sessions_frame(), sessions_table, subset='id') == [2024]
+    assert read_bytes(partition_path(sessions_table, 2023)) == stored_2023
@@ -0,0 +1,19 @@
+import os
+import get_data
+from data_store import read_single_table, read_table
+
+
+######################### FUNCTIONS ###########################
+
+def test_all_of_a_season_keeps_the_riders_of_the_others(mock_url, tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+
+    get_data.run('all', 2022, 2024, categories=['MotoGP'])
+    riders = set(read_single_table(get_data.out_riders)['rider_id'])
+
+    get_data.run('all', 2024, 2024, categories=['MotoGP'])
+
+    # Every rider of the stored seasons is still there, so no RTC row loses its rider
+    assert set(read_single_table(get_data.out_riders)['rider_id']) == riders
+    assert set(read_table(get_data.out_RTC, 2022, 2024)['rider_id']) <= riders
@@ -0,0 +1,127 @@
+from contextlib import closing
+import pandas as pd
+import pytest
+import import_data_to_db
+from data_store import merge_partitions, partition_path, write_partitions
+from db_backend import RowHashes, connect_sqlite, hash_row
+from test_data_store import sessions_frame
+
+
+######################### FUNCTIONS ###########################
+
+def import_file(connection, path, bulk=False):
+    """
+    Imports a sessions file with the delta import and returns the counts of its rows.
+    """
+    cursor = connection.cursor()
+    hashes = RowHashes(cursor, 'sessions')
+
+    if bulk:
+        import_data_to_db.bulk_insert_data(path, 'sessions', cursor, hashes)
+    else:
+        import_data_to_db.insert_data(path, 'sessions', cursor, hashes)
+    connection.commit()
+
+    return hashes.counts
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_fetch_of_known_rows_updates_nothing(tmp_path, bulk):
+    table = str(tmp_path / 'sessions.csv')
+    write_partitions(sessions_frame(), table)
+
+    with closing(connect_sqlite(str(tmp_path / 'motogp.sqlite'))) as connection:
+        connection.execute('PRAGMA foreign_keys = OFF')
+        assert import_file(connection, partition_path(table, 2024), bulk)['inserted'] == 2
+
+        # A fetch that requests the same sessions again rewrites the season with the rows it already had
+        merge_partitions(sessions_frame(), table, subset='id')
+        counts = import_file(connection, partition_path(table, 2024), bulk)
+
+    assert counts['updated'] == 0
+    assert counts['unchanged'] == 2
+
+def test_numbers_are_hashed_by_value():
+    assert hash_row(('session-1', '6.0', '0.000', None)) == hash_row(('session-1', '6', '0', None))
+    assert hash_row(('session-1', '6', None)) != hash_row(('session-1', '7', None))
+    assert hash_row(('session-1', '6', None)) != hash_row(('session-1', '6', ''))
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_names_and_units_are_imported_as_written(tmp_path, bulk):
+    table = str(tmp_path / 'sessions.csv')
+    df_sessions = sessions_frame()
+    df_sessions['circuit'] = 'Circuito de Jerez - Ángel Nieto'
+    write_partitions(df_sessions, table)
+
+    with closing(connect_sqlite(str(tmp_path / 'motogp.sqlite'))) as connection:
+        connection.execute('PRAGMA foreign_keys = OFF')
+        import_file(connection, partition_path(table, 2024), bulk)
+        rows = connection.execute('SELECT circuit, air_temperature, ground_temperature FROM sessions ORDER BY session_id').fetchall()
+
+    assert [tuple(map(str, row)) for row in rows] == [('Circuito de Jerez - Ángel Nieto', '27', '35'), ('Circuito de Jerez - Ángel Nieto', 'None', '30')]
+
+def test_validation_checks_every_chunk_and_only_new_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(import_data_to_db, 'sqlite_path', str(tmp_path / 'motogp.sqlite'))
+    monkeypatch.setattr(import_data_to_db, 'quarantine_dir', str(tmp_path / 'quarantine'))
+    monkeypatch.setattr(import_data_to_db, 'batch_size', 1)
+
+    events = str(tmp_path / 'events.csv')
+    write_partitions(pd.DataFrame({
+        'id': ['event-2024-0'], 'test': [False], 'sponsored_name': ['Event 0'], 'date_end': ['2024-03-10'],
+        'date_start': ['2024-03-08'], 'name': ['Event 0'], 'short_name': ['E0'], 'season': [2024]
+    }), events)
+
+    sessions = str(tmp_path / 'sessions.csv')
+    df_sessions = sessions_frame()
+    df_sessions.loc[1, 'event_id'] = 'event-missing'
+    write_partitions(df_sessions, sessions)
+
+    table_files = {'events': [partition_path(events, 2024)], 'sessions': [partition_path(sessions, 2024)]}
+    orphans = import_data_to_db.validate_tables(table_files, 'sqlite')
+    assert orphans == {'events': set(), 'sessions': {'session-2024-0-1'}}
+
+    for table in ['events', 'sessions']:
+        import_data_to_db.load_table(table, table_files[table], 'sqlite', orphans=orphans[table])
+
+    # The rows already imported are not checked again, even if their event is no longer in the database
+    with closing(connect_sqlite(str(tmp_path / 'motogp.sqlite'))) as connection:
+        connection.execute('PRAGMA foreign_keys = OFF')
+        connection.execute("DELETE FROM events")
+        connection.commit()
+
+    assert import_data_to_db.validate_tables({'sessions': table_files['sessions']}, 'sqlite') == {'sessions': {'session-2024-0-1'}}
+    assert len(pd.read_csv(tmp_path / 'quarantine' / 'sessions.csv', sep=';')) == 1
+    assert import_data_to_db.validate_tables({'sessions': table_files['sessions']}, 'sqlite', delta=False) == {'sessions': {'session-2024-0-0', 'session-2024-0-1'}}
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_changed_and_new_rows_are_sent(tmp_path, bulk):
+    table = str(tmp_path / 'sessions.csv')
+    write_partitions(sessions_frame().iloc[:1], table)
+
+    with closing(connect_sqlite(str(tmp_path / 'motogp.sqlite'))) as connection:
+        connection.execute('PRAGMA foreign_keys = OFF')
+        import_file(connection, partition_path(table, 2024), bulk)
+
+        # The first session changes its weather and the second one is new
+        df_sessions = sessions_frame()
+        df_sessions.loc[0, 'weather'] = 'Cloudy'
+        write_partitions(df_sessions, table)
+        counts = import_file(connection, partition_path(table, 2024), bulk)
+        weathers = connection.execute('SELECT weather FROM sessions ORDER BY session_id').fetchall()
+
+    assert (counts['inserted'], counts['updated'], counts['unchanged']) == (1, 1, 0)
+    assert weathers == [('Cloudy',), ('Rain',)]
+
+def test_full_import_sends_the_unchanged_rows(tmp_path):
+    table = str(tmp_path / 'sessions.csv')
+    write_partitions(sessions_frame(), table)
+
+    with closing(connect_sqlite(str(tmp_path / 'motogp.sqlite'))) as connection:
+        connection.execute('PRAGMA foreign_keys = OFF')
+        import_file(connection, partition_path(table, 2024))
+
+        cursor = connection.cursor()
+        hashes = RowHashes(cursor, 'sessions', skip_unchanged=False)
+        sent = import_data_to_db.insert_data(partition_path(table, 2024), 'sessions', cursor, hashes)
+
+    assert hashes.counts['unchanged'] == 2
+    assert sent == 2
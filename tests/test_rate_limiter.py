@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from rate_limiter import parse_retry_after
+
+
+######################### FUNCTIONS ###########################
+
+def test_retry_after_dates_without_timezone_are_utc():
+    retry_date = datetime.now(timezone.utc) + timedelta(seconds=120)
+
+    # format_datetime writes naive datetimes with a '-0000' zone
+    seconds = parse_retry_after(format_datetime(retry_date.replace(tzinfo=None)))
+
+    assert 100 < seconds <= 120
+
+def test_invalid_retry_after_uses_the_default_backoff():
+    assert parse_retry_after('30') == 30
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after('inf') is None